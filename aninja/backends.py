@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import threading
+import uuid
+
+from aninja.cookiefile import cookie_args
+from aninja.cookierecord import CookieRecord
+
+
+class CookieBackend:
+    """Storage shared by :class:`aninja.cookies.CookiesManager` objects,
+    possibly in other processes.
+
+    A manager keeps working on its own jar: cookies set in it are written
+    through to the backend, and changes made by others are pulled with
+    :meth:`changes_since` at most every ``poll_interval`` seconds. Without a
+    backend, the default, cookies are only kept in memory.
+
+    Every write gets a version greater than all those before it, so a
+    reader only asks for what changed since the last version it saw.
+    Removed cookies are kept as tombstones, so that removals are seen too.
+
+    Attributes:
+        poll_interval: seconds between two pulls of a manager.
+    """
+
+    poll_interval = 1.0
+
+    def put(self, cookie) -> None:
+        raise NotImplementedError
+
+    def delete(self, domain, path, name) -> None:
+        raise NotImplementedError
+
+    def changes_since(self, version) -> tuple:
+        """returns the latest version and ``[(domain, path, name, cookie)]``
+        written by others after ``version``, ``cookie`` being ``None`` for a
+        removed cookie."""
+        raise NotImplementedError
+
+    def cookies(self, domain=None) -> list:
+        """returns the cookies stored, of ``domain`` only if it's set."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend(CookieBackend):
+    """A :class:`CookieBackend` in a SQLite database, which processes of a
+    host share by opening the same file.
+
+    The database is in WAL mode, so pulls don't block writes, and each
+    write is one short transaction. Rows are keyed by domain, path and name,
+    and indexed by version.
+
+    Args:
+        filename: the database, created if needed.
+        poll_interval: see :class:`CookieBackend`.
+        timeout: seconds to wait for a write lock held by another process.
+    """
+
+    def __init__(self, filename, poll_interval=1.0, timeout=5.0):
+        self.filename = filename
+        self.poll_interval = poll_interval
+        # rows written by this backend aren't pulled back.
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, timeout=timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS cookies (
+                domain TEXT NOT NULL,
+                path TEXT NOT NULL,
+                name TEXT NOT NULL,
+                cookie TEXT,
+                version INTEGER NOT NULL,
+                origin TEXT NOT NULL,
+                PRIMARY KEY (domain, path, name)
+            );
+            CREATE INDEX IF NOT EXISTS cookies_version ON cookies (version);
+        ''')
+
+    def _write(self, domain, path, name, cookie):
+        # the version is taken under the write lock of the statement.
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO cookies VALUES (?, ?, ?, ?, '
+                '(SELECT COALESCE(MAX(version), 0) + 1 FROM cookies), ?)',
+                (domain, path, name, cookie, self.origin))
+
+    def put(self, cookie) -> None:
+        self._write(cookie.domain, cookie.path, cookie.name,
+                    json.dumps(cookie_args(cookie), separators=(',', ':')))
+
+    def delete(self, domain, path, name) -> None:
+        self._write(domain, path, name, None)
+
+    def changes_since(self, version) -> tuple:
+        with self._lock:
+            latest = self._db.execute(
+                'SELECT COALESCE(MAX(version), 0) FROM cookies'
+            ).fetchone()[0]
+            rows = self._db.execute(
+                'SELECT domain, path, name, cookie FROM cookies '
+                'WHERE version > ? AND version <= ? AND origin != ? '
+                'ORDER BY version', (version, latest, self.origin)
+            ).fetchall()
+        return latest, [
+            (domain, path, name,
+             None if cookie is None else CookieRecord(*json.loads(cookie)))
+            for domain, path, name, cookie in rows
+        ]
+
+    def cookies(self, domain=None) -> list:
+        query = 'SELECT cookie FROM cookies WHERE cookie IS NOT NULL'
+        params = ()
+        if domain is not None:
+            query += ' AND domain = ?'
+            params = (domain,)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [CookieRecord(*json.loads(cookie)) for cookie, in rows]
+
+    def purge(self, version) -> int:
+        """Removes tombstones up to ``version``, which every manager must
+        have pulled already. returns the number removed."""
+        with self._lock:
+            # the latest row is kept, versions would be reused otherwise.
+            return self._db.execute(
+                'DELETE FROM cookies WHERE cookie IS NULL AND version <= ? '
+                'AND version < (SELECT MAX(version) FROM cookies)',
+                (version,)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -1,21 +1,33 @@
 import asyncio
-from io import BytesIO
-from typing import List, Optional
-
-import pyppeteer
-from PIL import Image
-from pyppeteer.page import Page
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 
+from aninja import metrics, tracing
 from aninja.cookies import CookiesManager
+from aninja.intercept import apply_profile
+from aninja.launcher import BrowserManager
+from aninja.pool import PagePool
 from aninja.utils import get_user_agent, pretend_js_list, random_delay
 
-_Page = Optional[Page]
+# pyppeteer and PIL are imported when they're first needed, so HTTP-only
+# workers don't pay for them.
+_Page = Optional["Page"]
+
+_pyppeteer_patched = False
 
 
 def patch_pyppeteer():
+    """Turns off the websocket pings of pyppeteer, which drop the connection
+    to a browser busy for more than 20 seconds. Applied once, by the first
+    launch."""
+    global _pyppeteer_patched
+    if _pyppeteer_patched:
+        return
     import pyppeteer.connection
+    import websockets.client
 
-    original_method = pyppeteer.connection.websockets.client.connect
+    original_method = websockets.client.connect
 
     def new_method(*args, **kwargs):
         kwargs["ping_interval"] = None
@@ -23,78 +35,23 @@ def patch_pyppeteer():
         return original_method(*args, **kwargs)
 
     pyppeteer.connection.websockets.client.connect = new_method
+    _pyppeteer_patched = True
 
 
-patch_pyppeteer()
-
+async def launch_browser(options: dict = None, **kwargs):
+    """Launches a pyppeteer browser, patching pyppeteer first."""
+    patch_pyppeteer()
+    import pyppeteer
 
-class NinjaPage(Page):
-    def __init__(self, page: _Page, client: "BrowserClient"):
-        self._browser_client = client
-        self._page = page
-        self.__dict__.update(page.__dict__)
+    return await pyppeteer.launch(options, **kwargs)
 
-    @property
-    def cookies_manager(self):
-        return self._browser_client.cookies_manager
 
-    async def text(self):
-        return await self.evaluate("() => document.body.innerHTML")
+def __getattr__(name):
+    if name == "NinjaPage":
+        from aninja.page import NinjaPage
 
-    async def gather_for_navigation(self, *aws, options: dict = None):
-        """if coroutines in your aws can cause page's navigation, use this function to wrap it and
-        keep track of cookies.
-        """
-        result = await asyncio.gather(self.waitForNavigation(options), *aws)
-        await self.cookies_manager.update_from_pyppeteer(self)
-        return result
-
-    async def screenshot(
-        self,
-        selector: str = "",
-        hide_selectors: List[str] = None,
-        show=False,
-        options: dict = None,
-        **kwargs,
-    ):
-        """Another method to take a screen shot.
-
-            Args:
-                selector: take a screen shot of the element located by css 
-                    selector. If it's not set, then take a screen shot of the 
-                    full page.
-                hide_selectors: before taking screenshot, some elements may be 
-                    hided on purpose.
-                show: if set to True, then image will be opened by `Pillow`
-                options: same options of :meth:`screenshot`
-        """
-        if hide_selectors:
-            if isinstance(hide_selectors, list):
-                sels = ", ".join(hide_selectors)
-            elif isinstance(hide_selectors, str):
-                sels = hide_selectors
-            style = sels + "{display: none !important}"
-            await self.addStyleTag(content=style)
-        if not selector:
-            shot = await super().screenshot(options, **kwargs)
-        else:
-            ele = await self.J(selector)
-            if ele is None:
-                return 0
-            elif await ele.isIntersectingViewport():
-                shot = await ele.screenshot(options, **kwargs)
-            else:
-                return -1
-        if show:
-            img = Image.open(BytesIO(shot))
-            img.show()
-        return shot
-
-    async def check(self, check_flag: str, by_selector=True):
-        if by_selector:
-            return await self.J(check_flag)
-        else:
-            return check_flag in await self.content()
+        return NinjaPage
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 class BrowserClient:
@@ -112,36 +69,126 @@ class BrowserClient:
             store session, work with cookies_manager.
         cookies_manager: a CookiesManager synchronizing cookies between session 
             and page.
+        track_cookies: if it's True, pages created by :meth:`newPage` stream
+            cookies set by responses into the cookies_manager, see
+            :meth:`NinjaPage.track_cookies`.
+        interception: an :class:`aninja.intercept.InterceptionProfile`
+            applied to pages created by :meth:`newPage`.
+        tracer: an :class:`aninja.tracing.Tracer` receiving the timing of
+            navigations of the pages.
     """
 
-    def __init__(self, cookies_manager=None, browser=None, context=None):
+    def __init__(self, cookies_manager=None, browser=None, context=None,
+                 track_cookies=False, interception=None, tracer=None):
         self.cookies_manager = cookies_manager
+        self.tracer = tracer if tracer is not None else tracing.default_tracer
         self.browser = browser
         self.context = context
+        self.track_cookies = track_cookies
+        self.interception = interception
         self.user_agent = get_user_agent()
         viewport = {"width": 1280, "height": 1024}
         self.emulate_options = {"viewport": viewport}
+        self.page_pool = None
+        self.manager = None
+        self._owns_browser = True
+
+    async def newPage(self, url=None) -> _Page:
+        """Creates a page with cookies synchronized.
+
+        Args:
+            url: the url the page is going to visit. If it's set, only cookies
+                which would be sent to the url are pushed to the page.
+        """
+        page = await self._create_page()
+        await self.cookies_manager.sync_to_pyppeteer(page, url=url)
+        return page
+
+    async def _create_page(self) -> "NinjaPage":
+        start = time.perf_counter()
+        from aninja.page import NinjaPage
 
-    async def newPage(self) -> _Page:
         page = NinjaPage(await self.context.newPage(), self)
-        await self.cookies_manager.sync_to_pyppeteer(page)
-        await page.emulate(options=self.emulate_options)
-        for js in pretend_js_list:
-            await page.evaluateOnNewDocument(js)
+        metrics.track_page(page)
+        if self.manager is not None:
+            self.manager._page_created(self)
+        if self.track_cookies:
+            page.track_cookies()
+        setups = [
+            page.emulate(options=self.emulate_options),
+            *[page.evaluateOnNewDocument(js) for js in pretend_js_list],
+        ]
+        if self.interception is not None:
+            setups.append(apply_profile(page, self.interception))
+        await asyncio.gather(*setups)
+        metrics.BROWSER_PAGE_CREATE_SECONDS.observe(time.perf_counter() - start)
         return page
 
+    def use_page_pool(self, max_size=4, idle_timeout=60.0, warm=1,
+                      reset_cookies=None) -> PagePool:
+        """Enables a :class:`aninja.pool.PagePool` for :meth:`page`."""
+        self.page_pool = PagePool(self, max_size, idle_timeout, warm,
+                                  reset_cookies)
+        return self.page_pool
+
+    def page(self, url=None):
+        """An async context manager which provides a page, from the page pool
+        if it's enabled. Otherwise the page is created and closed.
+
+        Usage::
+
+            async with client.page(url) as page:
+                await page.goto(url)
+        """
+        if self.page_pool is not None:
+            return self.page_pool.acquire(url)
+        return self._new_closing_page(url)
+
+    @asynccontextmanager
+    async def _new_closing_page(self, url=None):
+        page = await self.newPage(url)
+        try:
+            yield page
+        finally:
+            await page.close()
+
     async def close(self):
-        return await self.browser.close()
+        """Closes the browser, or only the context if the browser is shared.
+        """
+        if self.page_pool is not None:
+            await self.page_pool.close()
+        if self.manager is not None:
+            return await self.manager._release(self)
+        if self._owns_browser:
+            return await self.browser.close()
+        return await self.context.close()
 
     async def pages(self):
         return await self.browser.pages()
 
 
 async def launch(
-    browser=None, cookies_manager=None, options: dict = None, **kwargs
+    browser=None,
+    cookies_manager=None,
+    options: dict = None,
+    track_cookies=False,
+    **kwargs
 ) -> BrowserClient:
-    browser = await pyppeteer.launch(options, **kwargs)
+    """Creates a :class:`BrowserClient` in a new incognito context.
+
+    Args:
+        browser: a :class:`aninja.launcher.BrowserManager` to get the context
+            from, or a pyppeteer browser to share. Closing the client closes
+            only its context then. If it's None, a new browser is launched
+            with ``options`` and ``kwargs`` and owned by the client.
+    """
+    if isinstance(browser, BrowserManager):
+        return await browser.client(cookies_manager, track_cookies)
+    owns_browser = browser is None
+    if owns_browser:
+        browser = await launch_browser(options, **kwargs)
     context = await browser.createIncognitoBrowserContext()
     cookies_manager = CookiesManager() if cookies_manager is None else cookies_manager
-    client = BrowserClient(cookies_manager, browser, context)
+    client = BrowserClient(cookies_manager, browser, context, track_cookies)
+    client._owns_browser = owns_browser
     return client
@@ -0,0 +1,382 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from http.cookies import SimpleCookie
+from pathlib import Path
+
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+CACHEABLE_STATUSES = frozenset((200, 203, 300, 301, 404, 410))
+
+
+class CachedResponse:
+    """A response replayed from memory, with the reading interface of
+    :class:`aiohttp.ClientResponse`."""
+
+    history = ()
+
+    def __init__(self, status, headers, body: bytes, url, reason='',
+                 from_cache=True):
+        self.status = status
+        self.reason = reason
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+        self.url = self.real_url = URL(url)
+        self.from_cache = from_cache
+
+    @classmethod
+    def from_response(cls, resp, body, from_cache=False):
+        return cls(resp.status, resp.headers, body, resp.url, resp.reason,
+                   from_cache)
+
+    def copy(self) -> 'CachedResponse':
+        return CachedResponse(self.status, self.headers, self._body, self.url,
+                              self.reason, self.from_cache)
+
+    @property
+    def cookies(self) -> SimpleCookie:
+        return SimpleCookie()
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('Content-Type', '').split(';')[0].strip()
+
+    @property
+    def charset(self):
+        for param in self.headers.get('Content-Type', '').split(';')[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'charset':
+                return value.strip('"')
+        return None
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding=None, errors='strict') -> str:
+        return self._body.decode(encoding or self.charset or 'utf-8', errors)
+
+    async def json(self, *, encoding=None, loads=json.loads, **kwargs):
+        return loads(await self.text(encoding))
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            from aiohttp import ClientResponseError
+
+            raise ClientResponseError(None, (), status=self.status,
+                                      message=self.reason,
+                                      headers=self.headers)
+
+    def release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __repr__(self):
+        return '<CachedResponse(%s) [%d]>' % (self.url, self.status)
+
+
+# result of a flight whose caller was cancelled
+_ABANDONED = object()
+
+
+class SingleFlight:
+    """Coalesces identical requests in flight: the first one is sent and the
+    others wait for a copy of its response. If the caller which sent it is
+    cancelled, one of the others sends it again."""
+
+    def __init__(self):
+        self._flights = {}
+        self.coalesced = 0
+
+    async def run(self, key, fetch):
+        """Runs ``fetch()``, a coroutine function returning ``(response,
+        body)``, unless a call with the same key is running."""
+        flight = self._flights.get(key)
+        while flight is not None:
+            snapshot = await asyncio.shield(flight)
+            if snapshot is not _ABANDONED:
+                self.coalesced += 1
+                return snapshot.copy()
+            # the first waiter woken up sends it, the others wait for it.
+            flight = self._flights.get(key)
+        flight = self._flights[key] = asyncio.get_event_loop().create_future()
+        try:
+            resp, body = await fetch()
+        except asyncio.CancelledError:
+            # only this caller is cancelled, not those waiting for it.
+            if not flight.done():
+                flight.set_result(_ABANDONED)
+            raise
+        except BaseException as e:
+            if not flight.done():
+                flight.set_exception(e)
+            # mark the exception as retrieved when nobody waits
+            flight.exception()
+            raise
+        else:
+            if isinstance(resp, CachedResponse):
+                flight.set_result(resp)
+            else:
+                flight.set_result(
+                    CachedResponse.from_response(resp, body, from_cache=False))
+            return resp
+        finally:
+            del self._flights[key]
+
+
+class CacheEntry:
+    __slots__ = ('status', 'reason', 'headers', 'body', 'url', 'stored_at',
+                 'expires')
+
+    def __init__(self, status, reason, headers, body, url, stored_at=None,
+                 expires=None):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.url = url
+        self.stored_at = time.time() if stored_at is None else stored_at
+        self.expires = expires
+
+    @classmethod
+    def from_response(cls, resp, body):
+        headers = [(k, v) for k, v in resp.headers.items()]
+        entry = cls(resp.status, resp.reason, headers, body, str(resp.url))
+        entry.expires = freshness_deadline(resp.headers, entry.stored_at)
+        return entry
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def fresh(self, now=None) -> bool:
+        return self.expires is not None and self.expires > (
+            time.time() if now is None else now)
+
+    def validators(self) -> dict:
+        headers = CIMultiDict(self.headers)
+        validators = {}
+        if 'ETag' in headers:
+            validators['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            validators['If-Modified-Since'] = headers['Last-Modified']
+        return validators
+
+    def revalidated(self, headers) -> None:
+        """Updates the entry with headers of a 304 response."""
+        merged = CIMultiDict(self.headers)
+        for key in ('Cache-Control', 'Expires', 'ETag', 'Last-Modified',
+                    'Date'):
+            if key in headers:
+                merged[key] = headers[key]
+        self.headers = list(merged.items())
+        self.stored_at = time.time()
+        self.expires = freshness_deadline(merged, self.stored_at)
+
+    def response(self) -> CachedResponse:
+        return CachedResponse(self.status, self.headers, self.body, self.url,
+                              self.reason)
+
+    def dumps(self) -> bytes:
+        meta = json.dumps({
+            'status': self.status, 'reason': self.reason,
+            'headers': self.headers, 'url': self.url,
+            'stored_at': self.stored_at, 'expires': self.expires,
+        }).encode()
+        return meta + b'\n' + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'CacheEntry':
+        meta, _, body = data.partition(b'\n')
+        meta = json.loads(meta)
+        return cls(meta['status'], meta['reason'],
+                   [tuple(h) for h in meta['headers']], body, meta['url'],
+                   meta['stored_at'], meta['expires'])
+
+
+def _cache_control(headers) -> dict:
+    directives = {}
+    for value in headers.getall('Cache-Control', ()):
+        for directive in value.split(','):
+            name, _, arg = directive.strip().partition('=')
+            if name:
+                directives[name.lower()] = arg.strip('"')
+    return directives
+
+
+def cacheable(resp) -> bool:
+    """whether a response is worth storing: it must be allowed, and either
+    fresh or revalidable, or it could never be used."""
+    if resp.status not in CACHEABLE_STATUSES:
+        return False
+    headers = resp.headers
+    if 'no-store' in _cache_control(headers):
+        return False
+    if 'ETag' in headers or 'Last-Modified' in headers:
+        return True
+    now = time.time()
+    expires = freshness_deadline(headers, now)
+    return expires is not None and expires > now
+
+
+def freshness_deadline(headers, stored_at):
+    """returns the time a response stops being fresh (RFC 7234), None if it
+    must be revalidated before use."""
+    directives = _cache_control(headers)
+    if 'no-cache' in directives:
+        return None
+    if directives.get('max-age', '').isdigit():
+        return stored_at + int(directives['max-age'])
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return None
+    last_modified = headers.get('Last-Modified')
+    if last_modified:
+        # heuristic freshness: 10% of the time since the last modification
+        try:
+            modified = parsedate_to_datetime(last_modified).timestamp()
+        except (TypeError, ValueError):
+            return None
+        return stored_at + max(0.0, stored_at - modified) * 0.1
+    return None
+
+
+class DiskStore:
+    """Cache entries stored as files of a directory, evicted by least recent
+    use when they take more than ``max_bytes``."""
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._sizes = OrderedDict()
+        self.size = 0
+        files = sorted(self.directory.iterdir(),
+                       key=lambda p: p.stat().st_mtime)
+        for path in files:
+            if path.is_file():
+                self._sizes[path.name] = path.stat().st_size
+                self.size += self._sizes[path.name]
+
+    def _name(self, key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        name = self._name(key)
+        if name not in self._sizes:
+            return None
+        try:
+            entry = CacheEntry.loads((self.directory / name).read_bytes())
+        except (OSError, ValueError, KeyError):
+            self._remove(name)
+            return None
+        self._sizes.move_to_end(name)
+        return entry
+
+    def put(self, key, entry) -> None:
+        name = self._name(key)
+        data = entry.dumps()
+        path = self.directory / name
+        tmp = path.with_suffix('.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.size += len(data) - self._sizes.pop(name, 0)
+        self._sizes[name] = len(data)
+        while self.size > self.max_bytes and self._sizes:
+            self._remove(next(iter(self._sizes)))
+
+    def _remove(self, name):
+        self.size -= self._sizes.pop(name, 0)
+        try:
+            (self.directory / name).unlink()
+        except OSError:
+            pass
+
+
+class HTTPCache:
+    """A HTTP cache of responses in memory, bounded by bytes with LRU
+    eviction, plus an optional :class:`DiskStore`.
+
+    Freshness follows ``Cache-Control``/``Expires`` (and a heuristic on
+    ``Last-Modified``). Stale entries with an ``ETag`` or ``Last-Modified``
+    are revalidated with conditional requests.
+
+    Attributes:
+        hits: responses served from the cache without a request.
+        misses: responses got from the network.
+        revalidations: stale entries confirmed by a 304 response.
+    """
+
+    def __init__(self, max_bytes=64 << 20, directory=None,
+                 max_disk_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self.disk = (DiskStore(directory, max_disk_bytes)
+                     if directory is not None else None)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry) -> None:
+        self._remember(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, entry)
+
+    def _remember(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'entries': len(self._entries),
+            'bytes': self.size,
+        }
+
+    def __len__(self):
+        return len(self._entries)
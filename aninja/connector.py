@@ -0,0 +1,154 @@
+import asyncio
+import time
+import weakref
+from collections import deque
+
+from aiohttp import TCPConnector
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import aiodns  # noqa: F401
+except ImportError:  # pragma: no cover
+    aiodns = None
+
+
+class PooledConnector(TCPConnector):
+    """A TCPConnector that can be shared by many sessions and keeps count of
+    its connections.
+
+    Lookups are cached for ``ttl_dns_cache`` seconds and resolved with
+    aiodns when it's installed (getaddrinfo in a thread otherwise). A
+    connection is closed instead of kept alive once it has served
+    ``max_reuse`` requests, so long running crawlers spread over the
+    servers behind a load balancer.
+
+    Args:
+        limit: connections open at once.
+        limit_per_host: connections open at once to one host.
+        ttl_dns_cache: seconds a lookup is cached; None caches forever.
+        keepalive_timeout: seconds an idle connection is kept alive.
+        max_reuse: requests served by a connection; None means unlimited.
+        window: seconds over which ``created_per_second`` is measured.
+
+    Attributes:
+        created: connections opened.
+        reused: requests served by a kept alive connection.
+        recycled: connections closed because of ``max_reuse``.
+    """
+
+    def __init__(self, limit=100, limit_per_host=0, ttl_dns_cache=10,
+                 keepalive_timeout=15.0, max_reuse=None, window=60.0,
+                 **kwargs):
+        if 'resolver' not in kwargs and aiodns is not None:
+            from aiohttp import AsyncResolver
+            kwargs['resolver'] = AsyncResolver()
+        if kwargs.get('force_close'):
+            keepalive_timeout = None
+        super().__init__(limit=limit, limit_per_host=limit_per_host,
+                         ttl_dns_cache=ttl_dns_cache,
+                         keepalive_timeout=keepalive_timeout, **kwargs)
+        self.max_reuse = max_reuse
+        self.window = window
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self._created_at = deque()
+        self._uses = weakref.WeakKeyDictionary()
+
+    async def _create_connection(self, req, traces, timeout):
+        proto = await super()._create_connection(req, traces, timeout)
+        self.created += 1
+        self._created_at.append(time.monotonic())
+        self._uses[proto] = 0
+        return proto
+
+    def _release(self, key, protocol, *, should_close=False):
+        uses = self._uses.get(protocol, 0) + 1
+        self._uses[protocol] = uses
+        if uses > 1:
+            self.reused += 1
+        if (self.max_reuse and uses >= self.max_reuse
+                and not (should_close or protocol.should_close
+                         or self._closed)):
+            should_close = True
+            self.recycled += 1
+        super()._release(key, protocol, should_close=should_close)
+
+    @property
+    def active(self) -> int:
+        """Connections serving a request."""
+        return len(self._acquired)
+
+    @property
+    def idle(self) -> int:
+        """Connections kept alive for the next request."""
+        return sum(len(conns) for conns in self._conns.values())
+
+    def created_per_second(self) -> float:
+        """Connections opened per second over the last ``window`` seconds."""
+        horizon = time.monotonic() - self.window
+        created_at = self._created_at
+        while created_at and created_at[0] < horizon:
+            created_at.popleft()
+        return len(created_at) / self.window
+
+    def stats(self) -> dict:
+        return {
+            'active': self.active,
+            'idle': self.idle,
+            'created': self.created,
+            'created_per_second': self.created_per_second(),
+            'reused': self.reused,
+            'recycled': self.recycled,
+        }
+
+
+class ConnectorRegistry:
+    """Named :class:`PooledConnector` s shared by the
+    :class:`aninja.http.HTTPClient` s of a process, through
+    :data:`default_registry`.
+
+    Sessions using a shared connector don't own it: closing a client leaves
+    the sockets to the others, and cookies stay in each client's own jar.
+    A connector is bound to the event loop it was made in, so a new one is
+    made when a name is used from another loop.
+    """
+
+    def __init__(self):
+        self.options = {}
+        self.connectors = {}
+
+    def configure(self, name='default', **options) -> None:
+        """Sets the :class:`PooledConnector` arguments of a name. Connectors
+        already made keep theirs."""
+        self.options[name] = options
+
+    def get(self, name='default') -> PooledConnector:
+        """Returns the connector of a name, making it if needed. Must be
+        called from a running event loop."""
+        loop = asyncio.get_running_loop()
+        connector = self.connectors.get(name)
+        if connector is None or connector.closed or connector._loop is not loop:
+            connector = PooledConnector(**self.options.get(name, {}))
+            self.connectors[name] = connector
+            logger.debug('Shared connector %r created', name)
+        return connector
+
+    async def close(self, name=None) -> None:
+        """Closes the connector of a name, or all of them."""
+        names = list(self.connectors) if name is None else [name]
+        for name in names:
+            connector = self.connectors.pop(name, None)
+            if connector is not None and not connector.closed:
+                await connector.close()
+
+    def stats(self) -> dict:
+        return {name: connector.stats()
+                for name, connector in self.connectors.items()
+                if not connector.closed}
+
+
+default_registry = ConnectorRegistry()
@@ -0,0 +1,241 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from aninja.cookierecord import CookieRecord, shared_rest
+
+MAGIC = b'NJCK'
+VERSION = 1
+
+# magic, version, flags, strings, domains, cookies
+_HEADER = struct.Struct('<4sHHIII')
+_OFFSET = struct.Struct('<I')
+# domain, first record, number of records
+_DOMAIN = struct.Struct('<III')
+# domain, path, name, value, port, comment, comment_url, rest (string ids),
+# expires, version, flags
+_RECORD = struct.Struct('<IIIIIIIIqhB')
+
+_NONE = 0xFFFFFFFF
+
+_SECURE = 1
+_DISCARD = 2
+_DOMAIN_SPECIFIED = 4
+_DOMAIN_INITIAL_DOT = 8
+_PATH_SPECIFIED = 16
+_PORT_SPECIFIED = 32
+_HAS_EXPIRES = 64
+_RFC2109 = 128
+
+
+def is_cookie_file(filename) -> bool:
+    """whether ``filename`` is in the binary format."""
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def cookie_args(cookie) -> tuple:
+    """returns the arguments of ``Cookie()`` which rebuild ``cookie``."""
+    return (cookie.version, cookie.name, cookie.value, cookie.port,
+            cookie.port_specified, cookie.domain, cookie.domain_specified,
+            cookie.domain_initial_dot, cookie.path, cookie.path_specified,
+            cookie.secure, cookie.expires, cookie.discard, cookie.comment,
+            cookie.comment_url, cookie._rest, cookie.rfc2109)
+
+
+def dump(cookies, filename) -> None:
+    """Writes cookies to ``filename`` in the binary format.
+
+    Cookies are grouped by domain. Domains, paths, names and every other
+    string are stored once in a string table, and each cookie is a fixed
+    size record of string ids, so the file can be read in place. The file
+    is replaced atomically.
+    """
+    strings = {}
+    blob = bytearray()
+    offsets = [0]
+    rests = {}
+
+    def sid(s):
+        if s is None:
+            return _NONE
+        if type(s) is not str:
+            # e.g. the bool comment_url of requests' morsel_to_cookie
+            s = str(s)
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(offsets) - 1
+            blob.extend(s.encode('utf-8', 'surrogatepass'))
+            offsets.append(len(blob))
+        return i
+
+    def rest_sid(rest):
+        if not rest:
+            return _NONE
+        key = tuple(sorted(rest.items()))
+        i = rests.get(key)
+        if i is None:
+            i = rests[key] = sid(json.dumps(rest, sort_keys=True))
+        return i
+
+    by_domain = {}
+    for cookie in cookies:
+        by_domain.setdefault(cookie.domain, []).append(cookie)
+
+    domains = bytearray()
+    records = bytearray()
+    n = 0
+    for domain in sorted(by_domain):
+        group = by_domain[domain]
+        domains += _DOMAIN.pack(sid(domain), n, len(group))
+        n += len(group)
+        for c in group:
+            flags = (
+                (_SECURE if c.secure else 0)
+                | (_DISCARD if c.discard else 0)
+                | (_DOMAIN_SPECIFIED if c.domain_specified else 0)
+                | (_DOMAIN_INITIAL_DOT if c.domain_initial_dot else 0)
+                | (_PATH_SPECIFIED if c.path_specified else 0)
+                | (_PORT_SPECIFIED if c.port_specified else 0)
+                | (_HAS_EXPIRES if c.expires is not None else 0)
+                | (_RFC2109 if c.rfc2109 else 0)
+            )
+            records += _RECORD.pack(
+                sid(c.domain), sid(c.path), sid(c.name), sid(c.value),
+                sid(c.port), sid(c.comment), sid(c.comment_url),
+                rest_sid(c._rest),
+                int(c.expires) if c.expires is not None else 0,
+                c.version if c.version is not None else -1,
+                flags,
+            )
+
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, len(offsets) - 1,
+                             len(by_domain), n))
+        f.write(struct.pack('<%dI' % len(offsets), *offsets))
+        f.write(domains)
+        f.write(records)
+        f.write(blob)
+    os.replace(tmp, filename)
+
+
+class CookieFile:
+    """A cookie file in the binary format, mapped in memory.
+
+    Nothing is parsed when it's opened except the header: :meth:`domains`
+    reads the domain table, and :meth:`read` builds the
+    :class:`aninja.cookierecord.CookieRecord` of a range of records. Strings are decoded once, and domains, paths and
+    names are interned. The mapping is closed once every cookie has been
+    read, see :meth:`release`.
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError('%s is not a cookie file' % filename)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n_strings, n_domains, n_cookies = \
+            _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError('%s is not a cookie file' % filename)
+        if version != VERSION:
+            self._map.close()
+            raise ValueError('unsupported cookie file version %d' % version)
+        self.n_cookies = n_cookies
+        self._offsets = _HEADER.size
+        self._domains = self._offsets + (n_strings + 1) * _OFFSET.size
+        self._records = self._domains + n_domains * _DOMAIN.size
+        self._blob = self._records + n_cookies * _RECORD.size
+        self._n_domains = n_domains
+        self._strings = {}
+        self._rests = {}
+        self._unread = n_cookies
+        self._lock = threading.Lock()
+        if not n_cookies:
+            self.close()
+
+    def _string(self, i, intern=False):
+        if i == _NONE:
+            return None
+        s = self._strings.get(i)
+        if s is None:
+            start, end = struct.unpack_from('<II', self._map,
+                                            self._offsets + i * _OFFSET.size)
+            s = str(self._map[self._blob + start:self._blob + end],
+                    'utf-8', 'surrogatepass')
+            if intern:
+                s = sys.intern(s)
+            self._strings[i] = s
+        return s
+
+    def domains(self):
+        """Yields ``(domain, first record, number of records)``."""
+        for i in range(self._n_domains):
+            sid, start, count = _DOMAIN.unpack_from(
+                self._map, self._domains + i * _DOMAIN.size)
+            yield self._string(sid, intern=True), start, count
+
+    def read(self, start, count) -> list:
+        """Returns the cookies of records ``start`` to ``start + count``."""
+        strings = self._strings
+        string = self._string
+        rests = self._rests
+        from_fields = CookieRecord.from_fields
+        no_rest = shared_rest(None)
+        cookies = []
+        view = memoryview(self._map)
+        records = view[self._records + start * _RECORD.size:
+                       self._records + (start + count) * _RECORD.size]
+        try:
+            for (domain, path, name, value, port, comment, comment_url, rest,
+                 expires, version, flags) in _RECORD.iter_unpack(records):
+                if rest == _NONE:
+                    rest = no_rest
+                else:
+                    parsed = rests.get(rest)
+                    if parsed is None:
+                        parsed = rests[rest] = shared_rest(
+                            json.loads(string(rest)))
+                    rest = parsed
+                # the flags of records are those of the file.
+                cookies.append(from_fields(
+                    version if version >= 0 else None,
+                    strings.get(name) or string(name, True),
+                    strings.get(value) or string(value),
+                    None if port == _NONE else string(port),
+                    strings.get(domain) or string(domain, True),
+                    strings.get(path) or string(path, True),
+                    expires if flags & _HAS_EXPIRES else None,
+                    None if comment == _NONE else string(comment),
+                    None if comment_url == _NONE else string(comment_url),
+                    rest,
+                    flags & ~_HAS_EXPIRES,
+                ))
+        finally:
+            records.release()
+            view.release()
+        return cookies
+
+    def release(self, count) -> None:
+        """Tells that ``count`` cookies have been read for good; the mapping
+        is closed when none is left."""
+        with self._lock:
+            self._unread -= count
+            if self._unread <= 0:
+                self.close()
+
+    def close(self) -> None:
+        self._strings = {}
+        self._rests = {}
+        if not self._map.closed:
+            self._map.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._map.closed
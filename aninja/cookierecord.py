@@ -0,0 +1,178 @@
+import sys
+import time
+from http.cookiejar import Cookie
+
+# the flags of aninja.cookiefile records, 64 aside
+SECURE = 1
+DISCARD = 2
+DOMAIN_SPECIFIED = 4
+DOMAIN_INITIAL_DOT = 8
+PATH_SPECIFIED = 16
+PORT_SPECIFIED = 32
+RFC2109 = 128
+
+# rest dicts shared by records, never changed in place
+_rests = {}
+_MAX_RESTS = 4096
+_NO_REST = {}
+
+
+def shared_rest(rest) -> dict:
+    """returns a dict equal to ``rest``, shared by the records which have
+    the same non-standard attributes."""
+    if not rest:
+        return _NO_REST
+    try:
+        key = tuple(rest.items())
+        shared = _rests.get(key)
+    except TypeError:  # unhashable values
+        return dict(rest)
+    if shared is None:
+        shared = dict(rest)
+        if len(_rests) < _MAX_RESTS:
+            _rests[key] = shared
+    return shared
+
+
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+
+def _flag(bit):
+    def get(self):
+        return bool(self._flags & bit)
+
+    def set(self, value):
+        if value:
+            self._flags |= bit
+        else:
+            self._flags &= ~bit
+
+    return property(get, set)
+
+
+class CookieRecord:
+    """A cookie as stored in :class:`aninja.cookies.NinjaCookieJar`.
+
+    It has the attributes and methods of :class:`http.cookiejar.Cookie`, and
+    takes the same arguments, but it has no ``__dict__``: flags are bits of
+    one int, the domain, the path and the name are interned, and records
+    with the same non-standard attributes share them. Use :meth:`to_cookie`
+    where a real ``Cookie`` is needed.
+    """
+
+    __slots__ = ('version', 'name', 'value', 'port', 'domain', 'path',
+                 'expires', 'comment', 'comment_url', '_rest', '_flags')
+
+    port_specified = _flag(PORT_SPECIFIED)
+    domain_specified = _flag(DOMAIN_SPECIFIED)
+    domain_initial_dot = _flag(DOMAIN_INITIAL_DOT)
+    path_specified = _flag(PATH_SPECIFIED)
+    secure = _flag(SECURE)
+    discard = _flag(DISCARD)
+    rfc2109 = _flag(RFC2109)
+
+    def __init__(self, version, name, value, port, port_specified, domain,
+                 domain_specified, domain_initial_dot, path, path_specified,
+                 secure, expires, discard, comment, comment_url, rest,
+                 rfc2109=False):
+        if version is not None:
+            version = int(version)
+        if expires is not None:
+            expires = int(float(expires))
+        if port is None and port_specified is True:
+            raise ValueError("if port is None, port_specified must be false")
+        self.version = version
+        self.name = _intern(name)
+        self.value = value
+        self.port = port
+        self.domain = _intern(domain)
+        self.path = _intern(path)
+        self.expires = expires
+        self.comment = comment
+        self.comment_url = comment_url
+        self._rest = shared_rest(rest)
+        self._flags = (
+            (PORT_SPECIFIED if port_specified else 0)
+            | (DOMAIN_SPECIFIED if domain_specified else 0)
+            | (DOMAIN_INITIAL_DOT if domain_initial_dot else 0)
+            | (PATH_SPECIFIED if path_specified else 0)
+            | (SECURE if secure else 0)
+            | (DISCARD if discard else 0)
+            | (RFC2109 if rfc2109 else 0)
+        )
+
+    @classmethod
+    def from_fields(cls, version, name, value, port, domain, path, expires,
+                    comment, comment_url, rest, flags) -> "CookieRecord":
+        """Builds a record without checking or converting anything: the
+        strings should be interned, ``rest`` be shared, see
+        :func:`shared_rest`, and ``flags`` be made of the flags above."""
+        record = cls.__new__(cls)
+        record.version = version
+        record.name = name
+        record.value = value
+        record.port = port
+        record.domain = domain
+        record.path = path
+        record.expires = expires
+        record.comment = comment
+        record.comment_url = comment_url
+        record._rest = rest
+        record._flags = flags
+        return record
+
+    @classmethod
+    def from_cookie(cls, cookie) -> "CookieRecord":
+        return cls(cookie.version, cookie.name, cookie.value, cookie.port,
+                   cookie.port_specified, cookie.domain,
+                   cookie.domain_specified, cookie.domain_initial_dot,
+                   cookie.path, cookie.path_specified, cookie.secure,
+                   cookie.expires, cookie.discard, cookie.comment,
+                   cookie.comment_url, cookie._rest, cookie.rfc2109)
+
+    def to_cookie(self) -> Cookie:
+        """returns the same cookie as a :class:`http.cookiejar.Cookie`."""
+        return Cookie(self.version, self.name, self.value, self.port,
+                      self.port_specified, self.domain, self.domain_specified,
+                      self.domain_initial_dot, self.path, self.path_specified,
+                      self.secure, self.expires, self.discard, self.comment,
+                      self.comment_url, self._rest, self.rfc2109)
+
+    def has_nonstandard_attr(self, name):
+        return name in self._rest
+
+    def get_nonstandard_attr(self, name, default=None):
+        return self._rest.get(name, default)
+
+    def set_nonstandard_attr(self, name, value):
+        rest = dict(self._rest)
+        rest[name] = value
+        self._rest = shared_rest(rest)
+
+    def is_expired(self, now=None):
+        if now is None:
+            now = time.time()
+        return self.expires is not None and self.expires <= now
+
+    def __copy__(self):
+        record = CookieRecord.__new__(CookieRecord)
+        for name in self.__slots__:
+            setattr(record, name, getattr(self, name))
+        return record
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.name = _intern(self.name)
+        self.domain = _intern(self.domain)
+        self.path = _intern(self.path)
+        self._rest = shared_rest(self._rest)
+
+    __str__ = Cookie.__str__
+
+    def __repr__(self):
+        return repr(self.to_cookie()).replace('Cookie(', 'CookieRecord(', 1)
@@ -1,9 +1,19 @@
+import copy
+import heapq
+import itertools
 import time
 import json
-from http.cookiejar import Cookie, LWPCookieJar
-from http.cookies import Morsel, SimpleCookie
-import time
+import ipaddress
+import threading
+import weakref
+from collections import OrderedDict
+from http.cookiejar import LWPCookieJar, lwp_cookie_str
+from http.cookies import CookieError, Morsel, SimpleCookie
 
+from aninja import metrics
+from aninja.cookiefile import CookieFile, dump, is_cookie_file
+from aninja.cookierecord import CookieRecord, shared_rest
+from aninja.journal import CookieJournal
 from aninja.utils import (
     format_expires,
     filter_attrs,
@@ -11,6 +21,7 @@ from aninja.utils import (
     expires_to_str,
 )
 from requests.cookies import RequestsCookieJar
+from yarl import URL
 
 
 # Typing
@@ -20,11 +31,589 @@ _Path = str
 _CookieJar = "CookieJar"
 
 
+class CookieIndex:
+    """Cookies grouped by registrable domain, then by path and by domain.
+
+    Answers exact domain/path queries and RFC 6265 queries for a request url
+    without looking at cookies of other sites or paths.
+    """
+
+    def __init__(self) -> None:
+        self._sites = {}
+
+    def add(self, cookie) -> None:
+        site = registrable_domain(cookie.domain)
+        paths = self._sites.setdefault(site, {})
+        domains = paths.setdefault(cookie.path, {})
+        domains.setdefault(cookie.domain, {})[cookie.name] = cookie
+
+    def discard(self, cookie) -> None:
+        site = registrable_domain(cookie.domain)
+        paths = self._sites.get(site, {})
+        domains = paths.get(cookie.path, {})
+        names = domains.get(cookie.domain, {})
+        if names.get(cookie.name) is not cookie:
+            return
+        del names[cookie.name]
+        if not names:
+            del domains[cookie.domain]
+            if not domains:
+                del paths[cookie.path]
+                if not paths:
+                    del self._sites[site]
+
+    def clear(self) -> None:
+        self._sites.clear()
+
+    def copy(self) -> "CookieIndex":
+        index = CookieIndex()
+        index._sites = {
+            site: {
+                path: {domain: dict(names) for domain, names in domains.items()}
+                for path, domains in paths.items()
+            }
+            for site, paths in self._sites.items()
+        }
+        return index
+
+    def lookup(self, domain=None, path=None):
+        """Yields cookies whose domain and path equal the given ones. ``None``
+        matches everything."""
+        if domain is None:
+            sites = self._sites.values()
+        else:
+            sites = [self._sites.get(registrable_domain(domain), {})]
+        for paths in sites:
+            if path is None:
+                buckets = paths.values()
+            else:
+                buckets = [paths.get(path, {})]
+            for domains in buckets:
+                if domain is None:
+                    for names in domains.values():
+                        yield from names.values()
+                else:
+                    yield from domains.get(domain, {}).values()
+
+    def match(self, url, expired=False):
+        """Yields cookies which would be sent with a request to ``url``
+        according to RFC 6265: domain-match, path-match, the secure flag and
+        expiry are checked. Host-only cookies, whose ``domain_specified`` is
+        false, only match their own host, and cookies without a domain match
+        every host. Expired cookies are yielded too if ``expired`` is set.
+        """
+        url = URL(url)
+        host = (url.raw_host or "").lower()
+        request_path = url.raw_path or "/"
+        secure = url.scheme in ("https", "wss")
+        now = time.time()
+
+        sites = [self._sites.get("")]
+        if host:
+            sites.append(self._sites.get(registrable_domain(host)))
+        for paths in sites:
+            if not paths:
+                continue
+            for cookie_path, domains in paths.items():
+                if not path_match(request_path, cookie_path):
+                    continue
+                for domain, names in domains.items():
+                    bare = domain.lstrip(".").lower()
+                    if domain and not domain_match(host, bare):
+                        continue
+                    exact = not domain or host == bare
+                    for cookie in names.values():
+                        if not exact and not cookie.domain_specified:
+                            continue
+                        if cookie.secure and not secure:
+                            continue
+                        if not expired and cookie.is_expired(now):
+                            continue
+                        yield cookie
+
+
+class OutputCache:
+    """A LRU cache for serialized cookies, such as ``Cookie`` header strings.
+
+    Entries are grouped by site. Setting or removing a cookie drops only the
+    entries of its site, and an entry is dropped once a cookie in it expires.
+    """
+
+    def __init__(self, maxsize=1024) -> None:
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._keys_by_site = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, site, expires = entry
+        if expires is not None and expires <= time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, site, value, expires=None) -> None:
+        if self.maxsize <= 0:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, site, expires)
+        self._keys_by_site.setdefault(site, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, site) -> None:
+        """Drops entries of ``site`` and entries not bound to any site."""
+        if site == "":
+            # cookies without a domain are sent to every site.
+            self.clear()
+            return
+        for s in (site, None):
+            for key in self._keys_by_site.pop(s, ()):
+                del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_site.clear()
+
+    def _drop(self, key):
+        _, site, _ = self._entries.pop(key)
+        keys = self._keys_by_site[site]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_site[site]
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class NinjaCookieJar(LWPCookieJar, RequestsCookieJar):
     """:class:`requests.cookies.RequestsCookieJar` compatible
-    :class:`cookielib.LWPCookieJar`"""
+    :class:`cookielib.LWPCookieJar`
+
+    Keeps a :class:`CookieIndex` of its cookies up to date and tells
+    listeners about every cookie set or removed. Cookies are stored as
+    :class:`aninja.cookierecord.CookieRecord`, other cookies are converted
+    when they're set.
+
+    Cookies of an :class:`aninja.cookiefile.CookieFile` attached with
+    :meth:`attach_file` are read from it a site at a time, when the site is
+    first used.
+
+    Expiry times are kept in a heap, so :meth:`evict` removes expired
+    cookies without looking at the others. With :meth:`set_limits`, the
+    least recently used cookies are removed too when a site has too many
+    cookies or the jar is over its memory budget. Listeners are told about
+    those while :attr:`evicting` is True: they're only dropped from memory.
+
+    Attributes:
+        keep_expired: if it's set, expired cookies are kept.
+        size: estimated memory used by the cookies, when there are limits.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.index = CookieIndex()
+        self._listeners = []
+        # site -> [(cookie file, domain, first record, count)] not read yet
+        self._pending = {}
+        self.keep_expired = False
+        # (expires, n, cookie), with _stale cookies since replaced or removed
+        self._expiry = []
+        self._stale = 0
+        self._counter = itertools.count()
+        self.max_per_domain = None
+        self.max_bytes = None
+        self.size = 0
+        # (domain, path, name) -> cookie, least recently used first
+        self._lru = None
+        self._lru_by_site = None
+        # sites which may be over max_per_domain
+        self._over = set()
+        self._local = threading.local()
+
+    def attach_file(self, cookie_file) -> None:
+        """Adds the cookies of a :class:`aninja.cookiefile.CookieFile`, as
+        if they were set now. They're read when their site is used."""
+        with self._cookies_lock:
+            for domain, start, count in cookie_file.domains():
+                site = registrable_domain(domain)
+                self._pending.setdefault(site, []).append(
+                    (cookie_file, domain, start, count))
+            # cookies already there are older than the file's.
+            for site in [s for s in self._pending if s in self.index._sites]:
+                self._materialize_site(site)
 
-    pass
+    def materialize(self, domain=None, host=None) -> None:
+        """Reads attached cookies of the site of ``domain``, of those sent
+        to ``host``, or all of them."""
+        if not self._pending:
+            return
+        with self._cookies_lock:
+            if domain is None and host is None:
+                for site in list(self._pending):
+                    self._materialize_site(site)
+                return
+            # cookies without a domain are sent to every host.
+            self._materialize_site("")
+            self._materialize_site(registrable_domain(domain or host))
+
+    def _materialize_site(self, site) -> None:
+        for cookie_file, _, start, count in self._pending.pop(site, ()):
+            for cookie in cookie_file.read(start, count):
+                self._store(cookie)
+            cookie_file.release(count)
+
+    def _store(self, cookie):
+        names = self._cookies.setdefault(cookie.domain, {}).setdefault(
+            cookie.path, {}
+        )
+        old = names.get(cookie.name)
+        names[cookie.name] = cookie
+        if old is not None:
+            self.index.discard(old)
+        self.index.add(cookie)
+        site = self._track(cookie, old)
+        if site is not None:
+            self._over.add(site)
+
+    def pending_domains(self) -> dict:
+        """returns the number of attached cookies not read yet by domain."""
+        counts = {}
+        with self._cookies_lock:
+            for entries in self._pending.values():
+                for _, domain, _, count in entries:
+                    counts[domain] = counts.get(domain, 0) + count
+        return counts
+
+    def __iter__(self):
+        self.materialize()
+        return super().__iter__()
+
+    def __len__(self):
+        with self._cookies_lock:
+            return sum(
+                len(names)
+                for paths in self._cookies.values()
+                for names in paths.values()
+            ) + sum(
+                count
+                for entries in self._pending.values()
+                for _, _, _, count in entries
+            )
+
+    def _cookies_for_request(self, request):
+        self.materialize()
+        return super()._cookies_for_request(request)
+
+    def add_listener(self, listener) -> None:
+        """``listener(cookie, removed)`` will be called after a cookie is set
+        or removed."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        self._listeners.remove(listener)
+
+    @property
+    def evicting(self) -> bool:
+        """whether the cookies being removed, in this thread, are over the
+        limits rather than deleted or expired."""
+        return getattr(self._local, "evicting", False)
+
+    def _notify(self, cookie, removed=False):
+        for listener in self._listeners:
+            listener(cookie, removed)
+
+    def set(self, name, value, **kwargs):
+        """Same as :meth:`RequestsCookieJar.set`, without building a
+        :class:`http.cookiejar.Cookie` first."""
+        if value is None or isinstance(value, Morsel):
+            return super().set(name, value, **kwargs)
+        kwargs.setdefault("discard", True)
+        cookie = create_cookie(name, value, **kwargs)
+        self.set_cookie(cookie)
+        return cookie
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        if type(cookie) is not CookieRecord:
+            cookie = CookieRecord.from_cookie(cookie)
+        with self._cookies_lock:
+            if self._pending:
+                self.materialize(cookie.domain)
+            old = (
+                self._cookies.get(cookie.domain, {})
+                .get(cookie.path, {})
+                .get(cookie.name)
+            )
+            super().set_cookie(cookie, *args, **kwargs)
+            if old is not None:
+                self.index.discard(old)
+            self.index.add(cookie)
+            site = self._track(cookie, old)
+        self._notify(cookie)
+        if site is not None:
+            self._evict_lru(site)
+
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            self.materialize(domain)
+            if domain is None:
+                removed = list(self)
+                super().clear()
+                self.index.clear()
+                self._expiry.clear()
+                self._stale = 0
+                self._over.clear()
+                if self._lru is not None:
+                    self._lru.clear()
+                    self._lru_by_site.clear()
+                    self.size = 0
+            elif name is not None:
+                removed = [self._cookies[domain][path][name]]
+            elif path is not None:
+                removed = list(self._cookies[domain][path].values())
+            else:
+                removed = [
+                    cookie
+                    for names in self._cookies[domain].values()
+                    for cookie in names.values()
+                ]
+            if domain is not None:
+                super().clear(domain, path, name)
+                # evicted cookies shouldn't leave empty dicts behind.
+                paths = self._cookies.get(domain)
+                if paths is not None:
+                    if path is not None and not paths[path]:
+                        del paths[path]
+                    if not paths:
+                        del self._cookies[domain]
+                for cookie in removed:
+                    self.index.discard(cookie)
+                    self._untrack(cookie)
+        for cookie in removed:
+            self._notify(cookie, removed=True)
+
+    def _track(self, cookie, old):
+        """Records a stored cookie. returns its site if it's limited."""
+        if cookie.expires is not None:
+            heapq.heappush(
+                self._expiry, (cookie.expires, next(self._counter), cookie)
+            )
+        if old is not None and old.expires is not None:
+            self._stale += 1
+            if self._stale > 1024 and 2 * self._stale > len(self._expiry):
+                self._compact_expiry()
+        return self._track_use(cookie, old)
+
+    def _track_use(self, cookie, old):
+        if self._lru is None:
+            return None
+        key = (cookie.domain, cookie.path, cookie.name)
+        site = registrable_domain(cookie.domain)
+        names = self._lru_by_site.setdefault(site, OrderedDict())
+        names[key] = None
+        names.move_to_end(key)
+        if old is not None:
+            self.size -= _estimated_size(old)
+        self._lru[key] = cookie
+        self._lru.move_to_end(key)
+        self.size += _estimated_size(cookie)
+        return site
+
+    def _untrack(self, cookie):
+        # heap entries are dropped when they're popped.
+        if cookie.expires is not None:
+            self._stale += 1
+        if self._lru is None:
+            return
+        key = (cookie.domain, cookie.path, cookie.name)
+        if self._lru.pop(key, None) is None:
+            return
+        self.size -= _estimated_size(cookie)
+        site = registrable_domain(cookie.domain)
+        names = self._lru_by_site[site]
+        del names[key]
+        if not names:
+            del self._lru_by_site[site]
+
+    def _compact_expiry(self):
+        self._expiry = [e for e in self._expiry if self._is_stored(e[2])]
+        heapq.heapify(self._expiry)
+        self._stale = 0
+
+    def _is_stored(self, cookie):
+        return (
+            self._cookies.get(cookie.domain, {})
+            .get(cookie.path, {})
+            .get(cookie.name)
+            is cookie
+        )
+
+    def set_limits(self, max_per_domain=None, max_bytes=None) -> None:
+        """Limits the number of cookies of each site, see
+        :func:`registrable_domain`, and the estimated memory used by all
+        cookies. The least recently used cookies are removed first. ``None``
+        means no limit."""
+        with self._cookies_lock:
+            self.max_per_domain = max_per_domain
+            self.max_bytes = max_bytes
+            # the order of use is kept if it's known.
+            if self._lru is not None:
+                cookies = list(self._lru.values())
+            else:
+                cookies = list(super().__iter__())
+            self._lru = self._lru_by_site = None
+            self.size = 0
+            if max_per_domain is None and max_bytes is None:
+                return
+            self._lru = OrderedDict()
+            self._lru_by_site = {}
+            for cookie in cookies:
+                self._over.add(self._track_use(cookie, None))
+        self.evict()
+
+    def touch(self, cookies) -> None:
+        """Marks cookies as used, so they're the last ones removed by the
+        limits."""
+        if self._lru is None:
+            return
+        with self._cookies_lock:
+            for cookie in cookies:
+                key = (cookie.domain, cookie.path, cookie.name)
+                if self._lru.get(key) is cookie:
+                    self._lru.move_to_end(key)
+                    self._lru_by_site[
+                        registrable_domain(cookie.domain)
+                    ].move_to_end(key)
+
+    def evict(self, now=None) -> int:
+        """Removes expired cookies, unless :attr:`keep_expired` is set, and
+        cookies over the limits. returns the number removed.
+
+        It's cheap when there is nothing to remove, and each removal costs
+        O(log n).
+        """
+        n = 0
+        if (
+            self._expiry
+            and not self.keep_expired
+            and self._expiry[0][0] <= (now or time.time())
+        ):
+            n += self._evict_expired(now or time.time())
+        while self._over:
+            n += self._evict_lru(self._over.pop())
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            n += self._evict_lru(None)
+        return n
+
+    def _evict_expired(self, now):
+        expired = {}
+        with self._cookies_lock:
+            heap = self._expiry
+            while heap and heap[0][0] <= now:
+                _, _, cookie = heapq.heappop(heap)
+                # stale, or about to be once removed.
+                self._stale -= 1
+                if self._is_stored(cookie):
+                    # a cookie set twice is in the heap twice.
+                    expired[id(cookie)] = cookie
+        for cookie in expired.values():
+            self.clear(cookie.domain, cookie.path, cookie.name)
+        return len(expired)
+
+    def _evict_lru(self, site):
+        """Removes least recently used cookies of ``site`` over
+        :attr:`max_per_domain`, and any over :attr:`max_bytes`."""
+        victims = {}
+        with self._cookies_lock:
+            if self._lru is None:
+                return 0
+            names = self._lru_by_site.get(site)
+            if self.max_per_domain is not None and names:
+                excess = len(names) - self.max_per_domain
+                for key in itertools.islice(names, max(excess, 0)):
+                    victims[key] = self._lru[key]
+            if self.max_bytes is not None and self.size > self.max_bytes:
+                size = self.size - sum(map(_estimated_size, victims.values()))
+                for key, cookie in self._lru.items():
+                    if size <= self.max_bytes:
+                        break
+                    if key not in victims:
+                        victims[key] = cookie
+                        size -= _estimated_size(cookie)
+        self._local.evicting = True
+        try:
+            for domain, path, name in victims:
+                self.clear(domain, path, name)
+        finally:
+            self._local.evicting = False
+        return len(victims)
+
+    def clear_expired_cookies(self):
+        self.evict()
+
+    def as_lwp_str(self, ignore_discard=True, ignore_expires=True):
+        """Same as :meth:`LWPCookieJar.as_lwp_str`, but host-only cookies
+        get a ``HostOnly`` attribute, since the format only tells them apart
+        by a missing leading dot."""
+        now = time.time()
+        lines = []
+        for cookie in self:
+            if not ignore_discard and cookie.discard:
+                continue
+            if not ignore_expires and cookie.is_expired(now):
+                continue
+            if cookie.domain and not cookie.domain_specified:
+                cookie = copy.copy(cookie)
+                cookie.set_nonstandard_attr(_HOST_ONLY, None)
+            lines.append("Set-Cookie3: %s" % lwp_cookie_str(cookie))
+        return "\n".join(lines + [""])
+
+    def load(self, filename=None, ignore_discard=False, ignore_expires=False):
+        """Same as :meth:`LWPCookieJar.load`, but cookies without a leading
+        dot are domain cookies, as :func:`create_cookie` makes them, unless
+        :meth:`as_lwp_str` saved them host-only."""
+        loaded = LWPCookieJar()
+        loaded.load(filename or self.filename, ignore_discard, ignore_expires)
+        for cookie in loaded:
+            record = CookieRecord.from_cookie(cookie)
+            if record.domain and not record.domain_initial_dot:
+                record.domain_specified = not record.has_nonstandard_attr(
+                    _HOST_ONLY
+                )
+                record._rest = shared_rest(
+                    {k: v for k, v in record._rest.items() if k != _HOST_ONLY}
+                )
+            self.set_cookie(record)
+
+    def __getstate__(self):
+        self.materialize()
+        state = super().__getstate__()
+        for name in ("_listeners", "_pending", "_expiry", "_stale",
+                     "_counter", "_lru",
+                     "_lru_by_site", "_over", "size", "_local"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._listeners = []
+        self._pending = {}
+        self.index = CookieIndex()
+        self._expiry = []
+        self._stale = 0
+        self._counter = itertools.count()
+        self._over = set()
+        self._local = threading.local()
+        limits = self.max_per_domain, self.max_bytes
+        self._lru = self._lru_by_site = None
+        for cookie in self:
+            self.index.add(cookie)
+            self._track(cookie, None)
+        self.set_limits(*limits)
 
 
 class CookiesManager:
@@ -32,112 +621,493 @@ class CookiesManager:
 
     Synchronize information between different types of cookies. Also
     save and load cookies with files.
+
+    Expired cookies are removed when cookies are read, unless
+    :meth:`never_expires` is called. The least recently set or sent cookies
+    are removed when there are too many.
+
+    Args:
+        output_cache_size: max number of outputs cached.
+        backend: a :class:`aninja.backends.CookieBackend` to share cookies
+            with other managers, in other processes too. Cookies are only
+            kept in memory if it's not set.
+        max_per_domain: max number of cookies of a site, see
+            :meth:`NinjaCookieJar.set_limits`.
+        max_bytes: memory budget of the cookies, estimated.
+
+    Attributes:
+        version: incremented by every cookie set or removed. The ``sync_to_*``
+            methods remember the version each client was synced at, and send
+            it only the cookies changed since, removals included. Pages are
+            tracked by browser context, since the context holds the cookies.
+        max_changes: max number of changes remembered. Clients synced before
+            the oldest one get every cookie again.
     """
 
-    def __init__(self) -> None:
+    max_changes = 65536
+
+    def __init__(self, output_cache_size=1024, backend=None,
+                 max_per_domain=None, max_bytes=None) -> None:
         self._jar = NinjaCookieJar()
+        if max_per_domain is not None or max_bytes is not None:
+            self._jar.set_limits(max_per_domain, max_bytes)
+        self._output_cache = OutputCache(output_cache_size)
+        self.version = 0
+        # (domain, path, name) -> (version, cookie or None), latest last
+        self._changes = OrderedDict()
+        self._forgotten = 0
+        # id(client) -> version it was synced at
+        self._synced = {}
+        self._jar.add_listener(self._on_cookie_change)
+        self.backend = backend
+        if backend is not None:
+            self._backend_version = 0
+            # pulled changes are skipped by _write_through, only in the
+            # thread applying them.
+            self._local = threading.local()
+            self.refresh()
+            self._jar.add_listener(self._write_through)
+        metrics.track_cookies_manager(self)
+
+    def _on_cookie_change(self, cookie, removed):
+        self._output_cache.invalidate(registrable_domain(cookie.domain))
+        self.version += 1
+        key = (cookie.domain, cookie.path, cookie.name)
+        self._changes.pop(key, None)
+        self._changes[key] = (self.version, None if removed else cookie)
+        if len(self._changes) > self.max_changes:
+            self._forget_changes()
+
+    def _forget_changes(self):
+        """Drops changes every client has, and the oldest ones if there are
+        still too many."""
+        floor = min(self._synced.values(), default=self.version)
+        changes = self._changes
+        while changes:
+            version, _ = next(iter(changes.values()))
+            if version > floor and len(changes) <= self.max_changes:
+                break
+            changes.popitem(last=False)
+            self._forgotten = version
+
+    def changes_since(self, version):
+        """returns ``[(domain, path, name, cookie)]`` for cookies set or
+        removed after ``version``, ``cookie`` being ``None`` for a removed
+        one, or ``None`` if changes that old are forgotten."""
+        if version < self._forgotten:
+            return None
+        changes = []
+        for key in reversed(self._changes):
+            v, cookie = self._changes[key]
+            if v <= version:
+                break
+            changes.append((*key, cookie))
+        changes.reverse()
+        return changes
+
+    def synced_version(self, client):
+        """returns the version a session's cookie jar, a cookie jar or a page
+        was last synced at, ``None`` if it never was. Pages share the version
+        of their browser context, which holds their cookies."""
+        return self._synced.get(id(_browser_context(client)))
+
+    def detach(self, client) -> None:
+        """Forgets a client, whose next sync will send every cookie. Do it
+        when its cookies are changed outside the manager. For a page, every
+        page of its browser context is forgotten."""
+        self._synced.pop(id(_browser_context(client)), None)
+
+    def _changes_for(self, client, full=False):
+        version = self._synced.get(id(client))
+        if version is None:
+            weakref.finalize(client, self._synced.pop, id(client), None)
+            return None
+        if full:
+            return None
+        return self.changes_since(version)
+
+    def _synced_at(self, client, version):
+        self._synced[id(client)] = version
+        if self._changes and min(self._synced.values()) >= next(
+                iter(self._changes.values()))[0]:
+            self._forget_changes()
+
+    def _write_through(self, cookie, removed):
+        # cookies evicted over the limits are still in the backend.
+        if (getattr(self._local, "pulling", False)
+                or (removed and self._jar.evicting)):
+            return
+        if removed:
+            self.backend.delete(cookie.domain, cookie.path, cookie.name)
+        else:
+            self.backend.put(cookie)
+
+    def refresh(self) -> int:
+        """Pulls the changes made by others to :attr:`backend`.
+
+        It's done before cookies are read when the last pull is older than
+        the ``poll_interval`` of the backend. returns the number of changes.
+        """
+        self._polled_at = time.monotonic()
+        version, changes = self.backend.changes_since(self._backend_version)
+        self._local.pulling = True
+        try:
+            for domain, path, name, cookie in changes:
+                if cookie is None:
+                    self._remove(domain, path, name)
+                else:
+                    self._jar.set_cookie(cookie)
+        finally:
+            self._local.pulling = False
+        self._backend_version = version
+        return len(changes)
+
+    def _prepare(self):
+        """Pulls changes from the backend and evicts cookies, before cookies
+        are read."""
+        if (
+            self.backend is not None
+            and time.monotonic() - self._polled_at
+            >= self.backend.poll_interval
+        ):
+            self.refresh()
+        self._jar.evict()
+
+    def _outgoing(self, cookie):
+        if self._jar.keep_expired:
+            cookie = copy.copy(cookie)
+            cookie.expires = int(time.time()) + _NEVER
+        return cookie
+
+    def _cached_output(self, kind, build, domain, path, url):
+        self._prepare()
+        key = (kind, domain, path, None if url is None else str(url))
+        value = self._output_cache.get(key)
+        if value is None:
+            if url is not None:
+                site = registrable_domain(URL(url).raw_host or "")
+            elif domain is not None:
+                site = registrable_domain(domain)
+            else:
+                site = None
+            cookies = list(self._select(domain, path, url))
+            value = build(cookies)
+            expires = None
+            if url is not None:
+                self._jar.touch(cookies)
+            if url is not None and not self._jar.keep_expired:
+                # expired cookies are left out of url queries only.
+                expires = min(
+                    (c.expires for c in cookies if c.expires is not None),
+                    default=None,
+                )
+            self._output_cache.put(key, site, value, expires)
+        return value
+
+    def load(self, filename, format=None):
+        """Load cookies from the file :attr:`.API.cookies_filename`
+
+        Args:
+            format: ``"lwp"`` or ``"binary"``, see :meth:`save`. It's
+                detected from the file if it's not set. Cookies of a binary
+                file are read when their site is first used.
+        """
+        if format is None:
+            format = "binary" if is_cookie_file(filename) else "lwp"
+        if format == "binary":
+            # attached cookies don't go through the listeners.
+            for client in self._synced:
+                self._synced[client] = -1
+        if format == "binary" and self.backend is not None:
+            # they're set one by one to reach the backend.
+            cookie_file = CookieFile(filename)
+            for cookie in cookie_file.read(0, cookie_file.n_cookies):
+                self._jar.set_cookie(cookie)
+            cookie_file.close()
+        elif format == "binary":
+            self._jar.attach_file(CookieFile(filename))
+            self._output_cache.clear()
+        elif format == "lwp":
+            self._jar.load(filename, ignore_discard=True, ignore_expires=True)
+        else:
+            raise ValueError("unknown cookie file format: %r" % format)
+
+    def save(self, filename, format="lwp"):
+        """Save cookies to the file
 
-    def load(self, filename):
-        """Load cookies from the file :attr:`.API.cookies_filename`"""
-        self._jar.load(filename, ignore_discard=True, ignore_expires=True)
+        Args:
+            format: ``"lwp"``, the text format of
+                :class:`http.cookiejar.LWPCookieJar`, or ``"binary"``, the
+                format of :mod:`aninja.cookiefile` which is faster to load
+                and keeps every cookie attribute.
 
-    def save(self, filename):
-        """Save cookies to the file"""
-        self._jar.save(filename, ignore_discard=True, ignore_expires=True)
+        After :meth:`never_expires`, cookies are saved as they're synced, to
+        expire in 50 years.
+        """
+        if format not in ("binary", "lwp"):
+            raise ValueError("unknown cookie file format: %r" % format)
+        jar = self._jar
+        if jar.keep_expired:
+            jar = NinjaCookieJar()
+            for cookie in self._jar:
+                jar.set_cookie(self._outgoing(cookie))
+        if format == "binary":
+            dump(jar, filename)
+        else:
+            jar.save(filename, ignore_discard=True, ignore_expires=True)
+
+    def persist(self, directory, interval=1.0, **kwargs) -> CookieJournal:
+        """Loads cookies kept in ``directory`` and keeps every later change
+        there, written in the background every ``interval`` seconds.
+
+        Returns the :class:`aninja.journal.CookieJournal`, which should be
+        closed to write the last changes. ``kwargs`` are passed to it.
+        """
+        return CookieJournal(self, directory, interval, **kwargs).open()
 
     def update(self, other):
         """updates with cookies from another CookieJar or dict-like, same as RequestsCookieJar"""
         self._jar.update(other)
 
-    def never_expires(self):
-        for cookie in self._jar:
-            cookie.expires = int(time.time()) + 50 * 365 * 24 * 3600
+    def never_expires(self, enabled=True):
+        """Keeps expired cookies, and syncs, outputs and saves every cookie as
+        if it expired in 50 years. Cookies themselves are left as they are."""
+        self._jar.keep_expired = enabled
+        self._output_cache.clear()
+        for client in self._synced:
+            self._synced[client] = -1
 
     def update_from_aiohttp_session(self, session) -> None:
-        for morsel in session.cookie_jar:
-            self._jar.set_cookie(morsel_to_cookie(morsel))
+        with metrics.COOKIES_SYNC_SECONDS.time("from_aiohttp"):
+            for morsel in session.cookie_jar:
+                self._jar.set_cookie(morsel_to_cookie(morsel))
 
     async def update_from_pyppeteer(self, page: _Page) -> None:
-        cookies_list = await page.cookies()
-        for cookie_dict in cookies_list:
-            f = filter_attrs(time_format="number", **cookie_dict)
-            name = f.pop("name")
-            value = f.pop("value")
-            cookie = create_cookie(name, value, **f)
-            self._jar.set_cookie(cookie)
-
-    def update_from_simplecookie(self, simplecookie):
+        with metrics.COOKIES_SYNC_SECONDS.time("from_pyppeteer"):
+            cookies_list = await page.cookies()
+            for cookie_dict in cookies_list:
+                f = filter_attrs(time_format="number", **cookie_dict)
+                name = f.pop("name")
+                value = f.pop("value")
+                cookie = create_cookie(name, value, **f)
+                self._jar.set_cookie(cookie)
+
+    def update_from_response(self, response) -> None:
+        """Merges cookies set by an aiohttp response and the redirects before
+        it.
+
+        Only the ``Set-Cookie`` headers of those responses are read, so the
+        cost depends on the response, not on the size of the jar.
+        """
+        with metrics.COOKIES_SYNC_SECONDS.time("from_response"):
+            for resp in (*response.history, response):
+                self.update_from_simplecookie(resp.cookies, url=resp.url)
+
+    def update_from_headers(self, set_cookie_headers, url) -> None:
+        """Merges cookies from raw ``Set-Cookie`` header values of a response
+        from ``url``. Values which can't be parsed are ignored.
+        """
+        with metrics.COOKIES_SYNC_SECONDS.time("from_headers"):
+            for header in set_cookie_headers:
+                simplecookie = SimpleCookie()
+                try:
+                    simplecookie.load(header)
+                except CookieError:
+                    continue
+                self.update_from_simplecookie(simplecookie, url=url)
+
+    def update_from_simplecookie(self, simplecookie, url=None):
+        """Merges morsels into the jar.
+
+        Args:
+            simplecookie: a :class:`http.cookies.SimpleCookie` or any mapping
+                of morsels.
+            url: the url of the response which set the morsels. If it's set,
+                missing domain and path are filled as a browser does, morsels
+                for other domains are ignored and expired morsels delete the
+                stored cookies.
+        """
         for morsel in simplecookie.values():
-            self._jar.set_cookie(morsel_to_cookie(morsel))
+            host_only = False
+            if url is not None:
+                morsel, host_only = _complete_morsel(morsel, URL(url))
+                if morsel is None:
+                    continue
+            cookie = morsel_to_cookie(morsel)
+            if host_only:
+                cookie.domain_specified = False
+            if (
+                url is not None
+                and cookie.expires is not None
+                and cookie.expires <= time.time()
+            ):
+                self._remove(cookie.domain, cookie.path, cookie.name)
+            else:
+                self._jar.set_cookie(cookie)
 
-    def sync_to_aiohttp_session(self, session) -> None:
-        session.cookie_jar.update_cookies(self.output_simplecookie())
+    def sync_to_aiohttp_session(self, session, full=False) -> None:
+        """Sends cookies changed since the last sync to the cookie jar of an
+        aiohttp session, or all of them the first time or if ``full``."""
+        with metrics.COOKIES_SYNC_SECONDS.time("to_aiohttp"):
+            jar = session.cookie_jar
+            self._prepare()
+            version = self.version
+            changes = self._changes_for(jar, full)
+            if changes is None:
+                jar.update_cookies(self.output_simplecookie())
+            else:
+                # removals are expired morsels, which the jar drops by key
+                # instead of looking at every cookie.
+                jar.update_cookies(
+                    [
+                        (
+                            name,
+                            _removal_morsel(domain, path, name)
+                            if cookie is None
+                            else cookie_to_morsel(self._outgoing(cookie)),
+                        )
+                        for domain, path, name, cookie in changes
+                    ]
+                )
+            self._synced_at(jar, version)
+
+    def sync_to_cookiejar(self, cookiejar: _CookieJar, full=False) -> None:
+        """Sends cookies changed since the last sync to a cookie jar, or all
+        of them the first time or if ``full``."""
+        with metrics.COOKIES_SYNC_SECONDS.time("to_cookiejar"):
+            self._prepare()
+            version = self.version
+            changes = self._changes_for(cookiejar, full)
+            if changes is None:
+                for cookie in self._jar:
+                    cookiejar.set_cookie(self._outgoing(cookie).to_cookie())
+            else:
+                for domain, path, name, cookie in changes:
+                    if cookie is not None:
+                        cookiejar.set_cookie(self._outgoing(cookie).to_cookie())
+                        continue
+                    try:
+                        cookiejar.clear(domain, path, name)
+                    except KeyError:
+                        pass
+            self._synced_at(cookiejar, version)
 
-    def sync_to_cookiejar(self, cookiejar: _CookieJar) -> None:
-        cookiejar.update(self._jar)
+    async def sync_to_pyppeteer(
+        self, page: _Page, url=None, batch_size=1000, full=False
+    ) -> None:
+        """Pushes cookies to a page with a single ``Network.setCookies`` call
+        per ``batch_size`` cookies.
 
-    async def sync_to_pyppeteer(self, page: _Page) -> None:
-        if len(self):
-            for cookie_dict in self.output_detailed():
-                await page.setCookie(cookie_dict)
+        Args:
+            page: a pyppeteer page.
+            url: if it's set, only cookies which would be sent to the url are
+                pushed. Otherwise only cookies changed since the last sync
+                of the page's browser context are, removals included, unless
+                it's the first one or ``full`` is set.
+            batch_size: max number of cookies in one call.
+        """
+        with metrics.COOKIES_SYNC_SECONDS.time("to_pyppeteer"):
+            default_url = url or page.url
+            if not default_url.startswith("http"):
+                default_url = None
+            self._prepare()
+            version = self.version
+            changes = None
+            context = _browser_context(page)
+            if url is None:
+                changes = self._changes_for(context, full)
+            if changes is None:
+                cookies = self._select(url=url)
+            else:
+                cookies = [c for _, _, _, c in changes if c is not None]
+                for domain, path, name, cookie in changes:
+                    if cookie is not None:
+                        continue
+                    params = {"name": name, "path": path}
+                    if domain:
+                        params["domain"] = domain
+                    elif default_url:
+                        # they were set for the url, see cookie_to_pyppeteer
+                        params["url"] = default_url
+                    else:
+                        continue
+                    await page._client.send("Network.deleteCookies", params)
+            items = []
+            for cookie in cookies:
+                item = cookie_to_pyppeteer(self._outgoing(cookie), default_url)
+                if item is not None:
+                    items.append(item)
+            for i in range(0, len(items), batch_size):
+                await page._client.send(
+                    "Network.setCookies", {"cookies": items[i : i + batch_size]}
+                )
+            if url is None:
+                self._synced_at(context, version)
 
-    def output_header_string(self, domain=None, path=None) -> str:
-        return "; ".join(
-            [k + "=" + v for k, v in self.output_dict(domain, path).items()]
+    def cookies_for_url(self, url) -> list:
+        """returns cookies which would be sent with a request to the url."""
+        self._prepare()
+        self._jar.materialize(host=URL(url).raw_host or "")
+        cookies = list(
+            self._jar.index.match(url, expired=self._jar.keep_expired)
         )
+        self._jar.touch(cookies)
+        return cookies
 
-    def output_js(self, domain=None, path=None) -> str:
-        return self.output_simplecookie(domain, path).js_output()
+    def _select(self, domain=None, path=None, url=None):
+        self._prepare()
+        if url is not None:
+            self._jar.materialize(host=URL(url).raw_host or "")
+            return self._jar.index.match(url, expired=self._jar.keep_expired)
+        if domain is None and path is None:
+            return iter(self._jar)
+        self._jar.materialize(domain)
+        return self._jar.index.lookup(domain, path)
 
-    def output_js_function(self, domain=None, path=None) -> str:
-        func_str = "(()=>{"
-        for cookie_dict in self.output_detailed(domain, path):
-            name = cookie_dict.pop("name")
-            value = cookie_dict.pop("value")
-            func_str += 'document.cookie = "{}={}; '.format(name, value)
+    def output_header_string(self, domain=None, path=None, url=None) -> str:
+        return self._cached_output(
+            "header", _build_header_string, domain, path, url
+        )
 
-            cookie = ["{}={}".format(a, b) for a, b in cookie_dict.items()]
-            append = '{}";\n'.format("; ".join(cookie))
-            func_str += append
-        func_str += "})();"
+    def output_js(self, domain=None, path=None, url=None) -> str:
+        return self.output_simplecookie(domain, path, url).js_output()
 
-        return func_str
+    def output_js_function(self, domain=None, path=None, url=None) -> str:
+        return self._cached_output(
+            "js_function",
+            lambda cookies: _build_js_function(map(self._outgoing, cookies)),
+            domain,
+            path,
+            url,
+        )
 
-    def output_dict(self, domain=None, path=None) -> dict:
+    def output_dict(self, domain=None, path=None, url=None) -> dict:
         """returns a plain old Python dict of name-value pairs of cookies.
+
+        Cookies can be selected by exact ``domain`` and ``path``, or by the
+        ``url`` they would be sent to.
         """
-        return self._jar.get_dict(domain, path)
+        return {cookie.name: cookie.value for cookie in self._select(domain, path, url)}
 
-    def output_json(self, domain=None, path=None) -> str:
-        return json.dumps(self.output_detailed(domain, path))
+    def output_json(self, domain=None, path=None, url=None) -> str:
+        return self._cached_output(
+            "json",
+            lambda cookies: json.dumps(_detail(map(self._outgoing, cookies))),
+            domain,
+            path,
+            url,
+        )
 
-    def output_detailed(self, domain=None, path=None) -> list:
+    def output_detailed(self, domain=None, path=None, url=None) -> list:
         """returnes a list of dictionaries which contain name, value and other
         attributes for cookie.
         """
-        rlist = []
-        for cookie in iter(self._jar):
-            if (domain is None or cookie.domain == domain) and (
-                path is None or cookie.path == path
-            ):
-                dictionary = {
-                    "name": cookie.name,
-                    "value": cookie.value,
-                    "domain": cookie.domain,
-                    "path": cookie.path,
-                }
-                if cookie.expires:
-                    dictionary["expires"] = cookie.expires
-                rlist.append(dictionary)
-        return rlist
-
-    def output_simplecookie(self, domain=None, path=None):
+        return _detail(map(self._outgoing, self._select(domain, path, url)))
+
+    def output_simplecookie(self, domain=None, path=None, url=None):
         C = SimpleCookie()
-        for cookie in iter(self._jar):
-            if (domain is None or cookie.domain == domain) and (
-                path is None or cookie.path == path
-            ):
-                C[cookie.name] = cookie_to_morsel(cookie)
+        for cookie in self._select(domain, path, url):
+            C[cookie.name] = cookie_to_morsel(self._outgoing(cookie))
         return C
 
     def output_cookiejar(self):
@@ -149,13 +1119,49 @@ class CookiesManager:
     def set_cookie(self, cookie, *args, **kwargs):
         return self._jar.set_cookie(cookie, *args, **kwargs)
 
+    def _remove(self, domain, path, name):
+        try:
+            self._jar.clear(domain, path, name)
+        except KeyError:
+            pass
+
     def copy(self) -> "CookiesManager":
-        m = CookiesManager()
-        m.update(self._jar)
+        """returns a manager with the same cookies, without the backend.
+
+        Only the containers are copied: cookies are shared, since they're
+        replaced rather than changed.
+        """
+        m = CookiesManager(self._output_cache.maxsize)
+        self._jar.materialize()
+        with self._jar._cookies_lock:
+            m._jar._cookies = {
+                domain: {path: dict(names) for path, names in paths.items()}
+                for domain, paths in self._jar._cookies.items()
+            }
+            m._jar.index = self._jar.index.copy()
+            # new sequence numbers keep the order, so it's still a heap, and
+            # the copy's counter can't tie with them.
+            m._jar._expiry = [
+                (expires, next(m._jar._counter), cookie)
+                for expires, _, cookie in self._jar._expiry
+            ]
+            m._jar._stale = self._jar._stale
+            m._jar.keep_expired = self._jar.keep_expired
+        if self._jar._lru is not None:
+            m._jar.set_limits(self._jar.max_per_domain, self._jar.max_bytes)
         return m
 
+    def domains(self) -> dict:
+        """returns the number of cookies of each domain."""
+        with self._jar._cookies_lock:
+            counts = self._jar.pending_domains()
+            for domain, paths in self._jar._cookies.items():
+                counts[domain] = counts.get(domain, 0) + sum(
+                    len(names) for names in paths.values())
+            return counts
+
     def __len__(self):
-        return len(self._jar.values())
+        return len(self._jar)
 
     def __str__(self):
         return str(self._jar)
@@ -163,6 +1169,151 @@ class CookiesManager:
     __repr__ = __str__
 
 
+# name, value, domain and path aside
+COOKIE_OVERHEAD = 300
+
+_NEVER = 50 * 365 * 24 * 3600
+
+_HTTP_ONLY = {"HttpOnly": None}
+
+_HOST_ONLY = "HostOnly"
+
+
+def _estimated_size(cookie):
+    return (
+        COOKIE_OVERHEAD
+        + len(cookie.name)
+        + len(cookie.value or "")
+        + len(cookie.domain)
+        + len(cookie.path)
+    )
+
+
+def _browser_context(page):
+    """returns the browser context of a pyppeteer page, which holds its
+    cookies, or ``page`` itself if it's not a page."""
+    target = getattr(page, "target", None)
+    context = getattr(target, "browserContext", None)
+    return page if context is None else context
+
+
+def _removal_morsel(domain, path, name):
+    morsel = create_morsel(name, "", domain=domain, path=path)
+    morsel["max-age"] = "0"
+    return morsel
+
+
+def _detail(cookies):
+    rlist = []
+    for cookie in cookies:
+        dictionary = {
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+        }
+        if cookie.expires:
+            dictionary["expires"] = cookie.expires
+        rlist.append(dictionary)
+    return rlist
+
+
+def _build_header_string(cookies):
+    pairs = {cookie.name: cookie.value for cookie in cookies}
+    return "; ".join([k + "=" + v for k, v in pairs.items()])
+
+
+def _build_js_function(cookies):
+    func_str = "(()=>{"
+    for cookie_dict in _detail(cookies):
+        name = cookie_dict.pop("name")
+        value = cookie_dict.pop("value")
+        func_str += 'document.cookie = "{}={}; '.format(name, value)
+
+        cookie = ["{}={}".format(a, b) for a, b in cookie_dict.items()]
+        append = '{}";\n'.format("; ".join(cookie))
+        func_str += append
+    func_str += "})();"
+
+    return func_str
+
+
+def _complete_morsel(morsel, url):
+    """Fills the domain and the path of a morsel received from ``url`` the way
+    aiohttp's cookie jar does. Returns the morsel and whether it's host-only,
+    i.e. it has no domain and is only sent back to the host of ``url``, or
+    ``(None, False)`` if the morsel is for a domain ``url`` cannot set cookies
+    for.
+    """
+    hostname = url.raw_host or ""
+    domain = morsel["domain"]
+    if domain.endswith("."):
+        domain = ""
+    domain = domain.lstrip(".")
+    if domain and not domain_match(hostname, domain):
+        return None, False
+
+    path = morsel["path"]
+    if not path or not path.startswith("/"):
+        path = url.path
+        if not path.startswith("/"):
+            path = "/"
+        else:
+            path = "/" + path[1 : path.rfind("/")]
+
+    if domain == morsel["domain"] and path == morsel["path"] and domain:
+        return morsel, False
+    morsel = morsel.copy()
+    morsel["domain"] = domain or hostname
+    morsel["path"] = path
+    return morsel, not domain
+
+
+def domain_match(hostname, domain):
+    """RFC 6265 domain-match: ``hostname`` is ``domain`` or a subdomain of it.
+    """
+    if hostname == domain:
+        return True
+    return hostname.endswith("." + domain) and not _is_ip_address(hostname)
+
+
+def path_match(request_path, cookie_path):
+    """RFC 6265 path-match."""
+    if request_path == cookie_path:
+        return True
+    if not request_path.startswith(cookie_path):
+        return False
+    return cookie_path.endswith("/") or request_path[len(cookie_path)] == "/"
+
+
+# Second-level labels under which country code TLDs register domains,
+# e.g. ``example.co.uk``. A small heuristic instead of the public suffix list.
+_SECOND_LEVEL_LABELS = frozenset(
+    ("ac", "co", "com", "edu", "gov", "net", "org", "ne", "or", "go")
+)
+
+
+def registrable_domain(domain):
+    """returns the registrable part of a domain, e.g. ``example.com`` for
+    ``.www.example.com``. IP addresses and single labels are returned as is.
+    """
+    domain = domain.lstrip(".").lower()
+    labels = domain.split(".")
+    if len(labels) <= 2 or _is_ip_address(domain):
+        return domain
+    if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def _is_ip_address(hostname):
+    try:
+        ipaddress.ip_address(hostname)
+    except ValueError:
+        return False
+    return True
+
+
 def morsel_to_cookie(morsel):
     """Convert a Morsel object into a Cookie containing the one k/v pair.
     Original from `requests.cookies.morsel_to_cookie`
@@ -178,7 +1329,7 @@ def morsel_to_cookie(morsel):
         expires = expires_to_number(morsel["expires"])
     return create_cookie(
         comment=morsel["comment"],
-        comment_url=bool(morsel["comment"]),
+        comment_url=None,
         discard=False,
         domain=morsel["domain"],
         expires=expires,
@@ -212,6 +1363,35 @@ def cookie_to_morsel(cookie):
     return create_morsel(cookie.name, cookie.value, **info)
 
 
+def cookie_to_pyppeteer(cookie, url=None):
+    """Convert a Cookie object into a cookie dict of the DevTools protocol.
+
+    Host-only cookies are bound to their host, cookies without a domain to
+    ``url``; None is returned if there's no url for them.
+    """
+    item = {"name": cookie.name, "value": cookie.value, "path": cookie.path}
+    if cookie.domain and not cookie.domain_specified:
+        # a domain would make a domain cookie of it.
+        item["url"] = "%s://%s%s" % (
+            "https" if cookie.secure else "http",
+            cookie.domain,
+            cookie.path,
+        )
+    elif cookie.domain:
+        item["domain"] = cookie.domain
+    elif url:
+        item["url"] = url
+    else:
+        return None
+    if cookie.expires:
+        item["expires"] = cookie.expires
+    if cookie.secure:
+        item["secure"] = True
+    if cookie.get_nonstandard_attr("HttpOnly"):
+        item["httpOnly"] = True
+    return item
+
+
 def create_morsel(key, value, **kwargs):
     """Make a Morsel from underspecified parameters.
     """
@@ -237,35 +1417,42 @@ def create_morsel(key, value, **kwargs):
     return morsel
 
 
-def create_cookie(name, value, **kwargs):
+def create_cookie(
+    name,
+    value,
+    version=0,
+    port=None,
+    domain="",
+    path="/",
+    secure=False,
+    expires=None,
+    discard=False,
+    comment=None,
+    comment_url=None,
+    rest=None,
+    rfc2109=False,
+):
     """Make a cookie from underspecified parameters.
 
+    Returns a :class:`aninja.cookierecord.CookieRecord`. ``rest`` defaults to
+    ``{"HttpOnly": None}``.
     """
-    result = {
-        "version": 0,
-        "name": name,
-        "value": value,
-        "port": None,
-        "domain": "",
-        "path": "/",
-        "secure": False,
-        "expires": None,
-        "discard": False,
-        "comment": None,
-        "comment_url": None,
-        "rest": {"HttpOnly": None},
-        "rfc2109": False,
-    }
-
-    badargs = set(kwargs) - set(result)
-    if badargs:
-        err = "create_cookie() got unexpected keyword arguments: %s"
-        raise TypeError(err % list(badargs))
-
-    result.update(kwargs)
-    result["port_specified"] = bool(result["port"])
-    result["domain_specified"] = bool(result["domain"])
-    result["domain_initial_dot"] = result["domain"].startswith(".")
-    result["path_specified"] = bool(result["path"])
-
-    return Cookie(**result)
+    return CookieRecord(
+        version,
+        name,
+        value,
+        port,
+        bool(port),
+        domain,
+        bool(domain),
+        domain.startswith("."),
+        path,
+        bool(path),
+        secure,
+        expires,
+        discard,
+        comment,
+        comment_url,
+        _HTTP_ONLY if rest is None else rest,
+        rfc2109,
+    )
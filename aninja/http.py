@@ -1,15 +1,23 @@
 import asyncio
 import inspect
 import logging
+import time
 
 # typing
 from types import TracebackType
 from typing import Any, List, Optional, Tuple, Type, Union, Mapping
 
 
-from aiohttp import ClientSession
+from aiohttp import (BaseConnector, ClientError, ClientSession,
+                     DummyCookieJar, TraceConfig)
+from aninja import metrics, throttle, tracing
+from aninja.connector import default_registry
+from aninja.cache import CacheEntry, HTTPCache, SingleFlight, cacheable
 from aninja.cookies import CookiesManager
-from aninja.utils import get_user_agent
+from aninja.retry import HedgePolicy, RetryPolicy
+from aninja.throttle import Scheduler
+from aninja.tracing import RequestTrace, Tracer
+from aninja.utils import StreamMatcher, get_user_agent
 from yarl import URL
 
 _Client = 'Client'
@@ -22,6 +30,19 @@ logger = logging.getLogger(__name__)
 DEFUALT_HEADERS = {'User-Agent': get_user_agent()}
 
 
+async def _count_sent(session, ctx, params):
+    metrics.HTTP_SENT_BYTES.inc(params.url.host, amount=len(params.chunk))
+
+
+async def _count_received(session, ctx, params):
+    metrics.HTTP_RECEIVED_BYTES.inc(params.url.host, amount=len(params.chunk))
+
+
+_metrics_trace_config = TraceConfig()
+_metrics_trace_config.on_request_chunk_sent.append(_count_sent)
+_metrics_trace_config.on_response_chunk_received.append(_count_received)
+
+
 class Request:
     """A formatted request class
     """
@@ -35,17 +56,74 @@ class Request:
         self.headers = headers
 
 
+async def _aiter_sync(iterable):
+    for item in iterable:
+        yield item
+
+
+def _aiter(iterable):
+    if hasattr(iterable, '__aiter__'):
+        return iterable.__aiter__()
+    return _aiter_sync(iterable)
+
+
 class HTTPClient:
     """A client uses aiohttp to make requests.
+
+    Requests are paced per host by ``scheduler``, which defaults to the
+    process-wide :data:`aninja.throttle.default_scheduler` (unlimited until
+    it's configured). If a :class:`aninja.proxy.ProxyPool` is given, requests
+    without a ``proxy`` argument go through proxies chosen from it.
+
+    Failed requests are retried according to ``retry``, a
+    :class:`aninja.retry.RetryPolicy`, and slow ones are duplicated according
+    to ``hedge``, a :class:`aninja.retry.HedgePolicy`.
+
+    GET requests can be answered by ``cache``, a
+    :class:`aninja.cache.HTTPCache`. With ``coalesce`` set, identical GET
+    requests in flight (same url, headers and cookies) are sent once. Their
+    bodies are read before they're returned then.
+
+    With ``pool`` set, the client's sockets come from a connector shared with
+    other clients: a name of :data:`aninja.connector.default_registry`, or a
+    connector. Cookies still stay in the client's own ``cookies_manager``.
+
+    Each request sent is timed phase by phase and handed to ``tracer``, an
+    :class:`aninja.tracing.Tracer`, when its body has been received. It
+    defaults to :data:`aninja.tracing.default_tracer`, which drops them.
     """
 
     def __init__(self,
                  cookies_manager=None,
+                 scheduler: Optional[Scheduler] = None,
+                 proxy_pool=None,
+                 retry: Optional[RetryPolicy] = None,
+                 hedge: Optional[HedgePolicy] = None,
+                 cache: Optional[HTTPCache] = None,
+                 coalesce: bool = False,
+                 pool: Union[None, str, BaseConnector] = None,
+                 tracer: Optional[Tracer] = None,
                  **kwargs):
         self.cookies_manager: CookiesManager = cookies_manager if cookies_manager else CookiesManager()
+        self.scheduler = scheduler if scheduler else throttle.default_scheduler
+        self.proxy_pool = proxy_pool
+        self.retry = retry
+        self.hedge = hedge
+        self.retries = 0
+        self.cache = cache
+        self.single_flight = SingleFlight() if coalesce else None
+        self.tracer = tracer if tracer is not None else tracing.default_tracer
         headers = kwargs.pop('headers', None)
         headers = headers if headers else DEFUALT_HEADERS
 
+        if pool is not None:
+            if isinstance(pool, str):
+                pool = default_registry.get(pool)
+            kwargs['connector'] = pool
+            kwargs['connector_owner'] = False
+        kwargs['trace_configs'] = [*(kwargs.get('trace_configs') or ()),
+                                   _metrics_trace_config,
+                                   tracing.trace_config]
         self.session = ClientSession(headers=headers, **kwargs)
         self.cookies_manager.sync_to_aiohttp_session(self.session)
 
@@ -59,8 +137,137 @@ class HTTPClient:
                       data=None,
                       headers=None,
                       ** kwargs: Any):
-        resp = await self.session.request(method, url, params=params, data=data, **kwargs)
-        self.cookies_manager.update_from_aiohttp_session(self.session)
+        if (method.upper() == 'GET' and data is None
+                and (self.cache is not None or self.single_flight is not None)):
+            return await self._request_cached(url, params, headers, kwargs)
+        return await self._fetch(method, url, params, data, headers, kwargs)
+
+    async def _request_cached(self, url, params, headers, kwargs):
+        full_url = URL(url)
+        if params:
+            full_url = full_url.extend_query(params)
+        key = (
+            str(full_url),
+            tuple(sorted((headers or {}).items())),
+            # not an output of the manager: those are cached, and one
+            # entry per url would push out the useful ones.
+            tuple((c.name, c.value)
+                  for c in self.cookies_manager.cookies_for_url(full_url)),
+        )
+
+        async def fetch():
+            return await self._fetch_cacheable(url, params, headers, kwargs,
+                                               key)
+
+        if self.single_flight is not None:
+            return await self.single_flight.run(key, fetch)
+        resp, _ = await fetch()
+        return resp
+
+    async def _fetch_cacheable(self, url, params, headers, kwargs, key):
+        cache = self.cache
+        entry = cache.get(key) if cache is not None else None
+        if entry is not None:
+            if entry.fresh():
+                cache.hits += 1
+                return entry.response(), entry.body
+            headers = dict(headers or {}, **entry.validators())
+        resp = await self._fetch('GET', url, params, None, headers, kwargs)
+        if entry is not None and resp.status == 304:
+            resp.release()
+            cache.revalidations += 1
+            entry.revalidated(resp.headers)
+            cache.put(key, entry)
+            return entry.response(), entry.body
+        body = await resp.read()
+        if cache is not None:
+            cache.misses += 1
+            if cacheable(resp):
+                cache.put(key, CacheEntry.from_response(resp, body))
+        return resp, body
+
+    async def _fetch(self, method, url, params, data, headers, kwargs):
+        host = URL(url).host
+
+        async def send():
+            return await self._send_once(method, url, host, params, data,
+                                         headers, kwargs)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.hedge is not None:
+                    resp = await self.hedge.run(send, method, host)
+                else:
+                    resp = await send()
+            except Exception as e:
+                policy = self.retry
+                if (policy is None or not isinstance(e, policy.exceptions)
+                        or not policy.can_retry(method, attempt)):
+                    raise
+                delay = policy.delay(attempt)
+                logger.debug('retry %s %s in %.2fs after %r',
+                             method, url, delay, e)
+            else:
+                policy = self.retry
+                if (policy is None or not policy.can_retry(method, attempt)
+                        or not await policy.should_retry(resp)):
+                    return resp
+                delay = policy.delay(attempt, resp)
+                logger.debug('retry %s %s in %.2fs after status %d',
+                             method, url, delay, resp.status)
+                resp.release()
+            self.retries += 1
+            metrics.HTTP_RETRIES.inc(host)
+            await asyncio.sleep(delay)
+
+    async def _send_once(self, method, url, host, params, data, headers,
+                         kwargs):
+        tracer = self.tracer
+        trace = None
+        if tracer.enabled and kwargs.get('trace_request_ctx') is None:
+            trace = RequestTrace('http', method, url)
+            kwargs = dict(kwargs, trace_request_ctx=trace)
+        scheduler = self.scheduler
+        if scheduler.enabled:
+            if trace is not None:
+                trace.mark('throttle')
+            await scheduler.acquire(host)
+            if trace is not None:
+                trace.add('throttle')
+        proxy = None
+        if self.proxy_pool is not None and kwargs.get('proxy') is None:
+            proxy = self.proxy_pool.choose(host)
+            kwargs = dict(kwargs, proxy=proxy.url)
+        start = time.monotonic()
+        try:
+            resp = await self.session.request(method, url, params=params, data=data,
+                                              headers=headers, **kwargs)
+        except (ClientError, asyncio.TimeoutError) as e:
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.monotonic() - start, host, 'error')
+            if proxy is not None:
+                self.proxy_pool.report(proxy, ok=False, host=host)
+            if trace is not None:
+                trace.error = e
+                trace.finish(tracer)
+            raise
+        elapsed = time.monotonic() - start
+        metrics.HTTP_REQUEST_SECONDS.observe(elapsed, host, resp.status)
+        if proxy is not None:
+            self.proxy_pool.report_response(proxy, resp.status, elapsed, host)
+        if scheduler.adaptive:
+            scheduler.feedback(host, resp.status, resp.headers, response=resp)
+        if not isinstance(self.session.cookie_jar, DummyCookieJar):
+            if trace is not None:
+                trace.mark('cookie_sync')
+            self.cookies_manager.update_from_response(resp)
+            if trace is not None:
+                trace.add('cookie_sync')
+        if trace is not None:
+            trace.status = resp.status
+            trace.follow(resp, tracer)
         return resp
 
     async def get(self, url: _URL, params=None, **kwargs: Any):
@@ -77,11 +284,122 @@ class HTTPClient:
                                   headers=request.headers)
         return resp
 
+    async def send_many(self, requests, limit: int = 10,
+                        limit_per_host: Optional[int] = None,
+                        ordered: bool = False):
+        """Sends many requests concurrently and yields ``(request, response)``
+        pairs as an async generator.
+
+        At most ``limit`` requests are taken from ``requests`` at a time, so
+        the input can be a huge or endless iterable or async iterator. A
+        request which fails doesn't stop the others: the exception takes the
+        place of its response.
+
+        Args:
+            requests: an iterable or an async iterator of :class:`Request`.
+            limit: max number of requests in flight.
+            limit_per_host: max number of requests in flight for each host.
+            ordered: yield in the order of ``requests`` instead of the order
+                of completion. Finished responses wait for earlier ones, and
+                they still count towards ``limit``.
+
+        Usage::
+
+            async for request, resp in client.send_many(requests, limit=20):
+                if isinstance(resp, Exception):
+                    ...
+        """
+        host_slots = {}
+
+        async def send(index, request):
+            host = URL(request.url).host
+            slot = None
+            if limit_per_host is not None:
+                slot = host_slots.get(host)
+                if slot is None:
+                    slot = host_slots[host] = [asyncio.Semaphore(limit_per_host), 0]
+                slot[1] += 1
+            try:
+                if slot is None:
+                    resp = await self.send(request)
+                else:
+                    async with slot[0]:
+                        resp = await self.send(request)
+            except Exception as e:
+                resp = e
+            finally:
+                if slot is not None:
+                    slot[1] -= 1
+                    if not slot[1]:
+                        del host_slots[host]
+            return index, request, resp
+
+        iterator = _aiter(requests)
+        pending = set()
+        finished = {}
+        taken = yielded = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) + len(finished) < limit:
+                    try:
+                        request = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(send(taken, request)))
+                    taken += 1
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, request, resp = task.result()
+                    if ordered:
+                        finished[index] = (request, resp)
+                    else:
+                        yield request, resp
+                while yielded in finished:
+                    yield finished.pop(yielded)
+                    yielded += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def check(self, check_flag: str, url: _URL = ""):
-        resp = await self.get(url)
-        if check_flag in await resp.text():
-            return True
-        return False
+        """whether the page at ``url`` contains ``check_flag``. The body is
+        read only until the flag is found, see :meth:`search`."""
+        return await self.search([check_flag], url) is not None
+
+    async def search(self, patterns, url: _URL, limit: Optional[int] = None,
+                     chunk_size: int = 1 << 16, **kwargs: Any):
+        """Streams the body of a GET response and returns the first of
+        ``patterns`` found in it, or None.
+
+        Reading stops, and the connection is given up, as soon as a pattern
+        is found or ``limit`` bytes have been read. Patterns are encoded with
+        the charset of the response. Responses don't come from the cache.
+        """
+        resp = await self._fetch('GET', url, kwargs.pop('params', None), None,
+                                 kwargs.pop('headers', None), kwargs)
+        matcher = StreamMatcher(patterns, resp.charset or 'utf-8')
+        try:
+            while True:
+                size = chunk_size
+                if limit is not None:
+                    size = min(size, limit - matcher.consumed)
+                    if size <= 0:
+                        resp.close()
+                        return None
+                chunk = await resp.content.read(size)
+                if not chunk:
+                    return None
+                found = matcher.feed(chunk)
+                if found is not None:
+                    resp.close()
+                    return found
+        finally:
+            resp.release()
 
     def __enter__(self) -> None:
         raise TypeError("Use async with instead")
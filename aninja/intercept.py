@@ -0,0 +1,196 @@
+import asyncio
+import fnmatch
+import hashlib
+import re
+from pathlib import Path
+
+from yarl import URL
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+CONTINUE = 'continue'
+BLOCK = 'block'
+STUB = 'stub'
+
+# resource types of the DevTools protocol a screenshot needs to look right
+VISUAL_TYPES = frozenset(('image', 'stylesheet', 'font', 'media'))
+
+
+class StubCache:
+    """Responses stored in a directory, served instead of the network.
+
+    Bodies are stored as ``<sha1 of url>`` and content types as
+    ``<sha1 of url>.type``.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _path(self, url):
+        return self.directory / hashlib.sha1(url.encode()).hexdigest()
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            body = path.read_bytes()
+        except OSError:
+            return None
+        type_path = path.with_suffix('.type')
+        content_type = (type_path.read_text() if type_path.exists()
+                        else 'application/octet-stream')
+        return {'status': 200, 'contentType': content_type, 'body': body}
+
+    def store(self, url, body: bytes, content_type='application/octet-stream'):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        path.write_bytes(body)
+        path.with_suffix('.type').write_text(content_type)
+
+
+class InterceptionProfile:
+    """Declares which requests of a page are blocked or stubbed.
+
+    Args:
+        block_types: resource types of the DevTools protocol to block, such
+            as ``'image'``, ``'font'``, ``'media'``.
+        block_patterns: glob patterns of urls to block, such as
+            ``'*://*/analytics.js'``.
+        block_domains: domains to block, including their subdomains.
+        stubs: a mapping from glob patterns of urls to responses
+            (``{'status', 'contentType', 'body'}``) served instead of blocking.
+        cache: a :class:`StubCache` or a directory. Blocked requests with a
+            cached response get it instead.
+    """
+
+    def __init__(self, block_types=('image', 'media', 'font'),
+                 block_patterns=(), block_domains=(), stubs=None, cache=None):
+        self.block_types = frozenset(block_types)
+        self.block_domains = frozenset(d.lstrip('.').lower()
+                                       for d in block_domains)
+        self._block_re = _compile_globs(block_patterns)
+        self._stubs = [(_compile_globs([p]), r)
+                       for p, r in (stubs or {}).items()]
+        if cache is not None and not isinstance(cache, StubCache):
+            cache = StubCache(cache)
+        self.cache = cache
+
+    def decide(self, url: str, resource_type: str, visual=False):
+        """returns :data:`CONTINUE`, :data:`BLOCK` or :data:`STUB` and the
+        stub response if any.
+
+        If ``visual`` is True, resources a screenshot needs are never blocked.
+        """
+        for pattern, response in self._stubs:
+            if pattern.match(url):
+                return STUB, response
+        if visual and resource_type in VISUAL_TYPES:
+            return CONTINUE, None
+        if not self._blocks(url, resource_type):
+            return CONTINUE, None
+        if self.cache is not None:
+            response = self.cache.get(url)
+            if response is not None:
+                return STUB, response
+        return BLOCK, None
+
+    def _blocks(self, url, resource_type):
+        if resource_type in self.block_types:
+            return True
+        if self._block_re is not None and self._block_re.match(url):
+            return True
+        if self.block_domains:
+            host = (URL(url).raw_host or '').lower()
+            while host:
+                if host in self.block_domains:
+                    return True
+                _, _, host = host.partition('.')
+        return False
+
+
+class InterceptionStats:
+    """Requests blocked or stubbed on a page and an estimation of bytes saved.
+
+    Sizes of blocked requests are unknown, so they're estimated by the mean
+    size of responses of the same resource type received by the page.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.stubbed = 0
+        self.bytes_saved = 0
+        self.blocked_by_type = {}
+        self._sizes = {}
+
+    def received(self, resource_type, size):
+        total, count = self._sizes.get(resource_type, (0, 0))
+        self._sizes[resource_type] = (total + size, count + 1)
+
+    def blocked_visual(self) -> bool:
+        """whether resources a screenshot needs have been blocked."""
+        return any(t in VISUAL_TYPES for t in self.blocked_by_type)
+
+    def estimated_bytes_saved(self):
+        estimation = self.bytes_saved
+        for resource_type, n in self.blocked_by_type.items():
+            total, count = self._sizes.get(resource_type, (0, 0))
+            if count:
+                estimation += n * total // count
+        return estimation
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'blocked': self.blocked,
+            'stubbed': self.stubbed,
+            'bytes_saved': self.estimated_bytes_saved(),
+        }
+
+
+async def apply_profile(page, profile: InterceptionProfile) -> None:
+    """Enables request interception on a page with a profile. Stats are kept
+    in ``page.interception_stats``."""
+    page.interception_stats = stats = InterceptionStats()
+    await page.setRequestInterception(True)
+
+    def on_request(request):
+        stats.requests += 1
+        resource_type = request.resourceType
+        action, response = profile.decide(
+            request.url, resource_type, getattr(page, 'visual_fidelity', False))
+        if action == BLOCK:
+            stats.blocked += 1
+            stats.blocked_by_type[resource_type] = (
+                stats.blocked_by_type.get(resource_type, 0) + 1)
+            handling = request.abort('blockedbyclient')
+        elif action == STUB:
+            stats.stubbed += 1
+            stats.bytes_saved += len(response.get('body') or b'')
+            handling = request.respond(response)
+        else:
+            handling = request.continue_()
+        asyncio.ensure_future(_handle(request, handling))
+
+    def on_response(response):
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            stats.received(response.request.resourceType, int(length))
+
+    page.on('request', on_request)
+    page.on('response', on_response)
+
+
+async def _handle(request, handling):
+    try:
+        await handling
+    except Exception:
+        logger.debug('failed to intercept %s', request.url, exc_info=True)
+
+
+def _compile_globs(patterns):
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns))
@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+
+from aninja.cookiefile import cookie_args, dump
+from aninja.cookierecord import CookieRecord
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+_SNAPSHOT = 'snapshot-%08d.njck'
+_JOURNAL = 'journal-%08d.log'
+_FILE_RE = re.compile(r'^(snapshot|journal)-(\d{8})\.(njck|log)$')
+
+
+def _entry(cookie, removed):
+    if removed:
+        return ('d', cookie.domain, cookie.path, cookie.name)
+    return ('s', *cookie_args(cookie))
+
+
+class CookieJournal:
+    """Persists a :class:`aninja.cookies.CookiesManager` by appending the
+    cookies set and removed to a journal, instead of saving the whole jar.
+
+    Changes are only queued on the thread which makes them. A background
+    thread writes them every ``interval`` seconds in one batch and fsyncs
+    the journal. Once the journal has more than ``compact_ratio`` times as
+    many entries as the jar has cookies (and at least ``compact_min``), the
+    jar is written to a binary snapshot, see :mod:`aninja.cookiefile`, and a
+    new journal is started.
+
+    ``directory`` holds ``snapshot-N.njck`` and ``journal-N.log`` files: the
+    jar is the latest snapshot, loaded lazily, with the journals of the same
+    generation and after replayed on it. An entry is the whole cookie or the
+    key of a removed one, so replaying it twice does no harm.
+
+    Use :meth:`CookiesManager.persist` to create one.
+
+    Attributes:
+        generation: number of the journal written to.
+        entries: entries in the journals since the latest snapshot.
+        batches: batches written.
+        compactions: snapshots written.
+        failures: batches or snapshots which couldn't be written.
+    """
+
+    def __init__(self, manager, directory, interval=1.0, compact_ratio=2.0,
+                 compact_min=10000):
+        self.manager = manager
+        self.directory = directory
+        self.interval = interval
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self.generation = 0
+        self.entries = 0
+        self.batches = 0
+        self.compactions = 0
+        self.failures = 0
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._closing = False
+        self._file = None
+        self._thread = None
+
+    def open(self) -> "CookieJournal":
+        """Loads the snapshot, replays the journals and starts recording."""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshots, journals = self._files()
+        base = max(snapshots, default=0)
+        if base:
+            self.manager.load(self._path(_SNAPSHOT, base), format='binary')
+        for generation in sorted(g for g in journals if g >= base):
+            self.entries += self._replay(self._path(_JOURNAL, generation))
+        self.generation = max([base, *journals]) or 1
+        self._remove_older_than(base)
+        self._file = open(self._path(_JOURNAL, self.generation), 'ab')
+        self.manager.output_cookiejar().add_listener(self._on_change)
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='aninja-cookie-journal')
+        self._thread.start()
+        return self
+
+    def _on_change(self, cookie, removed):
+        if removed and self.manager.output_cookiejar().evicting:
+            return
+        self._queue.append(_entry(cookie, removed))
+
+    def flush(self, timeout=None) -> bool:
+        """Blocks until changes made so far are written and fsynced.
+        returns False if they couldn't be, or on timeout."""
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        failures = self.failures
+        done = threading.Event()
+        self._queue.append(done)
+        self._wake.set()
+        return done.wait(timeout) and self.failures == failures
+
+    def compact(self, timeout=None) -> bool:
+        """Blocks until a snapshot has been written. returns False if it
+        couldn't be, or on timeout."""
+        compactions = self.compactions
+        done = threading.Event()
+        self._queue.append(('compact', done))
+        self._wake.set()
+        return done.wait(timeout) and self.compactions > compactions
+
+    def close(self) -> None:
+        """Writes what's left and stops recording."""
+        if self._thread is None:
+            return
+        self.manager.output_cookiejar().remove_listener(self._on_change)
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            closing = self._closing
+            try:
+                self._write_batch()
+            except Exception:
+                logger.exception('failed to write the cookie journal')
+            if closing:
+                return
+
+    def _write_batch(self):
+        queue = self._queue
+        lines = []
+        waiters = []
+        compact = False
+        # waiters are woken up even if writing fails, see flush().
+        try:
+            for _ in range(len(queue)):
+                item = queue.popleft()
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item[0] == 'compact':
+                    compact = True
+                    waiters.append(item[1])
+                else:
+                    lines.append(json.dumps(item, separators=(',', ':')))
+            if lines:
+                self._file.write(('\n'.join(lines) + '\n').encode())
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.entries += len(lines)
+                self.batches += 1
+            if compact or self.entries > max(
+                    self.compact_min,
+                    self.compact_ratio * len(self.manager.output_cookiejar())):
+                self._compact()
+        except BaseException:
+            self.failures += 1
+            raise
+        finally:
+            for waiter in waiters:
+                waiter.set()
+
+    def _compact(self):
+        generation = self.generation + 1
+        jar = self.manager.output_cookiejar()
+        with jar._cookies_lock:
+            cookies = list(jar)
+        dump(cookies, self._path(_SNAPSHOT, generation))
+        # the new journal is only started once the snapshot is there, so a
+        # failed snapshot leaves the current generation as it was.
+        new_file = open(self._path(_JOURNAL, generation), 'ab')
+        old_file, self._file = self._file, new_file
+        old_file.close()
+        self.generation = generation
+        # changes still queued go to the new journal; those already in the
+        # snapshot are replayed on it harmlessly.
+        self.entries = len(self._queue)
+        self._remove_older_than(generation)
+        self.compactions += 1
+        logger.debug('cookie journal compacted into %d cookies',
+                     len(cookies))
+
+    def _replay(self, filename) -> int:
+        jar = self.manager.output_cookiejar()
+        n = 0
+        with open(filename, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a batch cut by a crash; nothing after it was fsynced.
+                    logger.warning('%s ends with a torn entry', filename)
+                    break
+                if entry[0] == 's':
+                    jar.set_cookie(CookieRecord(*entry[1:]))
+                else:
+                    try:
+                        jar.clear(*entry[1:])
+                    except KeyError:
+                        pass
+                n += 1
+        return n
+
+    def _files(self):
+        snapshots, journals = set(), set()
+        for name in os.listdir(self.directory):
+            match = _FILE_RE.match(name)
+            if match:
+                kind = snapshots if match.group(1) == 'snapshot' else journals
+                kind.add(int(match.group(2)))
+        return snapshots, journals
+
+    def _path(self, template, generation):
+        return os.path.join(self.directory, template % generation)
+
+    def _remove_older_than(self, generation):
+        snapshots, journals = self._files()
+        for template, generations in ((_SNAPSHOT, snapshots),
+                                      (_JOURNAL, journals)):
+            for g in generations:
+                if g < generation:
+                    try:
+                        os.remove(self._path(template, g))
+                    except OSError:
+                        logger.debug('failed to remove an old journal file',
+                                     exc_info=True)
@@ -0,0 +1,185 @@
+import asyncio
+
+from aninja import metrics
+from aninja.cookies import CookiesManager
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class _BrowserSlot:
+    def __init__(self, browser):
+        self.browser = browser
+        self.clients = set()
+        self.pages = 0
+        self.retired = False
+        self.closing = False
+        self.expiry = None  # timer closing the browser once retired
+
+
+class BrowserManager:
+    """Shares a few Chromium processes among many
+    :class:`aninja.browser.BrowserClient` s, each of them isolated in its own
+    incognito context.
+
+    A crashed browser is restarted and its clients are moved to new contexts.
+    A browser which has created ``max_pages`` pages is retired: it gets no
+    more clients and is closed once its clients are closed, or after
+    ``max_retired_age`` seconds at most. Clients still there then are moved
+    to new contexts, as after a crash, and their open pages are closed with
+    the browser; cookies are pushed again by the next sync, but those the
+    cookies manager didn't pull from the pages are lost.
+
+    Usage::
+
+        manager = BrowserManager(size=2, options={'headless': True})
+        client = await manager.client()
+        ...
+        await client.close()
+        await manager.close()
+
+    Attributes:
+        size: number of browser processes.
+        max_pages: pages created by a browser before it's recycled; None
+            means never.
+        max_retired_age: seconds a retired browser waits for its clients to
+            be closed before it's closed anyway; None means forever.
+        restarts: number of crashed browsers restarted.
+        recycles: number of browsers retired because of ``max_pages``.
+    """
+
+    def __init__(self, size=1, max_pages=None, options: dict = None,
+                 launcher=None, max_retired_age=600.0, **kwargs):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_retired_age = max_retired_age
+        self.options = options
+        self.kwargs = kwargs
+        self.restarts = 0
+        self.recycles = 0
+        self._launcher = launcher
+        self._slots = []
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    async def client(self, cookies_manager=None, track_cookies=False):
+        """Creates a :class:`BrowserClient` in a new incognito context."""
+        from aninja.browser import BrowserClient
+
+        if cookies_manager is None:
+            cookies_manager = CookiesManager()
+        slot = await self._pick_slot()
+        context = await slot.browser.createIncognitoBrowserContext()
+        client = BrowserClient(cookies_manager, slot.browser, context,
+                               track_cookies)
+        client.manager = self
+        self._attach(client, slot)
+        return client
+
+    def browsers(self) -> list:
+        return [slot.browser for slot in self._slots]
+
+    async def close(self) -> None:
+        self._closed = True
+        slots, self._slots = self._slots, []
+        for slot in slots:
+            await self._close_browser(slot)
+
+    def _attach(self, client, slot):
+        client._browser_slot = slot
+        slot.clients.add(client)
+
+    def _page_created(self, client) -> None:
+        slot = client._browser_slot
+        slot.pages += 1
+        if (self.max_pages is not None and slot.pages >= self.max_pages
+                and not slot.retired):
+            slot.retired = True
+            self.recycles += 1
+            if self.max_retired_age is not None:
+                slot.expiry = asyncio.get_event_loop().call_later(
+                    self.max_retired_age,
+                    lambda: asyncio.ensure_future(self._expire(slot)))
+
+    async def _expire(self, slot) -> None:
+        if slot.closing or self._closed:
+            return
+        logger.info('close a retired browser still used by %d clients',
+                    len(slot.clients))
+        slot.closing = True
+        if slot in self._slots:
+            self._slots.remove(slot)
+        await self._rehome(slot)
+        await self._close_browser(slot)
+
+    async def _release(self, client) -> None:
+        """Called by :meth:`BrowserClient.close` instead of closing the
+        browser."""
+        slot = client._browser_slot
+        slot.clients.discard(client)
+        try:
+            await client.context.close()
+        except Exception:
+            logger.debug('failed to close a context', exc_info=True)
+        if slot.retired and not slot.clients and not slot.closing:
+            if slot in self._slots:
+                self._slots.remove(slot)
+            await self._close_browser(slot)
+
+    async def _pick_slot(self) -> _BrowserSlot:
+        if self._closed:
+            raise RuntimeError('the browser manager is closed')
+        async with self._lock:
+            active = [s for s in self._slots if not s.retired]
+            if len(active) < self.size:
+                slot = await self._launch()
+            else:
+                slot = min(active, key=lambda s: len(s.clients))
+            return slot
+
+    async def _launch(self) -> _BrowserSlot:
+        launcher = self._launcher
+        if launcher is None:
+            from aninja.browser import launch_browser
+
+            launcher = launch_browser
+        browser = await launcher(self.options, **self.kwargs)
+        slot = _BrowserSlot(browser)
+        browser.on('disconnected', lambda: self._on_disconnected(slot))
+        self._slots.append(slot)
+        return slot
+
+    def _on_disconnected(self, slot) -> None:
+        if slot.closing or self._closed:
+            return
+        logger.warning('browser disconnected, restarting it')
+        slot.closing = True
+        if slot in self._slots:
+            self._slots.remove(slot)
+        self.restarts += 1
+        metrics.BROWSER_RESTARTS.inc()
+        asyncio.ensure_future(self._rehome(slot))
+
+    async def _rehome(self, slot) -> None:
+        for client in list(slot.clients):
+            try:
+                new_slot = await self._pick_slot()
+                client.browser = new_slot.browser
+                client.context = (
+                    await new_slot.browser.createIncognitoBrowserContext())
+            except Exception:
+                logger.exception('failed to move a client to a new browser')
+                continue
+            if client.page_pool is not None:
+                client.page_pool.discard_idle()
+            self._attach(client, new_slot)
+        slot.clients.clear()
+
+    async def _close_browser(self, slot) -> None:
+        slot.closing = True
+        if slot.expiry is not None:
+            slot.expiry.cancel()
+        try:
+            await slot.browser.close()
+        except Exception:
+            logger.debug('failed to close a browser', exc_info=True)
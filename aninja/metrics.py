@@ -0,0 +1,363 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import Counter as _Tally
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Metric:
+    """A metric sharded per thread: a thread only ever writes its own shard,
+    so updates take no lock, and shards are summed when the metric is
+    collected.
+    """
+    type = 'untyped'
+
+    def __init__(self, name, help='', labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:  # once per thread
+                self._shards.append(shard)
+            return shard
+
+    def _snapshots(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict.copy() is atomic, unlike iterating a dict another thread
+        # writes to.
+        return [shard.copy() for shard in shards]
+
+    def samples(self):
+        """Yields ``(suffix, labels, value)`` where labels is a tuple of
+        ``(name, value)``."""
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = ['# HELP %s %s' % (self.name, _escape_help(self.help)),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        for suffix, labels, value in self.samples():
+            lines.append('%s%s%s %s' % (self.name, suffix,
+                                        _format_labels(labels),
+                                        _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    """A value which only goes up.
+
+    Usage::
+
+        retries = Counter('retries_total', 'Retried requests.', ['host'])
+        retries.inc('example.com')
+    """
+    type = 'counter'
+
+    def inc(self, *labelvalues, amount=1) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def values(self) -> dict:
+        """Returns the totals by label values."""
+        totals = {}
+        for shard in self._snapshots():
+            for labelvalues, value in shard.items():
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        return totals
+
+    def value(self, *labelvalues):
+        return self.values().get(labelvalues, 0)
+
+    def samples(self):
+        for labelvalues, value in sorted(self.values().items(), key=_sort_key):
+            yield '', tuple(zip(self.labelnames, labelvalues)), value
+
+
+class Gauge(_Metric):
+    """A value which goes up and down, or which is computed by ``function``
+    when it's collected. ``function`` returns a dict from label values to
+    values.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help='', labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    inc = Counter.inc
+
+    def dec(self, *labelvalues, amount=1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set_function(self, function) -> None:
+        self.function = function
+
+    def values(self) -> dict:
+        totals = Counter.values(self)
+        if self.function is not None:
+            try:
+                computed = self.function()
+            except Exception:
+                logger.exception('failed to compute %s', self.name)
+                computed = {}
+            for labelvalues, value in computed.items():
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        return totals
+
+    value = Counter.value
+    samples = Counter.samples
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start,
+                               *self.labelvalues)
+
+
+class Histogram(_Metric):
+    """Counts observed values in buckets. How many times something happened
+    is the ``_count`` series.
+
+    Usage::
+
+        with histogram.time('example.com'):
+            ...
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        counts = shard.get(labelvalues)
+        if counts is None:
+            # a count per bucket, for +Inf, then the sum.
+            counts = shard[labelvalues] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, *labelvalues) -> _Timer:
+        """A context manager observing the seconds it took."""
+        return _Timer(self, labelvalues)
+
+    def values(self) -> dict:
+        """Returns ``[counts per bucket..., count for +Inf, sum]`` by label
+        values. Counts are not cumulative."""
+        totals = {}
+        for shard in self._snapshots():
+            for labelvalues, counts in shard.items():
+                total = totals.get(labelvalues)
+                if total is None:
+                    totals[labelvalues] = list(counts)
+                else:
+                    for i, n in enumerate(counts):
+                        total[i] += n
+        return totals
+
+    def count(self, *labelvalues) -> int:
+        counts = self.values().get(labelvalues)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        bounds = [_format_value(b) for b in self.buckets] + ['+Inf']
+        for labelvalues, counts in sorted(self.values().items(), key=_sort_key):
+            labels = tuple(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                yield '_bucket', labels + (('le', bound),), cumulative
+            yield '_sum', labels, counts[-1]
+            yield '_count', labels, cumulative
+
+
+class Registry:
+    """A set of metrics exposed together."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError('%s is already a %s' % (name, metric.type))
+            return metric
+
+    def counter(self, name, help='', labelnames=()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help='', labelnames=(), function=None) -> Gauge:
+        return self._get(Gauge, name, help, labelnames, function)
+
+    def histogram(self, name, help='', labelnames=(),
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets)
+
+    def expose(self) -> str:
+        """Returns the metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return ''.join(metric.expose() for metric in metrics)
+
+
+def serve(port=9100, host='127.0.0.1', registry=None):
+    """Serves the metrics of ``registry`` at ``/metrics`` from a daemon
+    thread. Stop it with ``server.shutdown()``.
+
+    Usage::
+
+        from aninja import metrics
+        server = metrics.serve(9100)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = default_registry if registry is None else registry
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.expose().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever,
+                              name='aninja-metrics', daemon=True)
+    thread.start()
+    logger.info('serving metrics on http://%s:%d/metrics',
+                host, server.server_address[1])
+    return server
+
+
+def _sort_key(item):
+    return tuple(str(v) for v in item[0])
+
+
+def _escape_help(text):
+    return text.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+default_registry = Registry()
+
+HTTP_REQUEST_SECONDS = default_registry.histogram(
+    'aninja_http_request_duration_seconds',
+    'Time until the response headers of HTTPClient requests, '
+    'status is "error" when no response came.',
+    ['host', 'status'])
+HTTP_SENT_BYTES = default_registry.counter(
+    'aninja_http_sent_bytes_total', 'Request body bytes sent by HTTPClient.',
+    ['host'])
+HTTP_RECEIVED_BYTES = default_registry.counter(
+    'aninja_http_received_bytes_total',
+    'Response body bytes received by HTTPClient.', ['host'])
+HTTP_RETRIES = default_registry.counter(
+    'aninja_http_retries_total', 'Requests retried by HTTPClient.', ['host'])
+
+BROWSER_PAGE_CREATE_SECONDS = default_registry.histogram(
+    'aninja_browser_page_create_duration_seconds',
+    'Time to create and set up a page of BrowserClient.')
+BROWSER_NAVIGATION_SECONDS = default_registry.histogram(
+    'aninja_browser_navigation_duration_seconds',
+    'Time of page navigations.')
+BROWSER_OPEN_PAGES = default_registry.gauge(
+    'aninja_browser_open_pages', 'Pages of BrowserClients not closed.')
+BROWSER_RESTARTS = default_registry.counter(
+    'aninja_browser_restarts_total', 'Crashed browsers restarted.')
+
+COOKIES_JAR_SIZE = default_registry.gauge(
+    'aninja_cookies_jar_size', 'Cookies in CookiesManagers by domain.',
+    ['domain'])
+COOKIES_SYNC_SECONDS = default_registry.histogram(
+    'aninja_cookies_sync_duration_seconds',
+    'Time of cookie synchronizations of CookiesManagers.', ['sync'])
+
+_pages = weakref.WeakSet()
+_cookies_managers = weakref.WeakSet()
+
+
+def track_page(page) -> None:
+    """Counts ``page`` in :data:`BROWSER_OPEN_PAGES` until it's closed."""
+    _pages.add(page)
+
+
+def track_cookies_manager(manager) -> None:
+    """Counts the cookies of ``manager`` in :data:`COOKIES_JAR_SIZE`."""
+    _cookies_managers.add(manager)
+
+
+def _open_pages():
+    return {(): sum(1 for page in list(_pages) if not page.isClosed())}
+
+
+def _jar_sizes():
+    sizes = _Tally()
+    for manager in list(_cookies_managers):
+        sizes.update(manager.domains())
+    return {(domain,): n for domain, n in sizes.items()}
+
+
+BROWSER_OPEN_PAGES.set_function(_open_pages)
+COOKIES_JAR_SIZE.set_function(_jar_sizes)
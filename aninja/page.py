@@ -0,0 +1,215 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from io import BytesIO
+from typing import List
+
+from pyppeteer.page import Page
+
+from aninja import metrics, tracing
+
+# max number of requests whose urls and Set-Cookie headers wait for each other
+_MAX_TRACKED_REQUESTS = 1000
+
+
+def _queue(queues, request_id) -> deque:
+    queue = queues.get(request_id)
+    if queue is None:
+        queue = queues[request_id] = deque()
+        if len(queues) > _MAX_TRACKED_REQUESTS:
+            queues.popitem(last=False)
+    return queue
+
+
+def _pop(queues, request_id):
+    queue = queues.get(request_id)
+    if not queue:
+        return None
+    item = queue.popleft()
+    if not queue:
+        del queues[request_id]
+    return item
+
+
+class NinjaPage(Page):
+    def __init__(self, page: Page, client: "BrowserClient"):
+        self._browser_client = client
+        self._page = page
+        self.__dict__.update(page.__dict__)
+        self._tracking_cookies = False
+        self.visual_fidelity = False
+        self.interception_stats = None
+
+    @property
+    def cookies_manager(self):
+        return self._browser_client.cookies_manager
+
+    def track_cookies(self) -> None:
+        """Streams cookies set by responses of this page, including XHRs and
+        redirects, into the cookies manager as DevTools network events arrive.
+        Then navigations don't need to pull every cookie from the browser.
+
+        Cookies set by scripts through ``document.cookie`` are not reported by
+        the events; use :meth:`CookiesManager.update_from_pyppeteer` for them.
+
+        Headers come in ``responseReceivedExtraInfo`` events, one per response
+        but without its url, before or after the request of the response is
+        reported. Every url a request goes to, redirects included, waits for
+        the next event of the request, and every event for the next url, so
+        each ``Set-Cookie`` is credited to the url which sent it.
+        """
+        if self._tracking_cookies:
+            return
+        self._tracking_cookies = True
+        # request id -> urls waiting for their headers, and the other way
+        self._request_urls = OrderedDict()
+        self._pending_set_cookies = OrderedDict()
+        self._client.on("Network.requestWillBeSent", self._on_request)
+        self._client.on(
+            "Network.responseReceivedExtraInfo", self._on_response_extra_info
+        )
+        self._client.on("Network.loadingFinished", self._on_loading_done)
+        self._client.on("Network.loadingFailed", self._on_loading_done)
+
+    def _on_request(self, event: dict) -> None:
+        # a redirect keeps the request id: the url redirected from still
+        # waits for its headers.
+        request_id = event["requestId"]
+        url = event["request"]["url"]
+        lines = _pop(self._pending_set_cookies, request_id)
+        if lines is None:
+            _queue(self._request_urls, request_id).append(url)
+        elif lines:
+            self.cookies_manager.update_from_headers(lines, url)
+
+    def _on_response_extra_info(self, event: dict) -> None:
+        # an event without Set-Cookie still stands for a response.
+        headers = [
+            value
+            for key, value in event.get("headers", {}).items()
+            if key.lower() == "set-cookie"
+        ]
+        blocked = {b.get("cookieLine") for b in event.get("blockedCookies", ())}
+        lines = [
+            line
+            for value in headers
+            for line in value.split("\n")
+            if line and line not in blocked
+        ]
+        url = _pop(self._request_urls, event["requestId"])
+        if url is None:
+            # the event may come before requestWillBeSent
+            _queue(self._pending_set_cookies, event["requestId"]).append(lines)
+        elif lines:
+            self.cookies_manager.update_from_headers(lines, url)
+
+    def _on_loading_done(self, event: dict) -> None:
+        # no url comes after it, but headers still may: the urls are kept
+        # until then, or until newer requests push them out.
+        self._pending_set_cookies.pop(event["requestId"], None)
+
+    async def text(self):
+        return await self.evaluate("() => document.body.innerHTML")
+
+    async def goto(self, url: str, options: dict = None, **kwargs):
+        with metrics.BROWSER_NAVIGATION_SECONDS.time():
+            resp = await super().goto(url, options, **kwargs)
+        await self._trace_navigation()
+        return resp
+
+    async def gather_for_navigation(self, *aws, options: dict = None):
+        """if coroutines in your aws can cause page's navigation, use this function to wrap it and
+        keep track of cookies. Cookies are pulled from the browser after the
+        navigation unless the page :meth:`track_cookies`.
+        """
+        with metrics.BROWSER_NAVIGATION_SECONDS.time():
+            result = await asyncio.gather(self.waitForNavigation(options), *aws)
+        cookie_sync = None
+        if not self._tracking_cookies:
+            start = time.perf_counter()
+            await self.cookies_manager.update_from_pyppeteer(self)
+            cookie_sync = time.perf_counter() - start
+        await self._trace_navigation(cookie_sync)
+        return result
+
+    async def _trace_navigation(self, cookie_sync=None) -> None:
+        """Hands the timing of the last navigation, read from the page's
+        Navigation Timing entry, to the client's tracer."""
+        tracer = self._browser_client.tracer
+        if not tracer.enabled:
+            return
+        try:
+            timing = await self.evaluate(tracing.NAVIGATION_TIMING_JS)
+        except Exception:
+            timing = None
+        trace = tracing.navigation_trace(self.url, timing, cookie_sync)
+        trace.finish(tracer)
+
+    async def screenshot(
+        self,
+        selector: str = "",
+        hide_selectors: List[str] = None,
+        show=False,
+        options: dict = None,
+        fidelity=False,
+        **kwargs,
+    ):
+        """Another method to take a screen shot.
+
+            Args:
+                selector: take a screen shot of the element located by css 
+                    selector. If it's not set, then take a screen shot of the 
+                    full page.
+                hide_selectors: before taking screenshot, some elements may be 
+                    hided on purpose.
+                show: if set to True, then image will be opened by `Pillow`
+                options: same options of :meth:`screenshot`
+                fidelity: if set to True, resources blocked by the 
+                    interception profile which are needed to render the page 
+                    are loaded, reloading the page if some were blocked.
+        """
+        if fidelity and not self.visual_fidelity:
+            self.visual_fidelity = True
+            stats = self.interception_stats
+            if stats is not None and stats.blocked_visual():
+                await self.reload()
+        if hide_selectors:
+            if isinstance(hide_selectors, list):
+                sels = ", ".join(hide_selectors)
+            elif isinstance(hide_selectors, str):
+                sels = hide_selectors
+            style = sels + "{display: none !important}"
+            await self.addStyleTag(content=style)
+        if not selector:
+            shot = await super().screenshot(options, **kwargs)
+        else:
+            ele = await self.J(selector)
+            if ele is None:
+                return 0
+            elif await ele.isIntersectingViewport():
+                shot = await ele.screenshot(options, **kwargs)
+            else:
+                return -1
+        if show:
+            from PIL import Image
+
+            img = Image.open(BytesIO(shot))
+            img.show()
+        return shot
+
+    async def check(self, check_flag: str, by_selector=True):
+        if by_selector:
+            return await self.J(check_flag)
+        else:
+            return await self.search([check_flag]) is not None
+
+    async def search(self, patterns):
+        """returns the first of ``patterns`` found in the page's html, or
+        None. The search runs in the page, so the html isn't transferred."""
+        return await self.evaluate(
+            """(patterns) => {
+                const html = document.documentElement.outerHTML;
+                return patterns.find(p => html.includes(p)) || null;
+            }""",
+            list(patterns),
+        )
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class PagePool:
+    """Keeps pages of a :class:`aninja.browser.BrowserClient` ready, with
+    emulation and stealth scripts already applied.
+
+    Pages are handed out by :meth:`acquire`, and reset by navigating to
+    ``about:blank`` when they're given back.
+
+    Attributes:
+        max_size: max number of pages owned by the pool, in use or idle.
+        idle_timeout: idle pages older than it (seconds) are closed.
+        warm: number of idle pages the pool tries to keep ready.
+        reset_cookies: what to do with the cookies of a returned page: None
+            to keep them, ``'clear'`` to delete them or ``'resync'`` to push
+            the cookies manager's cookies again.
+        hits: pages handed out from idle ones.
+        misses: pages which had to be created when requested.
+    """
+
+    def __init__(self, client, max_size=4, idle_timeout=60.0, warm=1,
+                 reset_cookies=None):
+        if reset_cookies not in (None, 'clear', 'resync'):
+            raise ValueError('reset_cookies: %r' % reset_cookies)
+        self.client = client
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.warm = min(warm, max_size)
+        self.reset_cookies = reset_cookies
+        self.hits = 0
+        self.misses = 0
+        self._idle = deque()
+        self._size = 0
+        self._released = asyncio.Condition()
+        self._warming = None
+        self._closed = False
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'idle': len(self._idle),
+            'in_use': self._size - len(self._idle),
+        }
+
+    async def fill(self, n=None) -> None:
+        """Creates idle pages until there're ``n`` (default: ``warm``) of
+        them."""
+        n = self.warm if n is None else min(n, self.max_size)
+        while len(self._idle) < n and self._size < self.max_size:
+            self._size += 1
+            try:
+                page = await self.client._create_page()
+            except BaseException:
+                self._size -= 1
+                raise
+            self._idle.append((page, time.monotonic()))
+
+    @asynccontextmanager
+    async def acquire(self, url=None, sync_cookies=True):
+        """Hands out a page in an ``async with`` block.
+
+        Args:
+            url: the url the page is going to visit, see
+                :meth:`BrowserClient.newPage`.
+            sync_cookies: push cookies of the cookies manager to the page.
+        """
+        page = await self.get(url, sync_cookies)
+        try:
+            yield page
+        finally:
+            await self.put(page)
+
+    async def get(self, url=None, sync_cookies=True):
+        if self._closed:
+            raise RuntimeError('the page pool is closed')
+        await self._reap()
+        async with self._released:
+            while not self._idle and self._size >= self.max_size:
+                await self._released.wait()
+            if self._idle:
+                page, _ = self._idle.pop()
+                self.hits += 1
+            else:
+                page = None
+                self._size += 1
+                self.misses += 1
+        if page is None:
+            try:
+                page = await self.client._create_page()
+            except BaseException:
+                await self._forget()
+                raise
+        if sync_cookies:
+            await self.client.cookies_manager.sync_to_pyppeteer(page, url=url)
+        self._keep_warm()
+        return page
+
+    async def put(self, page) -> None:
+        """Resets a page and makes it idle, or closes it if it can't be
+        reset."""
+        if self._closed:
+            await self._close_page(page)
+            return
+        try:
+            await page.goto('about:blank')
+            if self.reset_cookies == 'clear':
+                # page.cookies() would only list those of about:blank; the
+                # cookies are the context's, shared by its pages.
+                await page._client.send('Network.clearBrowserCookies')
+                self.client.cookies_manager.detach(page)
+            elif self.reset_cookies == 'resync':
+                await self.client.cookies_manager.sync_to_pyppeteer(
+                    page, full=True)
+        except Exception:
+            logger.warning('drop a page which cannot be reset', exc_info=True)
+            await self._close_page(page)
+            return
+        async with self._released:
+            self._idle.append((page, time.monotonic()))
+            self._released.notify()
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._warming is not None:
+            self._warming.cancel()
+        while self._idle:
+            page, _ = self._idle.popleft()
+            await self._close_page(page)
+
+    def discard_idle(self) -> None:
+        """Forgets idle pages without closing them, e.g. after their browser
+        crashed."""
+        self._size -= len(self._idle)
+        self._idle.clear()
+
+    def _keep_warm(self):
+        if len(self._idle) < self.warm and (
+            self._warming is None or self._warming.done()
+        ):
+            self._warming = asyncio.ensure_future(self._warm())
+
+    async def _warm(self):
+        try:
+            await self.fill()
+        except Exception:
+            logger.warning('failed to warm up pages', exc_info=True)
+
+    async def _reap(self):
+        deadline = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < deadline:
+            page, _ = self._idle.popleft()
+            await self._close_page(page)
+
+    async def _close_page(self, page):
+        try:
+            await page.close()
+        except Exception:
+            logger.debug('failed to close a page', exc_info=True)
+        await self._forget()
+
+    async def _forget(self):
+        async with self._released:
+            self._size -= 1
+            self._released.notify()
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,204 @@
+import asyncio
+import inspect
+import random
+import time
+from collections import deque
+
+from aiohttp import ClientError
+
+from aninja.throttle import _retry_after
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(
+    ('GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'))
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class RetryPolicy:
+    """Decides whether and when :class:`aninja.http.HTTPClient` retries a
+    request.
+
+    Only idempotent methods are retried unless ``methods`` says otherwise.
+    Delays grow exponentially with full jitter, and ``Retry-After`` headers
+    are honored up to ``max_backoff``.
+
+    Args:
+        attempts: max number of attempts, the first one included.
+        backoff: base delay in seconds.
+        max_backoff: max delay in seconds.
+        statuses: response statuses to retry.
+        retry_if_contains: retry if the body contains this string, e.g. a
+            block page's marker.
+        retry_unless_contains: retry if the body doesn't contain this string,
+            like the ``check_flag`` of :meth:`HTTPClient.check`.
+        retry_on: a callable (or coroutine function) taking the response and
+            returning whether to retry.
+        methods: methods which can be retried.
+        exceptions: exceptions which are retried.
+    """
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=30.0,
+                 statuses=RETRY_STATUSES, retry_if_contains=None,
+                 retry_unless_contains=None, retry_on=None,
+                 methods=IDEMPOTENT_METHODS,
+                 exceptions=(ClientError, asyncio.TimeoutError)):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.retry_if_contains = retry_if_contains
+        self.retry_unless_contains = retry_unless_contains
+        self.retry_on = retry_on
+        self.methods = frozenset(m.upper() for m in methods)
+        self.exceptions = tuple(exceptions)
+
+    def can_retry(self, method, attempt) -> bool:
+        """whether the ``attempt`` th attempt (from 1) can be followed by
+        another one."""
+        return attempt < self.attempts and method.upper() in self.methods
+
+    def delay(self, attempt, resp=None) -> float:
+        delay = random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if resp is not None:
+            retry_after = _retry_after(resp.headers)
+            if retry_after:
+                delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    async def should_retry(self, resp) -> bool:
+        if resp.status in self.statuses:
+            return True
+        if self.retry_if_contains is not None or \
+                self.retry_unless_contains is not None:
+            text = await resp.text()
+            if self.retry_if_contains is not None and \
+                    self.retry_if_contains in text:
+                return True
+            if self.retry_unless_contains is not None and \
+                    self.retry_unless_contains not in text:
+                return True
+        if self.retry_on is not None:
+            result = self.retry_on(resp)
+            if inspect.isawaitable(result):
+                result = await result
+            return bool(result)
+        return False
+
+
+class LatencyTracker:
+    """Recent latencies of a host and their quantile."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._sorted = None
+
+    def add(self, latency) -> None:
+        self._samples.append(latency)
+        self._sorted = None
+
+    def quantile(self, q):
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        if not self._sorted:
+            return None
+        return self._sorted[min(len(self._sorted) - 1,
+                                int(q * len(self._sorted)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class HedgePolicy:
+    """Sends a duplicate of a slow GET request when it hasn't been answered
+    within the ``quantile`` latency of its host. The first response wins and
+    the other request is cancelled.
+
+    Args:
+        quantile: latency quantile of the host to wait for, e.g. 0.95.
+        min_samples: latencies of a host to know before hedging.
+        min_delay: never hedge earlier than this, in seconds.
+        methods: methods which can be hedged.
+    """
+
+    def __init__(self, quantile=0.95, min_samples=20, min_delay=0.05,
+                 methods=('GET', 'HEAD'), window=200):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.methods = frozenset(m.upper() for m in methods)
+        self.window = window
+        self.hedged = 0
+        self.hedges_won = 0
+        self._latencies = {}
+
+    def record(self, host, latency) -> None:
+        tracker = self._latencies.get(host)
+        if tracker is None:
+            tracker = self._latencies[host] = LatencyTracker(self.window)
+        tracker.add(latency)
+
+    def delay(self, method, host):
+        """Seconds to wait before hedging, None if it shouldn't."""
+        if method.upper() not in self.methods:
+            return None
+        tracker = self._latencies.get(host)
+        if tracker is None or len(tracker) < self.min_samples:
+            return None
+        return max(self.min_delay, tracker.quantile(self.quantile))
+
+    async def run(self, send, method, host):
+        """Runs ``send()`` (a coroutine function), hedged if needed."""
+        delay = self.delay(method, host)
+        start = time.monotonic()
+        if delay is None:
+            resp = await send()
+            self.record(host, time.monotonic() - start)
+            return resp
+
+        first = asyncio.ensure_future(send())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            first.add_done_callback(_release_loser)
+            raise
+        if done:
+            self.record(host, time.monotonic() - start)
+            return first.result()
+
+        self.hedged += 1
+        second = asyncio.ensure_future(send())
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                # the first request wins a tie.
+                for task in sorted(done, key=lambda t: t is second):
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        task.result().release()
+                if winner is not None:
+                    if winner is second:
+                        self.hedges_won += 1
+                    self.record(host, time.monotonic() - start)
+                    return winner.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_release_loser)
+
+
+def _release_loser(task):
+    if task.cancelled() or task.exception() is not None:
+        return
+    task.result().release()
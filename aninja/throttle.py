@@ -0,0 +1,173 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+THROTTLED_STATUSES = frozenset((429, 503))
+
+
+class HostThrottle:
+    """A token bucket for one host, implemented as a virtual scheduler
+    (GCRA): every request reserves the next free time slot, so waiting
+    requests are served in order without locks.
+
+    Attributes:
+        rate: requests per second; None means unlimited.
+        burst: requests allowed at once after a quiet period.
+        waiting: requests waiting for a slot.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.waiting = 0
+        self._tat = 0.0  # theoretical arrival time of the next request
+        self._paused_until = 0.0
+
+    def reserve(self, now=None) -> float:
+        """Reserves a slot and returns seconds to wait for it."""
+        now = time.monotonic() if now is None else now
+        start = max(now, self._paused_until)
+        if self.rate is None:
+            return start - now
+        interval = 1.0 / self.rate
+        tat = max(self._tat, start)
+        self._tat = tat + interval
+        return max(0.0, tat - (self.burst - 1) * interval - now, start - now)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.waiting -= 1
+
+    def pause(self, seconds) -> None:
+        """Lets no request start in the next ``seconds``."""
+        self._paused_until = max(self._paused_until,
+                                 time.monotonic() + seconds)
+
+    def backlog(self) -> float:
+        """Seconds until a new request could start."""
+        return max(0.0, self._tat - time.monotonic(),
+                   self._paused_until - time.monotonic())
+
+
+class Scheduler:
+    """Paces requests per host, shared by all :class:`aninja.http.HTTPClient`
+    s of a process through :data:`default_scheduler`.
+
+    With ``adaptive`` set, the rate of a host follows AIMD: it's multiplied by
+    ``decrease`` when the host answers 429/503 or a block page is detected,
+    honoring ``Retry-After``, and grows by about ``increase`` requests per
+    second every second while responses are healthy.
+
+    Args:
+        rate: default requests per second of a host; None means unlimited.
+        burst: default burst of a host.
+        adaptive: enables AIMD.
+        min_rate, max_rate: bounds of adaptive rates. An adaptive host without
+            a rate starts at ``max_rate``.
+        is_blocked: a callable taking a response and returning whether it's a
+            block page.
+    """
+
+    def __init__(self, rate=None, burst=1, adaptive=False, min_rate=0.1,
+                 max_rate=100.0, increase=1.0, decrease=0.5,
+                 is_blocked=None):
+        self.hosts = {}
+        self.configure(rate, burst, adaptive, min_rate, max_rate, increase,
+                       decrease, is_blocked)
+
+    def configure(self, rate=None, burst=1, adaptive=False, min_rate=0.1,
+                  max_rate=100.0, increase=1.0, decrease=0.5,
+                  is_blocked=None) -> None:
+        """Changes the defaults. Hosts already seen keep their rates."""
+        self.rate = rate
+        self.burst = burst
+        self.adaptive = adaptive
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.is_blocked = is_blocked
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hosts) or self.rate is not None or self.adaptive
+
+    def set_rate(self, host, rate, burst=None) -> None:
+        throttle = self._throttle(host)
+        throttle.rate = rate
+        if burst is not None:
+            throttle.burst = burst
+
+    def _throttle(self, host) -> HostThrottle:
+        throttle = self.hosts.get(host)
+        if throttle is None:
+            rate = self.rate
+            if rate is None and self.adaptive:
+                rate = self.max_rate
+            throttle = self.hosts[host] = HostThrottle(rate, self.burst)
+        return throttle
+
+    async def acquire(self, host) -> None:
+        """Waits for a slot to send a request to the host."""
+        if not self.enabled:
+            return
+        await self._throttle(host).acquire()
+
+    def feedback(self, host, status=200, headers=None, blocked=None,
+                 response=None) -> None:
+        """Adapts the rate of a host with a response."""
+        if not self.adaptive:
+            return
+        if blocked is None:
+            blocked = bool(response is not None and self.is_blocked
+                           and self.is_blocked(response))
+        throttle = self._throttle(host)
+        if throttle.rate is None:
+            # seen before adaptive was configured, or set unlimited.
+            throttle.rate = self.max_rate
+        if blocked or status in THROTTLED_STATUSES:
+            throttle.rate = max(self.min_rate, throttle.rate * self.decrease)
+            retry_after = _retry_after(headers)
+            if retry_after:
+                throttle.pause(retry_after)
+            logger.debug('slow down %s to %.2f/s', host, throttle.rate)
+        elif throttle.rate < self.max_rate:
+            throttle.rate = min(self.max_rate,
+                                throttle.rate + self.increase / throttle.rate)
+
+    def stats(self) -> dict:
+        """Current rate, requests waiting and backlog (seconds) of hosts."""
+        return {
+            host: {
+                'rate': throttle.rate,
+                'queue': throttle.waiting,
+                'backlog': throttle.backlog(),
+            }
+            for host, throttle in self.hosts.items()
+        }
+
+
+def _retry_after(headers):
+    if not headers:
+        return None
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+default_scheduler = Scheduler()
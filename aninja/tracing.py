@@ -0,0 +1,318 @@
+import json
+import logging
+import time
+from collections import deque
+
+from aiohttp import TraceConfig
+
+from aninja.utils import get_logger
+
+logger = get_logger(__name__)
+
+# phases spent in aNinja rather than on the network.
+OWN_PHASES = frozenset(('throttle', 'cookie_sync'))
+
+
+class RequestTrace:
+    """Timing of one request of an :class:`aninja.http.HTTPClient`, or of one
+    navigation of a :class:`aninja.page.NinjaPage`, split in phases.
+
+    Phases, in seconds, are only present when they happened:
+
+    - ``throttle``: waiting for the scheduler of the client.
+    - ``queue``: waiting for a free connection.
+    - ``dns``, ``connect``, ``tls``: opening a connection. aiohttp doesn't
+      report the TLS handshake on its own, so for https requests of an
+      HTTPClient it's part of ``connect``.
+    - ``ttfb``: from sending the request until the response headers came.
+    - ``body``: from the headers until the last byte of the body came.
+    - ``render``: from the last byte until the ``load`` event of a page.
+    - ``cookie_sync``: merging cookies into the cookies manager.
+
+    Attributes:
+        kind: ``'http'`` or ``'navigation'``.
+        started: the epoch time it started at.
+        duration: seconds until it finished.
+        redirects: number of redirects followed.
+        reused: whether an HTTP request was sent on a kept alive connection.
+        error: the exception which ended the request, if any.
+    """
+
+    def __init__(self, kind, method, url):
+        self.kind = kind
+        self.method = method
+        self.url = str(url)
+        self.status = None
+        self.error = None
+        self.started = time.time()
+        self.duration = None
+        self.phases = {}
+        self.redirects = 0
+        self.reused = False
+        self._start = time.perf_counter()
+        self._marks = {}
+        self._headers_at = None
+        self._own_after_headers = 0.0
+        self._dns_before = 0.0
+        self._finished = False
+
+    def mark(self, phase) -> None:
+        self._marks[phase] = time.perf_counter()
+
+    def add(self, phase, seconds=None) -> None:
+        """Adds ``seconds`` to a phase, or the time since it was marked."""
+        if seconds is None:
+            start = self._marks.pop(phase, None)
+            if start is None:
+                return
+            seconds = time.perf_counter() - start
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self, tracer) -> None:
+        """Ends the trace and hands it to ``tracer``, once."""
+        if self._finished:
+            return
+        self._finished = True
+        now = time.perf_counter()
+        if self._headers_at is not None:
+            body = now - self._headers_at - self._own_after_headers
+            if body > 0:
+                self.phases['body'] = body
+        if self.duration is None:
+            self.duration = now - self._start
+        try:
+            tracer.record(self)
+        except Exception:
+            logger.exception('tracer failed to record a trace')
+
+    def follow(self, response, tracer) -> None:
+        """Finishes the trace once the body of an aiohttp ``response`` has
+        been received, or once the response is released or closed before
+        that, with the error which ended the body."""
+        content = response.content
+        if content.is_eof():
+            # the body came while the cookies were merged.
+            self._own_after_headers = self.phases.get('cookie_sync', 0.0)
+        content.on_eof(lambda: self.finish(tracer))
+        # an exception set on the body drops its eof callbacks, e.g. when the
+        # response is released unread or its connection is lost.
+        release, close = response.release, response.close
+
+        def ended():
+            if not self._finished:
+                if self.error is None:
+                    self.error = content.exception()
+                self.finish(tracer)
+
+        def release_and_finish():
+            try:
+                return release()
+            finally:
+                ended()
+
+        def close_and_finish():
+            try:
+                close()
+            finally:
+                ended()
+
+        response.release = release_and_finish
+        response.close = close_and_finish
+
+    def own_time(self) -> float:
+        """Seconds spent in aNinja's own bookkeeping."""
+        return sum(v for k, v in self.phases.items() if k in OWN_PHASES)
+
+    def as_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'method': self.method,
+            'url': self.url,
+            'status': self.status,
+            'error': None if self.error is None else repr(self.error),
+            'started': self.started,
+            'duration': self.duration,
+            'phases': dict(self.phases),
+            'redirects': self.redirects,
+            'reused': self.reused,
+        }
+
+    def __repr__(self):
+        return '<RequestTrace %s %s %s %s>' % (
+            self.method, self.url, self.status, self.phases)
+
+
+class Tracer:
+    """Receives finished :class:`RequestTrace` s. Subclass it and override
+    :meth:`record` to send traces elsewhere.
+
+    Attributes:
+        enabled: if it's False, clients don't build traces at all.
+    """
+    enabled = True
+
+    def record(self, trace: RequestTrace) -> None:
+        raise NotImplementedError
+
+
+class NullTracer(Tracer):
+    """Drops everything; the default."""
+    enabled = False
+
+    def record(self, trace):
+        pass
+
+
+class LoggingTracer(Tracer):
+    """Logs every trace as a line of JSON. The dict is also given as the
+    ``trace`` attribute of the log record, for structured log handlers."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger if logger is not None else get_logger(__name__)
+        self.level = level
+
+    def record(self, trace):
+        data = trace.as_dict()
+        self.logger.log(self.level, 'trace %s', json.dumps(data),
+                        extra={'trace': data})
+
+
+class RingBufferTracer(Tracer):
+    """Keeps the last ``size`` traces in memory."""
+
+    def __init__(self, size=1000):
+        self.traces = deque(maxlen=size)
+
+    def record(self, trace):
+        self.traces.append(trace)
+
+    def clear(self) -> None:
+        self.traces.clear()
+
+    def summary(self, kind=None) -> dict:
+        """Returns the mean seconds of each phase over the kept traces, and
+        of the whole ``duration``. A phase which didn't happen counts as 0.
+        """
+        traces = [t for t in self.traces if kind is None or t.kind == kind]
+        if not traces:
+            return {}
+        totals = {}
+        for trace in traces:
+            for phase, seconds in trace.phases.items():
+                totals[phase] = totals.get(phase, 0.0) + seconds
+            totals['duration'] = (totals.get('duration', 0.0)
+                                  + (trace.duration or 0.0))
+        return {phase: total / len(traces) for phase, total in totals.items()}
+
+    def __iter__(self):
+        return iter(list(self.traces))
+
+    def __len__(self):
+        return len(self.traces)
+
+
+default_tracer = NullTracer()
+
+
+def _trace_of(trace_request_ctx=None):
+    # the context given to the callbacks is the RequestTrace passed as
+    # ``trace_request_ctx`` by HTTPClient, or None for other requests.
+    if isinstance(trace_request_ctx, RequestTrace):
+        return trace_request_ctx
+    return None
+
+
+def _marker(phase):
+    async def callback(session, trace, params):
+        if trace is not None:
+            trace.mark(phase)
+    return callback
+
+
+def _adder(phase):
+    async def callback(session, trace, params):
+        if trace is not None:
+            trace.add(phase)
+    return callback
+
+
+async def _on_connection_create_start(session, trace, params):
+    if trace is not None:
+        trace.mark('connect')
+        trace._dns_before = trace.phases.get('dns', 0.0)
+
+
+async def _on_connection_create_end(session, trace, params):
+    if trace is not None:
+        # lookups happen while the connection is created.
+        dns = trace.phases.get('dns', 0.0) - trace._dns_before
+        start = trace._marks.pop('connect', None)
+        if start is not None:
+            trace.add('connect', time.perf_counter() - start - dns)
+
+
+async def _on_connection_reuseconn(session, trace, params):
+    if trace is not None:
+        trace.reused = True
+
+
+async def _on_request_redirect(session, trace, params):
+    if trace is not None:
+        trace.add('ttfb')
+        trace.redirects += 1
+
+
+async def _on_request_end(session, trace, params):
+    if trace is not None:
+        trace.add('ttfb')
+        trace._headers_at = time.perf_counter()
+
+
+trace_config = TraceConfig(trace_config_ctx_factory=_trace_of)
+trace_config.on_connection_queued_start.append(_marker('queue'))
+trace_config.on_connection_queued_end.append(_adder('queue'))
+trace_config.on_dns_resolvehost_start.append(_marker('dns'))
+trace_config.on_dns_resolvehost_end.append(_adder('dns'))
+trace_config.on_connection_create_start.append(_on_connection_create_start)
+trace_config.on_connection_create_end.append(_on_connection_create_end)
+trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+trace_config.on_request_headers_sent.append(_marker('ttfb'))
+trace_config.on_request_redirect.append(_on_request_redirect)
+trace_config.on_request_end.append(_on_request_end)
+
+NAVIGATION_TIMING_JS = """() => {
+    const entry = performance.getEntriesByType('navigation')[0];
+    return entry ? entry.toJSON() : null;
+}"""
+
+
+def navigation_trace(url, timing, cookie_sync=None) -> RequestTrace:
+    """Builds the trace of a page navigation from its Navigation Timing
+    entry (milliseconds since the navigation started)."""
+    trace = RequestTrace('navigation', 'GET', url)
+    if not timing:
+        return trace
+
+    def span(start, end):
+        start, end = timing.get(start) or 0, timing.get(end) or 0
+        return (end - start) / 1000 if end > start > 0 else None
+
+    secure = timing.get('secureConnectionStart') or 0
+    phases = {
+        'dns': span('domainLookupStart', 'domainLookupEnd'),
+        'connect': span('connectStart',
+                        'secureConnectionStart' if secure else 'connectEnd'),
+        'tls': span('secureConnectionStart', 'connectEnd') if secure else None,
+        'ttfb': span('requestStart', 'responseStart'),
+        'body': span('responseStart', 'responseEnd'),
+        'render': span('responseEnd', 'loadEventEnd'),
+    }
+    trace.phases = {k: v for k, v in phases.items() if v}
+    if cookie_sync is not None:
+        trace.phases['cookie_sync'] = cookie_sync
+    trace.status = timing.get('responseStatus') or None
+    trace.redirects = timing.get('redirectCount', 0)
+    trace.duration = (timing.get('duration') or 0) / 1000 or None
+    if trace.duration:
+        trace.started -= trace.duration
+    return trace
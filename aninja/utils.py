@@ -1,10 +1,26 @@
 import time
-import dateparser
+import calendar
+import functools
 import random
-import asyncio
+import re
 import logging
 TIME_TEMPLATE = '%a, %d-%b-%Y %H:%M:%S GMT'
 
+_MONTHS = {m: i for i, m in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+     'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+_TIME = r'(\d{1,2}):(\d{1,2}):(\d{1,2})'
+# RFC 1123 ("Sun, 06 Nov 1994 08:49:37 GMT"), the Netscape variant
+# ("Sun, 06-Nov-1994 08:49:37 GMT") and RFC 850 ("Sunday, 06-Nov-94
+# 08:49:37 GMT").
+_RFC1123_RE = re.compile(
+    r'^\s*(?:[a-z]+,?\s+)?(\d{1,2})[\s-]+([a-z]{3})[a-z]*[\s-]+(\d{2,4})\s+'
+    + _TIME + r'\s*(?:gmt|utc|z)?\s*$', re.I)
+# asctime ("Sun Nov  6 08:49:37 1994")
+_ASCTIME_RE = re.compile(
+    r'^\s*(?:[a-z]+,?\s+)?([a-z]{3})[a-z]*\s+(\d{1,2})\s+'
+    + _TIME + r'\s+(\d{4})\s*(?:gmt|utc)?\s*$', re.I)
+
 
 def filter_attrs(time_format='number',
                  attrs=('name', 'value', 'domain', 'path', 'expires'),
@@ -50,14 +66,97 @@ def expires_to_str(raw, template=TIME_TEMPLATE):
 
 def _parse_expires_to_timestamp(raw):
     if isinstance(raw, str):
-        dt = dateparser.parse(raw)
-        return dt.timestamp()
+        return parse_cookie_date(raw)
     elif isinstance(raw, (int, float)):
         return raw
     else:
         raise TypeError('Need a valid expires time.')
 
 
+@functools.lru_cache(maxsize=1024)
+def parse_cookie_date(raw: str):
+    """Parses the date of a cookie's expires attribute to a timestamp.
+
+    Formats used by servers (RFC 1123, RFC 850 and asctime, all in GMT) are
+    parsed directly. Others are handed to :mod:`dateparser`, which is much
+    slower and only imported when needed. Results are cached, since the same
+    few dates are usually shared by many cookies.
+    """
+    match = _RFC1123_RE.match(raw)
+    if match:
+        day, month, year, hour, minute, second = match.groups()
+    else:
+        match = _ASCTIME_RE.match(raw)
+        if match:
+            month, day, hour, minute, second, year = match.groups()
+    if match:
+        timestamp = _to_timestamp(year, month, day, hour, minute, second)
+        if timestamp is not None:
+            return timestamp
+    return _parse_date_slowly(raw)
+
+
+def _to_timestamp(year, month, day, hour, minute, second):
+    month = _MONTHS.get(month.lower())
+    if month is None:
+        return None
+    year = int(year)
+    if year < 100:
+        # RFC 6265 section 5.1.1
+        year += 1900 if year >= 70 else 2000
+    fields = (int(day), int(hour), int(minute), int(second))
+    if not (1 <= fields[0] <= 31 and fields[1] <= 23 and fields[2] <= 59
+            and fields[3] <= 59):
+        return None
+    return calendar.timegm((year, month) + fields)
+
+
+def _parse_date_slowly(raw):
+    import dateparser
+
+    dt = dateparser.parse(raw)
+    if dt is None:
+        raise ValueError('Unknown expires time: %r' % raw)
+    return dt.timestamp()
+
+
+class StreamMatcher:
+    """Finds the first of several patterns in a stream of byte chunks,
+    including matches split across chunks.
+
+    Patterns are matched as bytes in ``encoding``; the last
+    ``len(longest pattern) - 1`` bytes of a chunk are kept to be searched
+    with the next one.
+    """
+
+    def __init__(self, patterns, encoding='utf-8'):
+        self.patterns = {}
+        for pattern in patterns:
+            raw = pattern if isinstance(pattern, bytes) else pattern.encode(
+                encoding)
+            if not raw:
+                raise ValueError('empty pattern')
+            self.patterns.setdefault(raw, pattern)
+        longest = max(map(len, self.patterns))
+        self._keep = longest - 1
+        # longer patterns first, so a pattern isn't hidden by its prefix
+        self._re = re.compile(b'|'.join(
+            re.escape(p) for p in sorted(self.patterns, key=len,
+                                         reverse=True)))
+        self._tail = b''
+        self.consumed = 0
+
+    def feed(self, chunk: bytes):
+        """returns the first pattern found so far, None if there isn't."""
+        self.consumed += len(chunk)
+        buffer = self._tail + chunk
+        match = self._re.search(buffer)
+        if match:
+            return self.patterns[match.group()]
+        self._tail = buffer[-self._keep:] if self._keep else b''
+        return None
+
+
 js1 = '''() =>{
     
            Object.defineProperties(navigator,{
@@ -104,6 +203,8 @@ def get_user_agent():
 
 
 def sync_coroutine(coro, loop=None):
+    import asyncio
+
     return (loop or asyncio.get_event_loop()).run_until_complete(coro)
 
 
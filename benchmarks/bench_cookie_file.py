@@ -0,0 +1,48 @@
+"""Save and load cost of :class:`aninja.cookies.CookiesManager` in the LWP
+text format and in the binary format of :mod:`aninja.cookiefile`.
+
+Loading a binary file reads only its domain table, so the first url query
+(which reads one site) and a full read are timed separately.
+
+Usage: python -m benchmarks.bench_cookie_file [n_cookies] [n_sites]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from aninja.cookies import CookiesManager
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(n_cookies=100000, n_sites=1000):
+    manager = CookiesManager()
+    for i in range(n_cookies):
+        manager.set('c%d' % i, 'v%d' % i, domain='.site%d.com' % (
+            i % n_sites), path='/p%d' % (i % 7), expires=2000000000 + i,
+            rest={'HttpOnly': None})
+    directory = tempfile.mkdtemp()
+    url = 'http://www.site1.com/p1'
+    print('cookies: %d, sites: %d' % (n_cookies, n_sites))
+    for format in ('lwp', 'binary'):
+        filename = os.path.join(directory, 'cookies.' + format)
+        save = _timed(lambda: manager.save(filename, format=format))
+        loaded = CookiesManager()
+        load = _timed(lambda: loaded.load(filename))
+        query = _timed(lambda: loaded.output_header_string(url=url))
+        full = _timed(lambda: list(loaded.output_cookiejar()))
+        print('%-6s save %8.1f ms  load %8.1f ms  first query %6.1f ms  '
+              'read all %8.1f ms  size %6.1f MB' % (
+                  format, save, load, query, full,
+                  os.path.getsize(filename) / 1e6))
+        os.remove(filename)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""Per-request cookie bookkeeping cost of :class:`aninja.http.HTTPClient`
+with a large jar.
+
+Compares the former full rescan of the aiohttp cookie jar
+(:meth:`CookiesManager.update_from_aiohttp_session`) with harvesting only
+the cookies set by the response (:meth:`CookiesManager.update_from_response`).
+
+Usage: python -m benchmarks.bench_cookie_harvest [n_cookies] [n_requests]
+"""
+import asyncio
+import sys
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aninja.http import HTTPClient
+
+
+async def _handler(request):
+    resp = web.Response(text='ok')
+    resp.set_cookie('session', str(time.time()))
+    return resp
+
+
+async def main(n_cookies=10000, n_requests=200):
+    app = web.Application()
+    app.router.add_get('/', _handler)
+    server = TestServer(app, host='localhost')
+    await server.start_server()
+    url = server.make_url('/')
+
+    async with HTTPClient() as client:
+        for i in range(n_cookies):
+            client.cookies_manager.set(
+                'c%d' % i, 'v%d' % i, domain='site%d.example.com' % (i % 300))
+        client.cookies_manager.sync_to_aiohttp_session(client.session)
+
+        resp = await client.get(url)
+        await resp.release()
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            resp = await client.get(url)
+            await resp.release()
+        harvest = (time.perf_counter() - start) / n_requests
+
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            resp = await client.session.get(url)
+            await resp.release()
+            client.cookies_manager.update_from_aiohttp_session(client.session)
+        rescan = (time.perf_counter() - start) / n_requests
+
+    await server.close()
+    print('cookies in jar: %d, requests: %d' % (n_cookies, n_requests))
+    print('full jar rescan:   %8.3f ms/request' % (rescan * 1000))
+    print('response harvest:  %8.3f ms/request' % (harvest * 1000))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,67 @@
+"""Memory per cookie and construction throughput of
+:class:`aninja.cookierecord.CookieRecord`, built by
+:func:`aninja.cookies.create_cookie`, against ``http.cookiejar.Cookie``
+built by ``requests.cookies.create_cookie``.
+
+Memory is measured with tracemalloc over ``n_cookies`` cookies, names and
+values excluded. Domains and paths repeat as they do in a jar.
+
+Usage: python -m benchmarks.bench_cookie_record [n_cookies]
+"""
+import sys
+import time
+import tracemalloc
+
+from requests.cookies import create_cookie as requests_create_cookie
+
+from aninja.cookies import CookiesManager, create_cookie
+
+
+def _args(n_cookies):
+    return [('c%d' % i, 'v%d' % i, '.site%d.com' % (i % 1000),
+             '/p%d' % (i % 7)) for i in range(n_cookies)]
+
+
+def _build(factory, args):
+    # domains and paths come from headers or files: copies, not constants
+    return [factory(name, value, domain=''.join(domain), path=''.join(path))
+            for name, value, domain, path in args]
+
+
+def _memory(func, args):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cookies = func(args)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(cookies)
+
+
+def _throughput(func, args):
+    start = time.perf_counter()
+    func(args)
+    return len(args) / (time.perf_counter() - start)
+
+
+def _jar(args):
+    manager = CookiesManager()
+    for name, value, domain, path in args:
+        manager.set(name, value, domain=domain, path=path)
+    return manager.output_cookiejar()
+
+
+def main(n_cookies=100000):
+    args = _args(n_cookies)
+    print('cookies: %d' % n_cookies)
+    for label, factory in (('http.cookiejar.Cookie', requests_create_cookie),
+                           ('CookieRecord', create_cookie)):
+        build = lambda args, factory=factory: _build(factory, args)
+        print('%-22s %6.0f bytes/cookie  %9.0f cookies/s' % (
+            label, _memory(build, args), _throughput(build, args)))
+    print('%-22s %6.0f bytes/cookie  %9.0f cookies/s' % (
+        'CookiesManager.set', _memory(lambda a: list(_jar(a)), args),
+        _throughput(_jar, args)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""Cost of syncing a large :class:`aninja.cookies.CookiesManager` to an
+attached requests cookie jar and to a page after a few changes, pushing
+every cookie (``full=True``) against pushing the changes only, and the cost
+of :meth:`CookiesManager.copy` against copying cookies one by one.
+
+Usage: python -m benchmarks.bench_delta_sync [n_cookies] [n_changes]
+"""
+import asyncio
+import sys
+import time
+
+from requests.cookies import RequestsCookieJar
+
+from aninja.cookies import CookiesManager
+
+
+class _Session:
+    async def send(self, method, params):
+        pass
+
+
+class _Page:
+    url = 'about:blank'
+
+    def __init__(self):
+        self._client = _Session()
+
+
+def _ms(func):
+    start = time.perf_counter()
+    result = func()
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    return (time.perf_counter() - start) * 1000
+
+
+def main(n_cookies=20000, n_changes=10):
+    manager = CookiesManager()
+    for i in range(n_cookies):
+        manager.set('c%d' % i, 'v', domain='.site%d.com' % (i % 500))
+    jar = RequestsCookieJar()
+    page = _Page()
+    manager.sync_to_cookiejar(jar)
+    asyncio.run(manager.sync_to_pyppeteer(page))
+    print('cookies: %d, changes: %d' % (n_cookies, n_changes))
+
+    for full in (True, False):
+        for i in range(n_changes):
+            manager.set('c%d' % i, 'changed', domain='.site%d.com' % (i % 500))
+        to_jar = _ms(lambda: manager.sync_to_cookiejar(jar, full=full))
+        to_page = _ms(lambda: manager.sync_to_pyppeteer(page, full=full))
+        print('%-6s sync to cookiejar %8.2f ms  to page %8.2f ms' % (
+            'full' if full else 'delta', to_jar, to_page))
+
+    def copy_each():
+        m = CookiesManager()
+        m.update(manager.output_cookiejar())
+
+    print('copy   one by one %8.1f ms  copy() %8.1f ms' % (
+        _ms(copy_each), _ms(manager.copy)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
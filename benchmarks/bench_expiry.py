@@ -0,0 +1,53 @@
+"""Cost of removing expired cookies from a large
+:class:`aninja.cookies.NinjaCookieJar`: the scan of
+``http.cookiejar.CookieJar.clear_expired_cookies``, which requests runs
+after each request, against the expiry heap of :meth:`NinjaCookieJar.evict`,
+and the cost of setting cookies with and without limits.
+
+Usage: python -m benchmarks.bench_expiry [n_cookies] [n_expired]
+"""
+import sys
+import time
+from http.cookiejar import CookieJar
+
+from aninja.cookies import CookiesManager
+
+
+def _fill(manager, n_cookies, n_expired, now):
+    for i in range(n_cookies):
+        expires = now - 1 if i < n_expired else now + 3600 + i
+        manager.set('c%d' % i, 'v', domain='.site%d.com' % (i % 500),
+                    expires=expires)
+
+
+def _ms(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(n_cookies=50000, n_expired=10):
+    now = int(time.time())
+    print('cookies: %d, expired: %d' % (n_cookies, n_expired))
+    scan = CookiesManager()
+    _fill(scan, n_cookies, n_expired, now)
+    heap = CookiesManager()
+    _fill(heap, n_cookies, n_expired, now)
+    jar = scan.output_cookiejar()
+    print('scan  %8.2f ms (%8.2f ms with nothing to remove)' % (
+        _ms(lambda: CookieJar.clear_expired_cookies(jar)),
+        _ms(lambda: CookieJar.clear_expired_cookies(jar))))
+    jar = heap.output_cookiejar()
+    print('heap  %8.2f ms (%8.2f ms with nothing to remove)' % (
+        _ms(jar.evict), _ms(jar.evict)))
+    assert len(scan) == len(heap) == n_cookies - n_expired
+
+    for limits in ({}, {'max_per_domain': n_cookies,
+                        'max_bytes': n_cookies * 1000}):
+        print('set %d cookies %-9s %8.1f ms' % (
+            n_cookies, 'limited' if limits else 'unlimited',
+            _ms(lambda: _fill(CookiesManager(**limits), n_cookies, 0, now))))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,59 @@
+"""Cold import time of aninja modules, each in a fresh interpreter.
+
+Heavy dependencies (pyppeteer, PIL, dateparser) must not be imported by
+``import aninja.<module>``; they're loaded by the feature which needs them.
+The run fails if one of them is, or if ``--budget`` milliseconds are given
+and an import is slower than that.
+
+Usage: python -m benchmarks.bench_import [--repeat N] [--budget MS]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = ('aninja.utils', 'aninja.cookies', 'aninja.http', 'aninja.browser')
+HEAVY = ('pyppeteer', 'PIL', 'dateparser', 'websockets')
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {heavy!r} if m in sys.modules)]))
+'''
+
+
+def measure(module, repeat=5):
+    """Returns the best import time of ``module`` in seconds and the heavy
+    modules it imported."""
+    best, heavy = None, []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY)],
+            check=True, capture_output=True, text=True).stdout
+        elapsed, heavy = json.loads(out)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=None,
+                        help='max milliseconds per module')
+    args = parser.parse_args(argv)
+    failed = False
+    for module in MODULES:
+        elapsed, heavy = measure(module, args.repeat)
+        ms = elapsed * 1000
+        over = args.budget is not None and ms > args.budget
+        failed = failed or over or bool(heavy)
+        print('%-16s %7.1f ms%s%s' % (
+            module, ms, '  OVER BUDGET' if over else '',
+            '  imports %s' % ', '.join(heavy) if heavy else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Cost of keeping a large jar on disk: saving it whole after some changes,
+against :meth:`aninja.cookies.CookiesManager.persist` which journals the
+changes only.
+
+For the journal, the time spent by the thread setting cookies (queueing the
+changes) and the time until they are written and fsynced are shown apart.
+
+Usage: python -m benchmarks.bench_journal [n_cookies] [n_changes]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from aninja.cookies import CookiesManager
+
+
+def _fill(manager, n_cookies):
+    for i in range(n_cookies):
+        manager.set('c%d' % i, 'v%d' % i, domain='.site%d.com' % (i % 1000),
+                    expires=2000000000 + i)
+
+
+def _change(manager, n_changes):
+    for i in range(n_changes):
+        manager.set('c%d' % i, 'changed', domain='.site%d.com' % (i % 1000),
+                    expires=2000000000 + i)
+
+
+def _ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def main(n_cookies=100000, n_changes=100):
+    directory = tempfile.mkdtemp()
+    print('cookies: %d, changes: %d' % (n_cookies, n_changes))
+
+    manager = CookiesManager()
+    _fill(manager, n_cookies)
+    for format in ('lwp', 'binary'):
+        filename = os.path.join(directory, 'cookies.' + format)
+        start = time.perf_counter()
+        _change(manager, n_changes)
+        changed = _ms(start)
+        start = time.perf_counter()
+        manager.save(filename, format=format)
+        print('save %-7s changes %7.2f ms  saved in %8.1f ms' % (
+            format, changed, _ms(start)))
+
+    manager = CookiesManager()
+    journal = manager.persist(os.path.join(directory, 'journal'),
+                              compact_min=n_cookies)
+    _fill(manager, n_cookies)
+    journal.compact()
+    start = time.perf_counter()
+    _change(manager, n_changes)
+    changed = _ms(start)
+    start = time.perf_counter()
+    journal.flush()
+    print('journal        changes %7.2f ms  saved in %8.1f ms' % (
+        changed, _ms(start)))
+    journal.close()
+
+    start = time.perf_counter()
+    restored = CookiesManager()
+    restored.persist(os.path.join(directory, 'journal')).close()
+    print('journal load %.1f ms, %d cookies' % (_ms(start), len(restored)))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""Hot path cost of :mod:`aninja.metrics` updates.
+
+Compares a sharded counter increment and a histogram observation with a
+plain dict increment and with a counter guarded by a lock.
+
+Usage: python -m benchmarks.bench_metrics [n_updates]
+"""
+import sys
+import threading
+import time
+
+from aninja.metrics import Counter, Histogram
+
+
+def _per_op(func, n):
+    start = time.perf_counter()
+    func(n)
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main(n_updates=1000000):
+    plain = {}
+
+    def dict_inc(n):
+        key = ('example.com',)
+        for _ in range(n):
+            plain[key] = plain.get(key, 0) + 1
+
+    lock = threading.Lock()
+
+    def locked_inc(n):
+        key = ('example.com',)
+        for _ in range(n):
+            with lock:
+                plain[key] = plain.get(key, 0) + 1
+
+    counter = Counter('requests_total', labelnames=['host'])
+
+    def counter_inc(n):
+        inc = counter.inc
+        for _ in range(n):
+            inc('example.com')
+
+    histogram = Histogram('latency_seconds', labelnames=['host', 'status'])
+
+    def histogram_observe(n):
+        observe = histogram.observe
+        for _ in range(n):
+            observe(0.042, 'example.com', 200)
+
+    print('updates: %d' % n_updates)
+    print('plain dict:         %6.1f ns/op' % _per_op(dict_inc, n_updates))
+    print('dict with lock:     %6.1f ns/op' % _per_op(locked_inc, n_updates))
+    print('counter.inc:        %6.1f ns/op' % _per_op(counter_inc, n_updates))
+    print('histogram.observe:  %6.1f ns/op'
+          % _per_op(histogram_observe, n_updates))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,111 @@
+from aiohttp import web
+import asyncio
+from aiohttp.test_utils import TestServer
+import pytest_asyncio
+
+
+async def _set_cookies(request):
+    resp = web.HTTPFound('/cookies')
+    for name, value in request.query.items():
+        resp.set_cookie(name, value)
+    raise resp
+
+
+async def _delete_cookies(request):
+    resp = web.HTTPFound('/cookies')
+    for name in request.query:
+        resp.del_cookie(name)
+    raise resp
+
+
+async def _cookies(request):
+    return web.json_response({'cookies': dict(request.cookies)})
+
+
+def _echo_handler(stats):
+    async def echo(request):
+        """Responds with the ``text`` query after ``delay`` seconds with the
+        ``status`` query, and counts concurrent requests."""
+        stats['running'] += 1
+        stats['max_running'] = max(stats['max_running'], stats['running'])
+        try:
+            await asyncio.sleep(float(request.query.get('delay', 0)))
+        finally:
+            stats['running'] -= 1
+        return web.Response(text=request.query.get('text', ''),
+                            status=int(request.query.get('status', 200)))
+    return echo
+
+
+def _flaky_handler(stats):
+    async def flaky(request):
+        """The first ``fails`` calls with the same ``key`` get 500 and the
+        first ``slow`` ones wait a second."""
+        key = request.query.get('key', '')
+        calls = stats['calls'][key] = stats['calls'].get(key, 0) + 1
+        if calls <= int(request.query.get('slow', 0)):
+            await asyncio.sleep(1)
+        if calls <= int(request.query.get('fails', 0)):
+            return web.Response(status=500, text='failed')
+        return web.Response(text='ok %d' % calls)
+    return flaky
+
+
+def _cached_handler(stats):
+    async def cached(request):
+        """A resource with the ETag ``"v1"`` and the ``Cache-Control`` given
+        by the ``cc`` query, which can be revalidated."""
+        key = 'cached ' + request.query.get('key', '')
+        stats['calls'][key] = stats['calls'].get(key, 0) + 1
+        await asyncio.sleep(float(request.query.get('delay', 0)))
+        headers = {'ETag': '"v1"',
+                   'Cache-Control': request.query.get('cc', 'no-cache')}
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers=headers)
+        return web.Response(text='body', headers=headers)
+    return cached
+
+
+async def _stream(request):
+    """Streams ``size`` bytes in chunks of ``chunk`` bytes, with ``marker``
+    written at ``at``, with the ``status`` query."""
+    size = int(request.query['size'])
+    chunk = int(request.query.get('chunk', 1000))
+    body = bytearray(b'a' * size)
+    marker = request.query.get('marker', '').encode()
+    at = int(request.query.get('at', 0))
+    body[at:at + len(marker)] = marker
+    resp = web.StreamResponse(status=int(request.query.get('status', 200)))
+    resp.content_type = 'text/html'
+    await resp.prepare(request)
+    for i in range(0, size, chunk):
+        await resp.write(bytes(body[i:i + chunk]))
+    return resp
+
+
+def make_app(stats):
+    app = web.Application()
+    app.router.add_get('/echo', _echo_handler(stats))
+    app.router.add_route('*', '/flaky', _flaky_handler(stats))
+    app.router.add_get('/cached', _cached_handler(stats))
+    app.router.add_get('/stream', _stream)
+    app.router.add_get('/cookies/set', _set_cookies)
+    app.router.add_get('/cookies/delete', _delete_cookies)
+    app.router.add_get('/cookies', _cookies)
+    return app
+
+
+@pytest_asyncio.fixture
+async def local_httpbin():
+    """A local server with httpbin's cookie interfaces, used by tests which
+    shouldn't depend on the network."""
+    stats = {'running': 0, 'max_running': 0, 'calls': {}}
+    server = TestServer(make_app(stats), host='localhost')
+    await server.start_server()
+
+    def url(interface=''):
+        return str(server.make_url(interface))
+
+    url.stats = stats
+    yield url
+    await server.close()
@@ -0,0 +1,132 @@
+from aninja.backends import SQLiteBackend
+from aninja.cookies import CookiesManager, create_cookie
+import multiprocessing
+import pytest
+import threading
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / 'cookies.db')
+
+
+def _manager(filename, poll_interval=0):
+    return CookiesManager(backend=SQLiteBackend(filename, poll_interval))
+
+
+def test_managers_converge(filename):
+    a = _manager(filename)
+    a.set('sid', 'abc', domain='example.com', rest={'HttpOnly': None})
+    b = _manager(filename)
+    assert b.output_dict() == {'sid': 'abc'}
+    assert b.output_detailed() == a.output_detailed()
+
+    b.set('lang', 'fr', domain='www.example.com', expires=2000000000)
+    a.update_from_headers(['sid=; Max-Age=0; Domain=example.com'],
+                          'http://www.example.com/')
+    assert a.output_dict() == b.output_dict() == {'lang': 'fr'}
+    assert len(a) == len(b) == 1
+
+
+def test_evictions_stay_local(filename):
+    a = _manager(filename)
+    a.set('a', '1', domain='example.com')
+    a.set('b', '1', domain='example.com')
+    b = CookiesManager(backend=SQLiteBackend(filename, 0), max_per_domain=1)
+    assert b.output_dict() == {'b': '1'}
+    b.set('c', '1', domain='example.com')
+    assert b.output_dict() == {'c': '1'}
+    a.refresh()
+    assert a.output_dict() == {'a': '1', 'b': '1', 'c': '1'}
+    assert len(SQLiteBackend(filename).cookies()) == 3
+
+    # a removal is still a removal.
+    b.update_from_headers(['c=; Max-Age=0; Domain=example.com'],
+                          'http://example.com/')
+    a.refresh()
+    assert a.output_dict() == {'a': '1', 'b': '1'}
+
+
+def test_cookies_set_during_a_pull_are_written(filename):
+    a = _manager(filename)
+    b = _manager(filename)
+
+    def set_elsewhere(cookie, removed):
+        if cookie.name == 'pulled':
+            t = threading.Thread(
+                target=b.set, args=('other', '1'),
+                kwargs={'domain': 'example.com'})
+            t.start()
+            t.join()
+
+    b.output_cookiejar().add_listener(set_elsewhere)
+    a.set('pulled', '1', domain='example.com')
+    b.refresh()
+    a.refresh()
+    assert a.output_dict() == {'pulled': '1', 'other': '1'}
+
+
+def test_changes_since(filename):
+    backend = SQLiteBackend(filename)
+    other = SQLiteBackend(filename)
+    other.put(create_cookie('a', '1', domain='example.com'))
+    other.put(create_cookie('b', '1', domain='other.org'))
+    version, changes = backend.changes_since(0)
+    assert version == 2
+    assert [(d, n, c.value) for d, _, n, c in changes] == [
+        ('example.com', 'a', '1'), ('other.org', 'b', '1')]
+
+    other.delete('example.com', '/', 'a')
+    backend.put(create_cookie('c', '1', domain='example.com'))
+    version, changes = backend.changes_since(version)
+    assert version == 4
+    assert changes == [('example.com', '/', 'a', None)]
+    assert backend.changes_since(version) == (4, [])
+    assert [c.name for c in backend.cookies('example.com')] == ['c']
+    assert len(backend.cookies()) == 2
+
+
+def test_purge_keeps_versions_increasing(filename):
+    backend = SQLiteBackend(filename)
+    backend.put(create_cookie('a', '1', domain='example.com'))
+    backend.delete('example.com', '/', 'a')
+    backend.delete('example.com', '/', 'b')
+    assert backend.purge(3) == 1
+    backend.put(create_cookie('a', '2', domain='example.com'))
+    assert SQLiteBackend(filename).changes_since(3)[0] == 4
+
+
+def test_poll_interval(filename):
+    a = _manager(filename, poll_interval=3600)
+    b = _manager(filename)
+    b.set('a', '1', domain='example.com')
+    assert a.output_dict() == {}
+    assert a.refresh() == 1
+    assert a.output_dict() == {'a': '1'}
+
+
+def test_binary_file_is_written_through(filename, tmp_path):
+    m = CookiesManager()
+    m.set('a', '1', domain='example.com')
+    m.save(str(tmp_path / 'cookies.bin'), format='binary')
+    _manager(filename).load(str(tmp_path / 'cookies.bin'))
+    assert _manager(filename).output_dict() == {'a': '1'}
+
+
+def _set_cookies(filename, worker):
+    m = _manager(filename)
+    for i in range(20):
+        m.set('w%d' % worker, str(i), domain='example.com')
+
+
+def test_processes(filename):
+    _manager(filename)
+    processes = [multiprocessing.Process(target=_set_cookies,
+                                         args=(filename, i))
+                 for i in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert _manager(filename).output_dict() == {
+        'w0': '19', 'w1': '19', 'w2': '19'}
@@ -19,3 +19,88 @@ async def test_browserclient():
     assert '"k1": "v1"' in await r.text()
     assert await page.check('k2', by_selector=False)
     await client.close()
+
+
+def _tracking_page():
+    from pyee import EventEmitter
+    from aninja.browser import BrowserClient, NinjaPage
+    from aninja.cookies import CookiesManager
+
+    class FakePage:
+        def __init__(self):
+            self._client = EventEmitter()
+
+    page = NinjaPage(FakePage(), BrowserClient(CookiesManager()))
+    page.track_cookies()
+    return page
+
+
+def _request(request_id, url, redirected_from=None):
+    event = {'requestId': request_id, 'request': {'url': url}}
+    if redirected_from is not None:
+        event['redirectResponse'] = {'url': redirected_from, 'status': 302}
+    return 'Network.requestWillBeSent', event
+
+
+def _extra_info(request_id, set_cookie=None, blocked=()):
+    headers = {} if set_cookie is None else {'Set-Cookie': set_cookie}
+    return 'Network.responseReceivedExtraInfo', {
+        'requestId': request_id, 'headers': headers,
+        'blockedCookies': [{'cookieLine': line} for line in blocked]}
+
+
+def _finished(request_id):
+    return 'Network.loadingFinished', {'requestId': request_id}
+
+
+def test_ninjapage_tracks_cookies():
+    page = _tracking_page()
+    for event in [
+            _extra_info('1', 'early=1\nlate=2; Domain=example.com'),
+            _request('1', 'http://a.example.com/'),
+            _request('2', 'http://a.example.com/xhr'),
+            _extra_info('2', 'xhr=3\nblocked=4', blocked=['blocked=4']),
+            _finished('1'),
+            _finished('2')]:
+        page._client.emit(*event)
+
+    assert page.cookies_manager.output_dict() == {
+        'early': '1', 'late': '2', 'xhr': '3'}
+    assert not page._request_urls and not page._pending_set_cookies
+
+
+@pytest.mark.parametrize('redirect_headers_first', [True, False])
+def test_ninjapage_credits_redirect_cookies(redirect_headers_first):
+    page = _tracking_page()
+    events = [
+        _request('1', 'http://a.com/login'),
+        _request('1', 'http://b.com/home', redirected_from='http://a.com/login'),
+        _extra_info('1', 'sid=1'),
+        _extra_info('1'),
+        _finished('1'),
+    ]
+    if redirect_headers_first:
+        events[1], events[2] = events[2], events[1]
+    for event in events:
+        page._client.emit(*event)
+
+    m = page.cookies_manager
+    assert m.output_dict(url='http://a.com/') == {'sid': '1'}
+    assert m.output_dict(url='http://b.com/') == {}
+    assert not page._request_urls and not page._pending_set_cookies
+
+
+def test_ninjapage_headers_after_loading_finished():
+    page = _tracking_page()
+    for event in [
+            _request('1', 'http://a.com/'),
+            _finished('1'),
+            _extra_info('1', 'late=1'),
+            # headers of a request which is never reported are dropped.
+            _extra_info('2', 'lost=1'),
+            _finished('2')]:
+        page._client.emit(*event)
+
+    assert page.cookies_manager.output_dict(url='http://a.com/') == {
+        'late': '1'}
+    assert not page._request_urls and not page._pending_set_cookies
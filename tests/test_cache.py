@@ -0,0 +1,109 @@
+from aninja.cache import (CacheEntry, HTTPCache, SingleFlight, cacheable,
+                          freshness_deadline)
+from aninja.http import HTTPClient
+from multidict import CIMultiDict
+import asyncio
+import pytest
+
+
+def test_freshness():
+    now = 1000
+    assert freshness_deadline(
+        CIMultiDict({'Cache-Control': 'public, max-age=60'}), now) == 1060
+    assert freshness_deadline(
+        CIMultiDict({'Cache-Control': 'no-cache, max-age=60'}), now) is None
+    assert freshness_deadline(CIMultiDict(
+        {'Expires': 'Thu, 01 Jan 1970 00:20:00 GMT'}), now) == 1200
+
+
+class _Response:
+    def __init__(self, headers, status=200):
+        self.status = status
+        self.headers = CIMultiDict(headers)
+
+
+def test_cacheable():
+    assert cacheable(_Response({'Cache-Control': 'max-age=60'}))
+    assert cacheable(_Response({'ETag': '"v1"', 'Cache-Control': 'no-cache'}))
+    assert not cacheable(_Response({'ETag': '"v1"',
+                                    'Cache-Control': 'no-store'}))
+    # never fresh and never revalidable
+    assert not cacheable(_Response({}))
+    assert not cacheable(_Response({'Cache-Control': 'no-cache'}))
+    assert not cacheable(_Response(
+        {'Expires': 'Thu, 01 Jan 1970 00:20:00 GMT'}))
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_a_cancelled_leader():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return CacheEntry(200, 'OK', [], b'body', 'http://a/').response(), \
+            b'body'
+
+    leader = asyncio.ensure_future(flights.run('k', fetch))
+    await asyncio.sleep(0)
+    followers = [asyncio.ensure_future(flights.run('k', fetch))
+                 for _ in range(2)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    results = await asyncio.gather(leader, *followers, return_exceptions=True)
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert [r.status for r in results[1:]] == [200, 200]
+    assert len(calls) == 2
+    assert flights.coalesced == 1
+    assert not flights._flights
+
+
+def test_cache_evicts_by_bytes(tmp_path):
+    cache = HTTPCache(max_bytes=250, directory=tmp_path)
+    for i in range(3):
+        cache.put(i, CacheEntry(200, 'OK', [], b'x' * 100, 'http://a/'))
+    assert len(cache) == 2
+    assert cache.get(1) is not None
+    cache.put(3, CacheEntry(200, 'OK', [], b'x' * 100, 'http://a/'))
+    assert list(cache._entries) == [1, 3]
+    assert cache.get(0).body == b'x' * 100  # from disk
+
+    other = HTTPCache(directory=tmp_path)
+    assert other.get(3).url == 'http://a/'
+
+
+@pytest.mark.asyncio
+async def test_httpclient_cache(local_httpbin):
+    cache = HTTPCache()
+    calls = local_httpbin.stats['calls']
+    async with HTTPClient(cache=cache) as client:
+        url = local_httpbin('/cached?key=fresh&cc=max-age%3D60')
+        for _ in range(3):
+            resp = await client.get(url)
+            assert await resp.text() == 'body'
+        assert calls['cached fresh'] == 1
+
+        url = local_httpbin('/cached?key=stale')
+        for _ in range(3):
+            resp = await client.get(url)
+            assert await resp.text() == 'body'
+        assert calls['cached stale'] == 3
+    assert cache.stats()['hits'] == 2
+    assert cache.misses == 2
+    assert cache.revalidations == 2
+
+
+@pytest.mark.asyncio
+async def test_httpclient_coalesces(local_httpbin):
+    calls = local_httpbin.stats['calls']
+    async with HTTPClient(coalesce=True) as client:
+        url = local_httpbin('/cached?key=flight&delay=0.05')
+        resps = await asyncio.gather(*[client.get(url) for _ in range(5)])
+        assert [await r.text() for r in resps] == ['body'] * 5
+        assert client.single_flight.coalesced == 4
+        assert calls['cached flight'] == 1
+
+        client.cookies_manager.set('user', 'a')
+        await client.get(url)
+        assert calls['cached flight'] == 2
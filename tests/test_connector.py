@@ -0,0 +1,88 @@
+from aninja.connector import ConnectorRegistry, PooledConnector, default_registry
+from aninja.cookies import CookiesManager
+from aninja.http import HTTPClient
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_clients_share_sockets_but_not_cookies(local_httpbin):
+    connector = PooledConnector(limit_per_host=2)
+    alice = HTTPClient(CookiesManager(), pool=connector)
+    bob = HTTPClient(CookiesManager(), pool=connector)
+    try:
+        resp = await alice.get(local_httpbin('/cookies/set?who=alice'))
+        assert (await resp.json())['cookies'] == {'who': 'alice'}
+        resp = await bob.get(local_httpbin('/cookies'))
+        assert (await resp.json())['cookies'] == {}
+        assert bob.cookies_manager.output_dict() == {}
+
+        await alice.close()
+        assert not connector.closed
+        resp = await bob.get(local_httpbin('/echo?text=hi'))
+        assert await resp.text() == 'hi'
+
+        stats = connector.stats()
+        assert stats['created'] == 1
+        assert stats['reused'] == 3
+        assert stats['active'] == 0 and stats['idle'] == 1
+        assert stats['created_per_second'] == pytest.approx(1 / 60)
+    finally:
+        await bob.close()
+        await connector.close()
+
+
+@pytest.mark.asyncio
+async def test_per_host_limit(local_httpbin):
+    connector = PooledConnector(limit_per_host=2)
+    client = HTTPClient(pool=connector)
+    try:
+        async def get():
+            resp = await client.get(local_httpbin('/echo?delay=0.1'))
+            await resp.read()
+
+        await asyncio.gather(*[get() for _ in range(6)])
+        assert local_httpbin.stats['max_running'] == 2
+        assert connector.created == 2
+    finally:
+        await client.close()
+        await connector.close()
+
+
+@pytest.mark.asyncio
+async def test_max_reuse_recycles_connections(local_httpbin):
+    connector = PooledConnector(max_reuse=2)
+    client = HTTPClient(pool=connector)
+    try:
+        for _ in range(5):
+            resp = await client.get(local_httpbin('/echo'))
+            await resp.read()
+        assert connector.created == 3
+        assert connector.recycled == 2
+    finally:
+        await client.close()
+        await connector.close()
+
+
+@pytest.mark.asyncio
+async def test_registry():
+    registry = ConnectorRegistry()
+    registry.configure('crawl', limit_per_host=3, keepalive_timeout=5)
+    connector = registry.get('crawl')
+    assert registry.get('crawl') is connector
+    assert connector.limit_per_host == 3
+    assert set(registry.stats()) == {'crawl'}
+    await registry.close()
+    assert connector.closed
+    assert registry.get('crawl') is not connector
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_httpclient_uses_default_registry():
+    client = HTTPClient(pool='default')
+    try:
+        assert client.session.connector is default_registry.get()
+    finally:
+        await client.close()
+        await default_registry.close()
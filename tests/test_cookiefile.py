@@ -0,0 +1,128 @@
+from aninja.cookiefile import CookieFile, dump, is_cookie_file
+from aninja.cookies import CookiesManager, create_cookie
+import pickle
+import pytest
+
+
+def _attrs(cookie):
+    return (cookie.version, cookie.name, cookie.value, cookie.port,
+            cookie.port_specified, cookie.domain, cookie.domain_specified,
+            cookie.domain_initial_dot, cookie.path, cookie.path_specified,
+            cookie.secure, cookie.expires, cookie.discard, cookie.comment,
+            cookie.comment_url, cookie._rest, cookie.rfc2109)
+
+
+@pytest.fixture
+def manager():
+    m = CookiesManager()
+    m.set('sid', 'abc', domain='.example.com', rest={'HttpOnly': None,
+                                                     'SameSite': 'Lax'})
+    m.set('lang', 'fr', domain='www.example.com', path='/docs', secure=True,
+          expires=2000000000)
+    m.set('token', 'ü€', domain='api.other.org', port='443',
+          comment='c', comment_url='http://other.org/c', rfc2109=True)
+    m.set('anywhere', '1', domain='')
+    return m
+
+
+def test_round_trip(manager, tmp_path):
+    filename = str(tmp_path / 'cookies.bin')
+    dump(manager.output_cookiejar(), filename)
+    assert is_cookie_file(filename)
+
+    cookie_file = CookieFile(filename)
+    assert cookie_file.n_cookies == 4
+    assert [(d, n) for d, _, n in cookie_file.domains()] == [
+        ('', 1), ('.example.com', 1), ('api.other.org', 1),
+        ('www.example.com', 1)]
+    loaded = sorted(cookie_file.read(0, 4), key=lambda c: c.name)
+    expected = sorted(manager.output_cookiejar(), key=lambda c: c.name)
+    assert [_attrs(c) for c in loaded] == [_attrs(c) for c in expected]
+    assert loaded[-1].has_nonstandard_attr('HttpOnly')
+    cookie_file.release(4)
+    assert cookie_file.closed
+
+
+def test_round_trip_harvested_cookies(tmp_path):
+    m = CookiesManager()
+    m.update_from_headers(['sid=abc; Comment=hi; Domain=example.com; Secure',
+                           'lang=fr; Max-Age=3600; HttpOnly'],
+                          'https://www.example.com/docs/')
+    filename = str(tmp_path / 'cookies.bin')
+    m.save(filename, format='binary')
+
+    restored = CookiesManager()
+    restored.load(filename)
+    loaded = sorted(restored.output_cookiejar(), key=lambda c: c.name)
+    expected = sorted(m.output_cookiejar(), key=lambda c: c.name)
+    assert [_attrs(c) for c in loaded] == [_attrs(c) for c in expected]
+    assert loaded[1].comment == 'hi'
+
+
+def test_lazy_load(manager, tmp_path):
+    filename = str(tmp_path / 'cookies.bin')
+    manager.save(filename, format='binary')
+
+    m = CookiesManager()
+    m.load(filename)
+    jar = m.output_cookiejar()
+    assert len(m) == 4
+    assert m.domains() == {'': 1, '.example.com': 1, 'www.example.com': 1,
+                           'api.other.org': 1}
+    assert set(jar._pending) == {'', 'example.com', 'other.org'}
+
+    assert m.output_header_string(url='https://www.example.com/docs') == \
+        'anywhere=1; sid=abc; lang=fr'
+    assert set(jar._pending) == {'other.org'}
+    assert m.output_dict(domain='api.other.org') == {'token': 'ü€'}
+    assert not jar._pending
+    assert len(m) == 4
+
+
+def test_set_after_load_overrides_file(manager, tmp_path):
+    filename = str(tmp_path / 'cookies.bin')
+    manager.save(filename, format='binary')
+    m = CookiesManager()
+    m.set('sid', 'older', domain='.example.com')
+    m.load(filename)
+    assert m.output_dict(domain='.example.com') == {'sid': 'abc'}
+
+    m.set_cookie(create_cookie('token', 'newer', domain='api.other.org'))
+    assert m.output_dict(domain='api.other.org') == {'token': 'newer'}
+    m.update_from_headers(['lang=; Max-Age=0; Path=/docs'],
+                          'https://www.example.com/docs')
+    assert 'lang' not in m.output_dict()
+
+
+def test_lwp_still_works_and_is_detected(manager, tmp_path):
+    filename = str(tmp_path / 'cookies.txt')
+    manager.save(filename)
+    assert not is_cookie_file(filename)
+    m = CookiesManager()
+    m.load(filename)
+    assert m.output_dict() == manager.output_dict()
+    with pytest.raises(ValueError):
+        m.save(filename, format='xml')
+
+
+def test_pickle_reads_pending_cookies(manager, tmp_path):
+    filename = str(tmp_path / 'cookies.bin')
+    manager.save(filename, format='binary')
+    m = CookiesManager()
+    m.load(filename)
+    jar = pickle.loads(pickle.dumps(m.output_cookiejar()))
+    assert len(jar) == 4
+    assert len(list(jar.index.match('https://www.example.com/docs'))) == 3
+
+
+def test_empty_and_invalid_files(tmp_path):
+    empty = str(tmp_path / 'empty.bin')
+    dump([], empty)
+    m = CookiesManager()
+    m.load(empty)
+    assert len(m) == 0
+
+    invalid = tmp_path / 'invalid.bin'
+    invalid.write_bytes(b'NJCK')
+    with pytest.raises(ValueError):
+        CookieFile(str(invalid))
@@ -0,0 +1,76 @@
+from aninja.cookierecord import CookieRecord, shared_rest
+from aninja.cookies import CookiesManager, create_cookie
+from http.cookiejar import Cookie
+from requests.cookies import create_cookie as requests_create_cookie
+import copy
+import pickle
+import pytest
+
+ATTRS = ('version', 'name', 'value', 'port', 'port_specified', 'domain',
+         'domain_specified', 'domain_initial_dot', 'path', 'path_specified',
+         'secure', 'expires', 'discard', 'comment', 'comment_url', 'rfc2109',
+         '_rest')
+
+
+def _attrs(cookie):
+    return tuple(getattr(cookie, a) for a in ATTRS)
+
+
+def test_same_as_a_cookie():
+    cookie = requests_create_cookie(
+        'sid', 'abc', domain='.example.com', path='/docs', secure=True,
+        expires=2000000000.5, port='443', comment='c', rest={'SameSite': 'Lax'})
+    record = CookieRecord.from_cookie(cookie)
+    assert _attrs(record) == _attrs(cookie)
+    assert _attrs(record.to_cookie()) == _attrs(cookie)
+    assert isinstance(record.to_cookie(), Cookie)
+    assert str(record) == str(cookie)
+    assert repr(record).startswith('CookieRecord(version=0, name=')
+    assert record.get_nonstandard_attr('SameSite') == 'Lax'
+    assert not record.has_nonstandard_attr('HttpOnly')
+    assert record.is_expired(2000000001) and not record.is_expired(0)
+    with pytest.raises(AttributeError):
+        record.other = 1
+
+
+def test_compact_and_shared():
+    a = create_cookie('sid', 'a', domain=''.join(['example', '.com']))
+    b = create_cookie(''.join(['s', 'id']), 'b', domain='example.com')
+    assert a.domain is b.domain and a.name is b.name and a.path is b.path
+    assert a._rest is b._rest == {'HttpOnly': None}
+    assert shared_rest({}) is shared_rest(None)
+
+    b.set_nonstandard_attr('SameSite', 'Lax')
+    assert a._rest == {'HttpOnly': None}
+    assert b._rest == {'HttpOnly': None, 'SameSite': 'Lax'}
+
+    b.secure = True
+    b.domain_specified = False
+    assert (a.secure, b.secure, b.domain_specified) == (False, True, False)
+    c = copy.copy(b)
+    c.secure = False
+    assert b.secure and not c.secure
+    assert _attrs(pickle.loads(pickle.dumps(b))) == _attrs(b)
+
+
+def test_create_cookie():
+    record = create_cookie('a', '1', domain='.example.com', port='80')
+    assert (record.domain_specified, record.domain_initial_dot,
+            record.port_specified, record.path_specified) == (
+                True, True, True, True)
+    assert create_cookie('a', '1', rest={})._rest == {}
+    with pytest.raises(TypeError):
+        create_cookie('a', '1', bad=True)
+
+
+def test_jar_stores_records():
+    m = CookiesManager()
+    m.set_cookie(requests_create_cookie('a', '1', domain='example.com'))
+    m.set('b', '2', domain='example.com')
+    m.update({'c': '3'})
+    jar = m.output_cookiejar()
+    assert {type(c) for c in jar} == {CookieRecord}
+    assert next(c for c in jar if c.name == 'b').discard
+
+    m.set('b', None, domain='example.com')
+    assert jar.get_dict() == {'a': '1', 'c': '3'}
@@ -1,11 +1,14 @@
 from aninja.cookies import CookiesManager
+from aninja import cookies as cookies_module
 from http import cookies
 from pyppeteer import launch
 from pathlib import Path
 import requests
 import asyncio
 import aiohttp
+import json
 import pytest
+import time
 
 
 def httpbin(interface=''):
@@ -83,3 +86,365 @@ async def test_work_with_pyppeteer():
     cookies = await page.cookies()
     await b.close()
     assert len(cookies) == 4
+
+
+def test_update_from_simplecookie_with_url():
+    m = CookiesManager()
+    c = cookies.SimpleCookie()
+    c.load('a=1; b=2; Domain=.example.com; Path=/x; c=3; Domain=other.org')
+    m.update_from_simplecookie(c, url='http://www.example.com/dir/page')
+    assert sorted(m.output_detailed(), key=lambda d: d['name']) == [
+        {'name': 'a', 'value': '1', 'domain': 'www.example.com',
+         'path': '/dir'},
+        {'name': 'b', 'value': '2', 'domain': 'example.com', 'path': '/x'},
+    ]
+
+    c = cookies.SimpleCookie()
+    c.load('a=; Max-Age=0')
+    m.update_from_simplecookie(c, url='http://www.example.com/dir/page')
+    assert m.output_dict() == {'b': '2'}
+
+
+def test_host_only_cookies(tmp_path):
+    m = CookiesManager()
+    m.update_from_headers(['host=1', 'wide=2; Domain=example.com'],
+                          'http://example.com/')
+    assert m.output_dict(url='http://example.com/') == {
+        'host': '1', 'wide': '2'}
+    assert m.output_dict(url='http://sub.example.com/') == {'wide': '2'}
+    host, = [c for c in m.output_cookiejar() if c.name == 'host']
+    assert cookies_module.cookie_to_pyppeteer(host) == {
+        'name': 'host', 'value': '1', 'path': '/',
+        'url': 'http://example.com/'}
+
+    for format in ('lwp', 'binary'):
+        filename = str(tmp_path / ('cookies.' + format))
+        m.save(filename, format=format)
+        loaded = CookiesManager()
+        loaded.load(filename)
+        assert loaded.output_dict(url='http://sub.example.com/') == {
+            'wide': '2'}
+        assert [c._rest for c in loaded.output_cookiejar()] == [
+            c._rest for c in m.output_cookiejar()]
+
+
+def test_url_queries():
+    m = CookiesManager()
+    m.set('any', '0')
+    m.set('root', '1', domain='.example.com')
+    m.set('www', '2', domain='www.example.com', path='/docs')
+    m.set('api', '3', domain='api.example.com')
+    m.set('safe', '4', domain='example.com', secure=True)
+    m.set('other', '5', domain='example.org')
+
+    assert m.output_dict(url='http://www.example.com/docs/a') == {
+        'any': '0', 'root': '1', 'www': '2'}
+    assert m.output_dict(url='https://www.example.com/documents') == {
+        'any': '0', 'root': '1', 'safe': '4'}
+    assert m.output_dict(domain='www.example.com') == {'www': '2'}
+    assert m.output_dict(domain='www.example.com', path='/') == {}
+
+    m._jar.clear('www.example.com')
+    assert [c.name for c in m.cookies_for_url('http://www.example.com/docs')
+            ] == ['any', 'root']
+
+
+def test_output_cache():
+    m = CookiesManager(output_cache_size=2)
+    m.set('a', '1', domain='a.com')
+    m.set('b', '2', domain='b.com')
+    assert m.output_header_string('a.com') == 'a=1'
+    assert m.output_header_string('b.com') == 'b=2'
+    assert m.output_json('a.com') == \
+        '[{"name": "a", "value": "1", "domain": "a.com", "path": "/"}]'
+    assert len(m._output_cache) == 2
+
+    m.set('b', '3', domain='b.com')
+    assert len(m._output_cache) == 1
+    assert m.output_header_string('b.com') == 'b=3'
+    assert m.output_header_string('a.com') == 'a=1'
+
+    expires = int(time.time()) + 100
+    m.set('c', '4', domain='a.com', expires=expires)
+    assert m.output_header_string(url='http://a.com/') == 'a=1; c=4'
+    key = ('header', None, None, 'http://a.com/')
+    assert m._output_cache._entries[key][2] == expires
+
+
+class _FakeSession:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, params):
+        self.sent.append((method, params))
+
+
+class _FakeContext:
+    pass
+
+
+class _FakeTarget:
+    def __init__(self):
+        self.browserContext = _FakeContext()
+
+
+class _FakePage:
+    url = 'about:blank'
+
+    def __init__(self, target=None):
+        self._client = _FakeSession()
+        if target is not None:
+            self.target = target
+
+
+@pytest.mark.asyncio
+async def test_sync_to_pyppeteer_in_batches():
+    m = CookiesManager()
+    m.set('any', '0')
+    for i in range(5):
+        m.set('c%d' % i, str(i), domain='example.com')
+    m.set('other', 'x', domain='example.org', secure=True)
+
+    page = _FakePage()
+    await m.sync_to_pyppeteer(page, batch_size=4)
+    assert [method for method, _ in page._client.sent] == [
+        'Network.setCookies'] * 2
+    assert sum(len(p['cookies']) for _, p in page._client.sent) == 6
+
+    page = _FakePage()
+    await m.sync_to_pyppeteer(page, url='http://www.example.com/')
+    (_, params), = page._client.sent
+    assert params['cookies'][0] == {
+        'name': 'any', 'value': '0', 'path': '/',
+        'url': 'http://www.example.com/'}
+    assert [c['name'] for c in params['cookies']] == [
+        'any', 'c0', 'c1', 'c2', 'c3', 'c4']
+
+
+def test_update_from_headers():
+    m = CookiesManager()
+    m.update_from_headers(
+        ['a=1; Path=/; HttpOnly', 'b=2; Domain=example.com', 'bad=",'],
+        'https://www.example.com/login')
+    assert m.output_dict(url='https://www.example.com/') == {'a': '1', 'b': '2'}
+
+
+@pytest.mark.asyncio
+async def test_delta_sync_to_pyppeteer():
+    m = CookiesManager()
+    for i in range(3):
+        m.set('c%d' % i, str(i), domain='example.com')
+    page = _FakePage()
+    await m.sync_to_pyppeteer(page)
+    assert m.synced_version(page) == m.version == 3
+
+    page._client.sent.clear()
+    m.set('c1', 'new', domain='example.com')
+    m._remove('example.com', '/', 'c2')
+    await m.sync_to_pyppeteer(page)
+    assert page._client.sent == [
+        ('Network.deleteCookies',
+         {'name': 'c2', 'domain': 'example.com', 'path': '/'}),
+        ('Network.setCookies', {'cookies': [
+            {'name': 'c1', 'value': 'new', 'domain': 'example.com',
+             'path': '/'}]})]
+
+    page._client.sent.clear()
+    await m.sync_to_pyppeteer(page)
+    assert page._client.sent == []
+    await m.sync_to_pyppeteer(page, full=True)
+    (_, params), = page._client.sent
+    assert len(params['cookies']) == 2
+
+    # cookies without a domain were set for the page's url.
+    m.set('any', '1')
+    await m.sync_to_pyppeteer(page)
+    m._remove('', '/', 'any')
+    page.url = 'http://example.com/a'
+    page._client.sent.clear()
+    await m.sync_to_pyppeteer(page)
+    assert page._client.sent == [
+        ('Network.deleteCookies',
+         {'name': 'any', 'path': '/', 'url': 'http://example.com/a'})]
+
+
+@pytest.mark.asyncio
+async def test_pages_of_a_context_share_their_cookies():
+    m = CookiesManager()
+    m.set('a', '1', domain='example.com')
+    target = _FakeTarget()
+    first, second = _FakePage(target), _FakePage(target)
+    await m.sync_to_pyppeteer(first)
+    await m.sync_to_pyppeteer(second)
+    assert len(first._client.sent) == 1 and not second._client.sent
+    assert m.synced_version(second) == m.version
+
+    # e.g. the page pool cleared the context's cookies through one page.
+    m.detach(first)
+    assert m.synced_version(second) is None
+    await m.sync_to_pyppeteer(second)
+    (_, params), = second._client.sent
+    assert [c['name'] for c in params['cookies']] == ['a']
+
+
+def test_delta_sync_to_cookiejar():
+    m = CookiesManager()
+    m.set('a', '1', domain='example.com')
+    m.set('b', '1', domain='example.com')
+    jar = requests.cookies.RequestsCookieJar()
+    m.sync_to_cookiejar(jar)
+    assert jar.get_dict() == {'a': '1', 'b': '1'}
+
+    jar.set('own', 'x', domain='example.com', path='/')
+    m.set('a', '2', domain='example.com')
+    m._remove('example.com', '/', 'b')
+    m.sync_to_cookiejar(jar)
+    assert jar.get_dict() == {'a': '2', 'own': 'x'}
+    # changes every client has are forgotten.
+    assert not m._changes
+
+    m.detach(jar)
+    jar.clear()
+    m.sync_to_cookiejar(jar)
+    assert jar.get_dict() == {'a': '2'}
+
+
+@pytest.mark.asyncio
+async def test_delta_sync_to_aiohttp_session():
+    m = CookiesManager()
+    m.set('a', '1', domain='example.com')
+    m.set('b', '1', domain='.example.com', path='/docs')
+    async with aiohttp.ClientSession() as session:
+        m.sync_to_aiohttp_session(session)
+        # removals don't go through the whole jar.
+        session.cookie_jar.clear = None
+        m._remove('.example.com', '/docs', 'b')
+        m.set('c', '1', domain='example.org')
+        m.sync_to_aiohttp_session(session)
+        assert sorted((c['domain'], c.key) for c in session.cookie_jar) == [
+            ('example.com', 'a'), ('example.org', 'c')]
+
+
+def test_forgotten_changes_mean_a_full_sync(tmp_path):
+    m = CookiesManager()
+    m.max_changes = 2
+    jar = requests.cookies.RequestsCookieJar()
+    m.sync_to_cookiejar(jar)
+    for name in 'abc':
+        m.set(name, '1', domain='example.com')
+    assert m.changes_since(0) is None
+    assert [c[2] for c in m.changes_since(1)] == ['b', 'c']
+    m.sync_to_cookiejar(jar)
+    assert sorted(jar.get_dict()) == ['a', 'b', 'c']
+
+    filename = str(tmp_path / 'cookies.bin')
+    m.save(filename, format='binary')
+    other = CookiesManager()
+    other.sync_to_cookiejar(jar)
+    other.load(filename)
+    assert other.synced_version(jar) == -1
+    jar.clear()
+    other.sync_to_cookiejar(jar)
+    assert sorted(jar.get_dict()) == ['a', 'b', 'c']
+
+
+def test_copy_shares_cookies():
+    m = CookiesManager()
+    m.set('a', '1', domain='example.com')
+    m.set('b', '1', domain='www.example.com', path='/docs')
+    c = m.copy()
+    assert c.output_cookiejar().get('a') == '1'
+    assert c.output_dict(url='http://www.example.com/docs') == {
+        'a': '1', 'b': '1'}
+    c.set('a', '2', domain='example.com')
+    c.never_expires()
+    assert m.output_dict() == {'a': '1', 'b': '1'}
+    assert all(x.expires is None for x in m.output_cookiejar())
+    assert len(c) == 2
+
+
+def test_copy_keeps_the_expiry_heap():
+    m = CookiesManager()
+    m.set('a', '1', domain='example.com', expires=2000000000)
+    c = m.copy()
+    c.set('b', '1', domain='example.com', expires=2000000000)
+    c.set('a', '2', domain='example.com', expires=2000000000)
+    assert c.output_cookiejar().evict(2000000000) == 2
+    assert len(c) == 0 and len(m) == 1
+
+
+def test_expired_cookies_are_evicted():
+    m = CookiesManager()
+    now = time.time()
+    m.set('old', '1', domain='example.com', expires=int(now) - 10)
+    m.set('soon', '1', domain='example.com', expires=int(now) + 3600)
+    m.set('session', '1', domain='example.com')
+    # a replaced cookie leaves a stale entry in the heap.
+    m.set('soon', '2', domain='example.com', expires=int(now) + 7200)
+    assert len(m) == 3
+    assert m.output_dict(domain='example.com') == {'soon': '2', 'session': '1'}
+    assert len(m) == 2
+
+    jar = m.output_cookiejar()
+    assert jar.evict(now + 5000) == 0
+    assert jar.evict(now + 8000) == 1
+    assert [c.name for c in jar] == ['session']
+    assert not jar._expiry
+
+
+def test_never_expires_is_a_policy(tmp_path):
+    m = CookiesManager()
+    expired = int(time.time()) - 10
+    m.set('old', '1', domain='example.com', expires=expired)
+    m.never_expires()
+    assert m.output_dict(url='http://example.com/') == {'old': '1'}
+    assert m.output_cookiejar().get('old') == '1'
+    jar = requests.cookies.RequestsCookieJar()
+    m.sync_to_cookiejar(jar)
+    assert next(iter(jar)).expires > time.time() + 365 * 24 * 3600
+    assert next(iter(m.output_cookiejar())).expires == expired
+    assert m.output_detailed()[0]['expires'] > time.time() + 365 * 24 * 3600
+    assert json.loads(m.output_json()) == m.output_detailed()
+
+    # the policy isn't saved, the expiry it gives is.
+    for format in ('lwp', 'binary'):
+        filename = str(tmp_path / ('cookies.' + format))
+        m.save(filename, format=format)
+        loaded = CookiesManager()
+        loaded.load(filename)
+        assert loaded.output_dict(url='http://example.com/') == {'old': '1'}
+
+    m.never_expires(False)
+    assert m.output_dict() == {}
+
+
+def test_limits_evict_least_recently_used():
+    m = CookiesManager(max_per_domain=2)
+    m.set('a', '1', domain='example.com')
+    m.set('b', '1', domain='www.example.com')
+    m.set('x', '1', domain='other.org')
+    m.cookies_for_url('http://example.com/')
+    m.set('c', '1', domain='example.com')
+    assert sorted(m.domains().items()) == [
+        ('example.com', 2), ('other.org', 1)]
+    assert m.output_dict(domain='example.com') == {'a': '1', 'c': '1'}
+
+    cookies = list(m.output_cookiejar())
+    budget = sum(map(cookies_module._estimated_size, cookies))
+    m.output_cookiejar().set_limits(max_bytes=budget - 1)
+    assert sorted(c.name for c in m.output_cookiejar()) == ['a', 'c']
+    assert m.output_cookiejar().size <= budget - 1
+
+    m.output_cookiejar().set_limits()
+    for i in range(5):
+        m.set('n%d' % i, '1', domain='example.com')
+    assert len(m) == 7
+
+
+def test_stale_expiry_entries_are_compacted():
+    m = CookiesManager()
+    for i in range(3000):
+        m.set('a', str(i), domain='example.com', expires=2000000000 + i)
+    jar = m.output_cookiejar()
+    assert len(jar._expiry) < 2100
+    assert jar.evict(2000000000 + 3000) == 1
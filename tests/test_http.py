@@ -1,4 +1,5 @@
-from aninja.http import HTTPClient
+from aninja.http import HTTPClient, Request
+import asyncio
 import pytest
 
 
@@ -16,3 +17,64 @@ async def test_httpclient():
         assert client.cookies_manager.output_header_string() == 'k1=v1; k2=v2'
         assert '"k1": "v1"' in await resp.text()
         assert await client.check('k2', url=httpbin('/cookies/set?k1=v1&k2=v2'))
+
+
+@pytest.mark.asyncio
+async def test_httpclient_harvests_response_cookies(local_httpbin):
+    async with HTTPClient() as client:
+        client.cookies_manager.update({'kept': 'v0'})
+        resp = await client.get(local_httpbin('/cookies/set?k1=v1&k2=v2'))
+        assert (await resp.json())['cookies'] == {'k1': 'v1', 'k2': 'v2'}
+        assert client.cookies_manager.output_dict() == {
+            'kept': 'v0', 'k1': 'v1', 'k2': 'v2'}
+        assert {c['domain'] for c in client.cookies_manager.output_detailed()
+                if c['name'] == 'k1'} == {'localhost'}
+
+        await client.get(local_httpbin('/cookies/delete?k1='))
+        assert client.cookies_manager.output_dict() == {
+            'kept': 'v0', 'k2': 'v2'}
+
+
+@pytest.mark.asyncio
+async def test_send_many(local_httpbin):
+    taken = []
+
+    def requests():
+        for i in range(10):
+            taken.append(i)
+            yield Request(local_httpbin(
+                '/echo?text=%d&delay=%f&status=%d'
+                % (i, 0.02 * (5 - i % 5), 500 if i == 3 else 200)))
+        yield Request('http://localhost:1/refused')
+
+    async with HTTPClient() as client:
+        results = []
+        async for request, resp in client.send_many(requests(), limit=3,
+                                                    ordered=True):
+            assert len(taken) <= len(results) + 3
+            if isinstance(resp, Exception):
+                results.append('error')
+            else:
+                results.append(await resp.text() if resp.status == 200
+                               else resp.status)
+    assert results == ['0', '1', '2', 500, '4', '5', '6', '7', '8', '9',
+                       'error']
+    assert local_httpbin.stats['max_running'] == 3
+
+    local_httpbin.stats['max_running'] = 0
+    async with HTTPClient() as client:
+        results = [await resp.text() async for _, resp in client.send_many(
+            [Request(local_httpbin('/echo?text=%d&delay=0.05' % i))
+             for i in range(2)], limit=2, limit_per_host=1)]
+    assert local_httpbin.stats['max_running'] == 1
+    assert results == ['0', '1']
+
+
+@pytest.mark.asyncio
+async def test_search_streams(local_httpbin):
+    async with HTTPClient() as client:
+        url = local_httpbin('/stream?size=1000000&chunk=4096&marker=flag&at=8190')
+        assert await client.check('flag', url)
+        assert await client.search(['nothing', 'flag'], url) == 'flag'
+        assert await client.search(['flag'], url, limit=4096) is None
+        assert not await client.check('nothing', url)
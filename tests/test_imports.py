@@ -0,0 +1,32 @@
+import aninja.browser
+import subprocess
+import sys
+import pytest
+
+HEAVY = ('pyppeteer', 'PIL', 'dateparser', 'websockets', 'http.server')
+
+
+@pytest.mark.parametrize('module', ['aninja.utils', 'aninja.cookies',
+                                    'aninja.http', 'aninja.browser',
+                                    'aninja.launcher', 'aninja.metrics'])
+def test_heavy_dependencies_are_lazy(module):
+    code = 'import sys, %s; print(",".join(m for m in %r if m in sys.modules))'
+    out = subprocess.run([sys.executable, '-c', code % (module, HEAVY)],
+                         check=True, capture_output=True, text=True).stdout
+    assert out.strip() == ''
+
+
+def test_ninjapage_is_loaded_on_demand():
+    from aninja.page import NinjaPage
+    assert aninja.browser.NinjaPage is NinjaPage
+    with pytest.raises(AttributeError):
+        aninja.browser.Missing
+
+
+def test_pyppeteer_is_patched_once():
+    aninja.browser.patch_pyppeteer()
+    import websockets.client
+    patched = websockets.client.connect
+    aninja.browser.patch_pyppeteer()
+    assert websockets.client.connect is patched
+    assert aninja.browser._pyppeteer_patched
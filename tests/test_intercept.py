@@ -0,0 +1,83 @@
+from aninja.intercept import (BLOCK, CONTINUE, STUB, InterceptionProfile,
+                              StubCache, apply_profile)
+from pyee import EventEmitter
+import asyncio
+import pytest
+
+
+def test_profile_decides():
+    profile = InterceptionProfile(
+        block_patterns=['*/analytics.js'],
+        block_domains=['ads.example.net'],
+        stubs={'*://cdn.example.com/app.js': {'status': 200, 'body': '1'}})
+    assert profile.decide('http://a.com/x.png', 'image') == (BLOCK, None)
+    assert profile.decide('http://a.com/x.png', 'image', visual=True) == (
+        CONTINUE, None)
+    assert profile.decide('http://a.com/analytics.js', 'script')[0] == BLOCK
+    assert profile.decide('http://x.ads.example.net/', 'xhr')[0] == BLOCK
+    assert profile.decide('http://example.net/', 'xhr')[0] == CONTINUE
+    assert profile.decide('https://cdn.example.com/app.js', 'script') == (
+        STUB, {'status': 200, 'body': '1'})
+
+
+def test_profile_serves_cache(tmp_path):
+    cache = StubCache(tmp_path)
+    cache.store('http://a.com/logo.png', b'png', 'image/png')
+    profile = InterceptionProfile(cache=tmp_path)
+    assert profile.decide('http://a.com/logo.png', 'image') == (
+        STUB, {'status': 200, 'contentType': 'image/png', 'body': b'png'})
+    assert profile.decide('http://a.com/other.png', 'image')[0] == BLOCK
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resourceType = resource_type
+        self.result = None
+
+    async def abort(self, error):
+        self.result = 'abort'
+
+    async def respond(self, response):
+        self.result = 'respond'
+
+    async def continue_(self):
+        self.result = 'continue'
+
+
+class FakeResponse:
+    def __init__(self, request, length):
+        self.request = request
+        self.headers = {'content-length': str(length)}
+
+
+class FakePage(EventEmitter):
+    visual_fidelity = False
+
+    async def setRequestInterception(self, value):
+        self.intercepting = value
+
+
+@pytest.mark.asyncio
+async def test_apply_profile():
+    page = FakePage()
+    await apply_profile(page, InterceptionProfile(
+        stubs={'*/stub.js': {'body': b'12345'}}))
+    assert page.intercepting
+
+    seen = FakeRequest('http://a.com/seen.png', 'image')
+    page.visual_fidelity = True
+    page.emit('request', seen)
+    page.emit('response', FakeResponse(seen, 1000))
+    page.visual_fidelity = False
+    requests = [FakeRequest('http://a.com/1.png', 'image'),
+                FakeRequest('http://a.com/stub.js', 'script'),
+                FakeRequest('http://a.com/', 'document')]
+    for request in requests:
+        page.emit('request', request)
+    await asyncio.sleep(0)
+    assert [r.result for r in [seen] + requests] == [
+        'continue', 'abort', 'respond', 'continue']
+    assert page.interception_stats.as_dict() == {
+        'requests': 4, 'blocked': 1, 'stubbed': 1, 'bytes_saved': 1005}
+    assert page.interception_stats.blocked_visual()
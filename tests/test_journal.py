@@ -0,0 +1,149 @@
+from aninja.cookies import CookiesManager
+import os
+import pytest
+
+
+def _files(directory):
+    return sorted(os.listdir(directory))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'cookies')
+
+
+def test_changes_survive_a_restart(directory):
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60)
+    m.set('sid', 'abc', domain='.example.com', rest={'HttpOnly': None})
+    m.set('lang', 'fr', domain='www.example.com', path='/docs',
+          expires=2000000000)
+    m.set('gone', '1', domain='www.example.com')
+    m.set('sid', 'def', domain='.example.com')
+    m.update_from_headers(['gone=; Max-Age=0'], 'http://www.example.com/')
+    assert journal.flush(timeout=5)
+    assert journal.batches == 1
+    assert journal.entries == 5
+
+    # as if the process had been killed: nothing more is written.
+    restored = CookiesManager()
+    restored.persist(directory).close()
+    assert restored.output_dict() == {'sid': 'def', 'lang': 'fr'}
+    assert restored.output_detailed() == m.output_detailed()
+    journal.close()
+
+
+def test_close_writes_pending_changes(directory):
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60)
+    m.set('a', '1', domain='example.com')
+    journal.close()
+    assert journal.entries == 1
+    m.set('b', '2', domain='example.com')  # not recorded anymore
+
+    restored = CookiesManager()
+    restored.persist(directory).close()
+    assert restored.output_dict() == {'a': '1'}
+
+
+def test_evictions_are_not_recorded(directory):
+    m = CookiesManager(max_per_domain=1)
+    journal = m.persist(directory, interval=60)
+    m.set('a', '1', domain='example.com')
+    m.set('b', '2', domain='example.com')
+    journal.close()
+    assert journal.entries == 2
+    assert m.output_dict() == {'b': '2'}
+
+
+def test_torn_tail_is_ignored(directory):
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60)
+    m.set('a', '1', domain='example.com')
+    journal.close()
+    with open(os.path.join(directory, 'journal-00000001.log'), 'ab') as f:
+        f.write(b'["s",0,"b"')
+
+    restored = CookiesManager()
+    restored.persist(directory).close()
+    assert restored.output_dict() == {'a': '1'}
+
+
+def test_compaction(directory):
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60, compact_min=10)
+    for i in range(30):
+        m.set('c', str(i), domain='example.com')
+    m.set('other', '1', domain='other.org')
+    journal.flush(timeout=5)
+    assert journal.compactions == 1
+    assert journal.generation == 2
+    assert journal.entries == 0
+    assert _files(directory) == ['journal-00000002.log',
+                                 'snapshot-00000002.njck']
+
+    m.set('c', 'last', domain='example.com')
+    m._remove('other.org', '/', 'other')
+    journal.close()
+    restored = CookiesManager()
+    restored.persist(directory).close()
+    assert restored.output_dict() == {'c': 'last'}
+
+    journal = m.persist(directory)
+    assert journal.compact(timeout=5)
+    journal.close()
+    assert _files(directory) == ['journal-00000003.log',
+                                 'snapshot-00000003.njck']
+
+
+def test_crash_during_compaction(directory):
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60)
+    m.set('a', '1', domain='example.com')
+    m.set('b', '1', domain='example.com')
+    journal.close()
+    # the next journal was started but the snapshot wasn't written.
+    open(os.path.join(directory, 'journal-00000002.log'), 'wb').close()
+
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60)
+    assert m.output_dict() == {'a': '1', 'b': '1'}
+    assert journal.generation == 2
+    m.set('b', '2', domain='example.com')
+    journal.close()
+    assert _files(directory) == ['journal-00000001.log',
+                                 'journal-00000002.log']
+
+    restored = CookiesManager()
+    restored.persist(directory).close()
+    assert restored.output_dict() == {'a': '1', 'b': '2'}
+
+
+def test_failed_compaction(directory, monkeypatch):
+    m = CookiesManager()
+    journal = m.persist(directory, interval=60)
+    m.set('a', '1', domain='example.com', rfc2109=True)
+
+    def fail(cookies, filename):
+        raise OSError('disk full')
+
+    monkeypatch.setattr('aninja.journal.dump', fail)
+    assert not journal.compact(timeout=5)
+    assert not journal.compact(timeout=5)
+    assert (journal.compactions, journal.failures) == (0, 2)
+    assert journal.generation == 1
+    assert _files(directory) == ['journal-00000001.log']
+
+    monkeypatch.undo()
+    m.set('b', '1', domain='example.com')
+    assert journal.flush(timeout=5)
+    assert journal.compact(timeout=5)
+    journal.close()
+    assert _files(directory) == ['journal-00000002.log',
+                                 'snapshot-00000002.njck']
+    restored = CookiesManager()
+    restored.persist(directory).close()
+    assert restored.output_dict() == {'a': '1', 'b': '1'}
+    assert restored.output_detailed() == m.output_detailed()
+    assert [c.rfc2109 for c in restored.output_cookiejar()
+            if c.name == 'a'] == [True]
@@ -0,0 +1,106 @@
+from aninja.launcher import BrowserManager
+from pyee import EventEmitter
+import asyncio
+import pytest
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    async def newPage(self):
+        raise NotImplementedError
+
+
+class FakeBrowser(EventEmitter):
+    def __init__(self):
+        super().__init__()
+        self.contexts = []
+        self.closed = False
+
+    async def createIncognitoBrowserContext(self):
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeLauncher:
+    def __init__(self):
+        self.browsers = []
+
+    async def __call__(self, options=None, **kwargs):
+        browser = FakeBrowser()
+        self.browsers.append(browser)
+        return browser
+
+
+@pytest.mark.asyncio
+async def test_manager_shares_browsers():
+    launcher = FakeLauncher()
+    manager = BrowserManager(size=2, launcher=launcher)
+    clients = [await manager.client() for _ in range(5)]
+    assert len(launcher.browsers) == 2
+    assert sorted(len(b.contexts) for b in launcher.browsers) == [2, 3]
+    assert len({id(c.context) for c in clients}) == 5
+
+    await clients[0].close()
+    assert clients[0].context.closed
+    assert not clients[0].browser.closed
+    await manager.close()
+    assert all(b.closed for b in launcher.browsers)
+
+
+@pytest.mark.asyncio
+async def test_manager_recycles_browsers():
+    launcher = FakeLauncher()
+    manager = BrowserManager(size=1, max_pages=2, launcher=launcher)
+    old = await manager.client()
+    manager._page_created(old)
+    manager._page_created(old)
+    new = await manager.client()
+    assert new.browser is not old.browser
+    assert manager.recycles == 1
+
+    await old.close()
+    assert old.browser.closed
+    assert manager.browsers() == [new.browser]
+
+
+@pytest.mark.asyncio
+async def test_manager_closes_old_retired_browsers():
+    launcher = FakeLauncher()
+    manager = BrowserManager(size=1, max_pages=1, max_retired_age=0.01,
+                             launcher=launcher)
+    client = await manager.client()
+    old = client.browser
+    manager._page_created(client)
+    await asyncio.sleep(0.05)
+    assert old.closed
+    assert client.browser is not old
+    assert client.context.browser is client.browser
+    assert manager.browsers() == [client.browser]
+
+    await client.close()
+    assert not client.browser.closed
+
+
+@pytest.mark.asyncio
+async def test_manager_restarts_crashed_browsers():
+    launcher = FakeLauncher()
+    manager = BrowserManager(size=1, launcher=launcher)
+    client = await manager.client()
+    crashed = client.browser
+    crashed.emit('disconnected')
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert manager.restarts == 1
+    assert client.browser is not crashed
+    assert client.context.browser is client.browser
+    assert manager.browsers() == [client.browser]
@@ -0,0 +1,118 @@
+from aninja import metrics
+from aninja.cookies import CookiesManager
+from aninja.http import HTTPClient
+from aninja.metrics import Counter, Histogram, Registry
+from aninja.retry import RetryPolicy
+from urllib.request import urlopen
+import threading
+import pytest
+
+
+def test_counter_shards_per_thread():
+    counter = Counter('hits_total', 'Hits.', ['host'])
+
+    def work():
+        for _ in range(10000):
+            counter.inc('a.com')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc('b.com', amount=2)
+    assert counter.values() == {('a.com',): 40000, ('b.com',): 2}
+    assert len(counter._shards) == 5
+
+
+def test_exposition():
+    registry = Registry()
+    counter = registry.counter('hits_total', 'Hits.', ['host'])
+    counter.inc('a"b.com')
+    histogram = registry.histogram('latency_seconds', 'Latency.', ['host'],
+                                   buckets=[0.1, 1])
+    histogram.observe(0.05, 'a.com')
+    histogram.observe(0.5, 'a.com')
+    histogram.observe(5, 'a.com')
+    registry.gauge('open', 'Open.', function=lambda: {(): 3})
+    assert registry.counter('hits_total') is counter
+    with pytest.raises(ValueError):
+        registry.gauge('hits_total')
+
+    assert registry.expose() == '\n'.join([
+        '# HELP hits_total Hits.',
+        '# TYPE hits_total counter',
+        'hits_total{host="a\\"b.com"} 1',
+        '# HELP latency_seconds Latency.',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{host="a.com",le="0.1"} 1',
+        'latency_seconds_bucket{host="a.com",le="1"} 2',
+        'latency_seconds_bucket{host="a.com",le="+Inf"} 3',
+        'latency_seconds_sum{host="a.com"} 5.55',
+        'latency_seconds_count{host="a.com"} 3',
+        '# HELP open Open.',
+        '# TYPE open gauge',
+        'open 3',
+    ]) + '\n'
+
+
+def test_histogram_timer():
+    histogram = Histogram('sync_seconds', labelnames=['sync'])
+    with histogram.time('to_aiohttp'):
+        pass
+    assert histogram.count('to_aiohttp') == 1
+    assert histogram.count('to_pyppeteer') == 0
+
+
+def test_serve():
+    registry = Registry()
+    registry.counter('hits_total', 'Hits.').inc()
+    server = metrics.serve(0, registry=registry)
+    try:
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        with urlopen(url + '/metrics') as resp:
+            assert resp.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert b'hits_total 1\n' in resp.read()
+        with pytest.raises(Exception):
+            urlopen(url + '/other')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cookie_metrics():
+    manager = CookiesManager()
+    manager.set('a', '1', domain='metrics.test')
+    manager.set('b', '2', domain='metrics.test')
+    manager.update_from_headers(['c=3'], 'http://www.metrics.test/')
+    assert metrics.COOKIES_JAR_SIZE.value('metrics.test') == 2
+    assert metrics.COOKIES_JAR_SIZE.value('www.metrics.test') == 1
+    before = metrics.COOKIES_SYNC_SECONDS.count('from_headers')
+    manager.update_from_headers(['c=4'], 'http://www.metrics.test/')
+    assert metrics.COOKIES_SYNC_SECONDS.count('from_headers') == before + 1
+
+
+@pytest.mark.asyncio
+async def test_httpclient_metrics(local_httpbin):
+    host = 'localhost'
+    sent = metrics.HTTP_SENT_BYTES.value(host)
+    received = metrics.HTTP_RECEIVED_BYTES.value(host)
+    retries = metrics.HTTP_RETRIES.value(host)
+    ok = metrics.HTTP_REQUEST_SECONDS.count(host, 200)
+    failed = metrics.HTTP_REQUEST_SECONDS.count(host, 500)
+
+    client = HTTPClient(retry=RetryPolicy(attempts=2, backoff=0))
+    try:
+        resp = await client.post(local_httpbin('/flaky?key=metrics-post'),
+                                 data=b'12345')
+        assert await resp.text() == 'ok 1'
+        resp = await client.get(local_httpbin('/flaky?key=metrics&fails=1'))
+        await resp.read()
+    finally:
+        await client.close()
+
+    assert metrics.HTTP_SENT_BYTES.value(host) - sent == 5
+    assert metrics.HTTP_RECEIVED_BYTES.value(host) - received >= 8
+    assert metrics.HTTP_RETRIES.value(host) - retries == 1
+    assert metrics.HTTP_REQUEST_SECONDS.count(host, 200) - ok == 2
+    assert metrics.HTTP_REQUEST_SECONDS.count(host, 500) - failed == 1
@@ -0,0 +1,96 @@
+from aninja.pool import PagePool
+import asyncio
+import pytest
+
+
+class FakeSession:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, params=None):
+        self.sent.append(method)
+
+
+class FakePage:
+    def __init__(self):
+        self.url = 'about:blank'
+        self.closed = False
+        self._client = FakeSession()
+
+    async def goto(self, url):
+        self.url = url
+
+    async def cookies(self):
+        if self.url == 'about:blank':
+            return []
+        return [{'name': 'a', 'value': '1'}]
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCookiesManager:
+    def __init__(self):
+        self.synced = []
+
+    async def sync_to_pyppeteer(self, page, url=None, full=False):
+        self.synced.append((page, url))
+
+    def detach(self, page):
+        pass
+
+
+class FakeClient:
+    def __init__(self):
+        self.cookies_manager = FakeCookiesManager()
+        self.created = 0
+
+    async def _create_page(self):
+        self.created += 1
+        return FakePage()
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_pages():
+    client = FakeClient()
+    pool = PagePool(client, max_size=2, warm=1, reset_cookies='clear')
+    await pool.fill()
+    assert client.created == 1
+
+    async with pool.acquire('http://example.com/') as page:
+        await page.goto('http://example.com/')
+        assert client.cookies_manager.synced == [(page, 'http://example.com/')]
+    assert page.url == 'about:blank'
+    assert page._client.sent == ['Network.clearBrowserCookies']
+
+    async with pool.acquire() as same_page:
+        assert same_page is page
+    assert pool.stats()['hits'] == 2
+    assert pool.misses == 0
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_waits_for_free_pages():
+    client = FakeClient()
+    pool = PagePool(client, max_size=1, warm=0)
+    first = await pool.get()
+    waiter = asyncio.ensure_future(pool.get())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    await pool.put(first)
+    assert await waiter is first
+    assert (pool.hits, pool.misses) == (1, 1)
+    assert pool.hit_rate == 0.5
+
+
+@pytest.mark.asyncio
+async def test_pool_closes_idle_pages():
+    client = FakeClient()
+    pool = PagePool(client, max_size=2, idle_timeout=0, warm=0)
+    page = await pool.get()
+    await pool.put(page)
+    await asyncio.sleep(0.01)
+    assert await pool.get() is not page
+    assert page.closed
+    assert len(pool) == 1
@@ -0,0 +1,81 @@
+from aninja.http import HTTPClient
+from aninja.proxy import ProxyPool, _WeightTree
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from collections import Counter
+import random
+import pytest
+import pytest_asyncio
+
+
+def test_weight_tree():
+    tree = _WeightTree()
+    weights = [random.random() for _ in range(37)]
+    for w in weights:
+        tree.append(w)
+    tree.update(5, 0)
+    weights[5] = 0
+    assert tree.total() == pytest.approx(sum(weights))
+    for _ in range(200):
+        value = random.uniform(0, sum(weights))
+        i = tree.find(value)
+        assert sum(weights[:i]) <= value + 1e-9
+        assert value <= sum(weights[:i + 1]) + 1e-9
+        assert i != 5
+
+
+def test_pool_scores_and_bans():
+    pool = ProxyPool(['http://a:1', 'http://b:1'], max_failures=2)
+    a, b = pool
+    pool.report(a, latency=0.1)
+    pool.report(b, latency=2.0)
+    assert a.score() > b.score()
+    counts = Counter(pool.choose().url for _ in range(1000))
+    assert counts['http://a:1'] > counts['http://b:1']
+
+    pool.report_response(a, 403, host='x.com')
+    assert all(pool.choose('x.com') is b for _ in range(50))
+
+    pool.report(b, ok=False)
+    pool.report(b, ok=False)
+    assert pool.quarantined() == [b]
+    assert all(pool.choose() is a for _ in range(50))
+    pool.remove('http://a:1')
+    with pytest.raises(LookupError):
+        pool.choose()
+    assert pool.add('http://c:1').index == a.index
+
+
+async def _forward(request):
+    return web.Response(text='proxied ' + str(request.url))
+
+
+@pytest_asyncio.fixture
+async def fake_proxy():
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', _forward)
+    server = TestServer(app, host='127.0.0.1')
+    await server.start_server()
+    yield 'http://127.0.0.1:%d' % server.port
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_httpclient_with_proxy_pool(fake_proxy):
+    dead = 'http://127.0.0.1:1'
+    pool = ProxyPool([dead], max_failures=1, quarantine_time=0,
+                     check_url='http://example.com/')
+    async with HTTPClient(proxy_pool=pool) as client:
+        with pytest.raises(Exception):
+            await client.get('http://example.com/page')
+        pool.add(fake_proxy)
+        resp = await client.get('http://example.com/page')
+        assert await resp.text() == 'proxied http://example.com/page'
+    bad, good = pool
+    assert good.successes == 1 and good.latency is not None
+    assert bad.quarantined
+
+    bad.url = fake_proxy
+    await pool.check_quarantined()
+    assert not bad.quarantined
+    assert bad.score() > 0
@@ -0,0 +1,97 @@
+from aninja.http import HTTPClient
+from aninja.retry import HedgePolicy, RetryPolicy
+import asyncio
+import pytest
+
+
+def test_retry_policy_delays():
+    policy = RetryPolicy(attempts=3, backoff=1, max_backoff=3)
+    assert policy.can_retry('get', 2)
+    assert not policy.can_retry('GET', 3)
+    assert not policy.can_retry('POST', 1)
+    for attempt in range(1, 5):
+        assert 0 <= policy.delay(attempt) <= min(3, 2 ** (attempt - 1))
+
+
+@pytest.mark.asyncio
+async def test_httpclient_retries(local_httpbin):
+    policy = RetryPolicy(attempts=3, backoff=0.01)
+    async with HTTPClient(retry=policy) as client:
+        resp = await client.get(local_httpbin('/flaky?key=a&fails=2'))
+        assert await resp.text() == 'ok 3'
+        assert client.retries == 2
+
+        resp = await client.get(local_httpbin('/flaky?key=b&fails=5'))
+        assert resp.status == 500
+        resp = await client.post(local_httpbin('/flaky?key=e&fails=5'))
+        assert resp.status == 500
+        assert client.retries == 4
+
+    policy = RetryPolicy(attempts=2, backoff=0.01,
+                         retry_unless_contains='ok 2')
+    async with HTTPClient(retry=policy) as client:
+        resp = await client.get(local_httpbin('/flaky?key=c'))
+        assert await resp.text() == 'ok 2'
+
+
+@pytest.mark.asyncio
+async def test_httpclient_hedges(local_httpbin):
+    hedge = HedgePolicy(min_samples=3, min_delay=0.05)
+    async with HTTPClient(hedge=hedge) as client:
+        for _ in range(3):
+            resp = await client.get(local_httpbin('/echo'))
+            resp.release()
+        assert hedge.delay('GET', 'localhost') == 0.05
+        assert hedge.delay('POST', 'localhost') is None
+
+        resp = await client.get(local_httpbin('/flaky?key=d&slow=1'))
+        assert await resp.text() == 'ok 2'
+        assert (hedge.hedged, hedge.hedges_won) == (1, 1)
+
+
+class _FakeResponse:
+    released = False
+
+    def release(self):
+        self.released = True
+
+
+def _hedge():
+    hedge = HedgePolicy(min_samples=1, min_delay=0.01)
+    hedge.record('h', 0.01)
+    return hedge
+
+
+@pytest.mark.asyncio
+async def test_hedge_releases_every_loser():
+    responses = []
+    both_sent = asyncio.Event()
+
+    async def send():
+        resp = _FakeResponse()
+        responses.append(resp)
+        if len(responses) == 2:
+            both_sent.set()
+        await both_sent.wait()
+        return resp
+
+    resp = await _hedge().run(send, 'GET', 'h')
+    assert resp is responses[0] and not resp.released
+    assert responses[1].released
+
+
+@pytest.mark.asyncio
+async def test_cancelled_hedge_cancels_the_request():
+    tasks = []
+
+    async def send():
+        tasks.append(asyncio.current_task())
+        await asyncio.sleep(60)
+
+    run = asyncio.ensure_future(_hedge().run(send, 'GET', 'h'))
+    await asyncio.sleep(0)
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+    await asyncio.sleep(0)
+    assert [task.cancelled() for task in tasks] == [True]
@@ -0,0 +1,58 @@
+from aninja.http import HTTPClient
+from aninja.throttle import HostThrottle, Scheduler
+import time
+import pytest
+
+
+def test_host_throttle_reserves_slots():
+    throttle = HostThrottle(rate=2, burst=2)
+    assert [throttle.reserve(now=10) for _ in range(4)] == [0, 0, 0.5, 1.0]
+    assert throttle.reserve(now=100) == 0
+
+    throttle.pause(30)
+    assert throttle.reserve() == pytest.approx(30, abs=0.1)
+
+
+def test_adaptive_scheduler():
+    scheduler = Scheduler(adaptive=True, min_rate=1, max_rate=8)
+    scheduler.feedback('a.com', 200)
+    assert scheduler.stats()['a.com']['rate'] == 8
+    scheduler.feedback('a.com', 429)
+    scheduler.feedback('a.com', 200, blocked=True)
+    assert scheduler.hosts['a.com'].rate == 2
+    scheduler.feedback('a.com', 200)
+    assert scheduler.hosts['a.com'].rate == 2.5
+
+    scheduler.feedback('a.com', 503, {'Retry-After': '20'})
+    assert scheduler.hosts['a.com'].rate == 1.25
+    assert scheduler.stats()['a.com']['backlog'] == pytest.approx(20, abs=0.1)
+
+
+def test_adaptive_after_hosts_were_seen():
+    scheduler = Scheduler()
+    scheduler.set_rate('a.com', None)
+    scheduler.configure(adaptive=True, max_rate=8)
+    scheduler.feedback('a.com', 429)
+    assert scheduler.hosts['a.com'].rate == 4
+    scheduler.set_rate('a.com', None)
+    scheduler.feedback('a.com', 200)
+    assert scheduler.hosts['a.com'].rate == 8
+
+
+def test_disabled_scheduler():
+    scheduler = Scheduler()
+    assert not scheduler.enabled
+    scheduler.feedback('a.com', 429)
+    assert scheduler.stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_httpclient_paces_requests(local_httpbin):
+    scheduler = Scheduler(rate=20, burst=1)
+    async with HTTPClient(scheduler=scheduler) as client:
+        start = time.monotonic()
+        for _ in range(3):
+            resp = await client.get(local_httpbin('/echo'))
+            resp.release()
+        assert time.monotonic() - start >= 0.09
+    assert list(scheduler.stats()) == ['localhost']
@@ -0,0 +1,127 @@
+from aninja.http import HTTPClient
+from aninja.retry import RetryPolicy
+from aninja.tracing import (LoggingTracer, NullTracer, RingBufferTracer,
+                            navigation_trace)
+from aiohttp import ClientError
+import json
+import logging
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_http_phases(local_httpbin):
+    tracer = RingBufferTracer(size=10)
+    client = HTTPClient(tracer=tracer)
+    try:
+        resp = await client.get(local_httpbin('/echo?text=hi&delay=0.05'))
+        assert await resp.text() == 'hi'
+        resp = await client.get(local_httpbin('/stream?size=300000&chunk=50000'))
+        await resp.read()
+        resp = await client.get(local_httpbin('/cookies/set?a=1'))
+        await resp.read()
+    finally:
+        await client.close()
+
+    first, second, third = tracer
+    assert (first.kind, first.method, first.status) == ('http', 'GET', 200)
+    assert {'dns', 'connect', 'ttfb', 'cookie_sync'} <= set(first.phases)
+    assert first.phases['ttfb'] >= 0.05
+    assert first.duration >= first.phases['ttfb']
+    assert not first.reused
+
+    assert second.reused
+    assert 'connect' not in second.phases
+    assert second.phases['body'] > 0
+
+    assert third.redirects == 1
+    assert third.status == 200
+
+    summary = tracer.summary('http')
+    assert summary['ttfb'] >= 0.05 / 3
+    assert summary['duration'] > 0
+    assert tracer.summary('navigation') == {}
+    assert first.own_time() == pytest.approx(first.phases['cookie_sync'])
+
+
+@pytest.mark.asyncio
+async def test_failed_request_is_traced():
+    tracer = RingBufferTracer()
+    client = HTTPClient(tracer=tracer)
+    try:
+        with pytest.raises(ClientError):
+            await client.get('http://localhost:1/')
+    finally:
+        await client.close()
+    trace, = tracer
+    assert isinstance(trace.error, ClientError)
+    assert trace.status is None
+
+
+@pytest.mark.asyncio
+async def test_released_attempts_are_traced(local_httpbin):
+    tracer = RingBufferTracer()
+    client = HTTPClient(tracer=tracer,
+                        retry=RetryPolicy(attempts=2, backoff=0))
+    try:
+        resp = await client.get(
+            local_httpbin('/stream?size=3000000&chunk=10000&status=503'))
+        await resp.read()
+        resp = await client.get(
+            local_httpbin('/stream?size=3000000&chunk=10000'))
+        resp.close()
+    finally:
+        await client.close()
+    retried, last, closed = tracer
+    assert (retried.status, last.status, closed.status) == (503, 503, 200)
+    assert isinstance(retried.error, ClientError)
+    assert last.error is None
+    assert last.phases['body'] > 0
+    assert isinstance(closed.error, ClientError)
+    assert retried.duration is not None
+
+
+@pytest.mark.asyncio
+async def test_logging_tracer(local_httpbin, caplog):
+    client = HTTPClient(tracer=LoggingTracer())
+    try:
+        with caplog.at_level(logging.INFO, logger='aninja.tracing'):
+            resp = await client.get(local_httpbin('/echo?text=hi'))
+            await resp.read()
+    finally:
+        await client.close()
+    record, = [r for r in caplog.records if r.name == 'aninja.tracing']
+    assert record.trace['status'] == 200
+    assert json.loads(record.getMessage()[len('trace '):]) == record.trace
+
+
+@pytest.mark.asyncio
+async def test_null_tracer_builds_nothing(local_httpbin):
+    client = HTTPClient()
+    assert isinstance(client.tracer, NullTracer)
+    try:
+        resp = await client.get(local_httpbin('/echo?text=hi'))
+        assert await resp.text() == 'hi'
+    finally:
+        await client.close()
+
+
+def test_navigation_trace():
+    timing = {
+        'domainLookupStart': 10, 'domainLookupEnd': 30,
+        'connectStart': 30, 'secureConnectionStart': 50, 'connectEnd': 90,
+        'requestStart': 90, 'responseStart': 290, 'responseEnd': 340,
+        'loadEventEnd': 840, 'duration': 840, 'redirectCount': 1,
+        'responseStatus': 200,
+    }
+    trace = navigation_trace('https://example.com/', timing, cookie_sync=0.01)
+    assert trace.phases == pytest.approx({
+        'dns': 0.02, 'connect': 0.02, 'tls': 0.04, 'ttfb': 0.2,
+        'body': 0.05, 'render': 0.5, 'cookie_sync': 0.01,
+    })
+    assert (trace.status, trace.redirects, trace.duration) == (200, 1, 0.84)
+
+    timing.update(secureConnectionStart=0, domainLookupStart=30)
+    trace = navigation_trace('http://example.com/', timing)
+    assert set(trace.phases) == {'connect', 'ttfb', 'body', 'render'}
+    assert trace.phases['connect'] == pytest.approx(0.06)
+    assert navigation_trace('about:blank', None).phases == {}
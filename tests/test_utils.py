@@ -1,4 +1,4 @@
-from aninja.utils import format_expires
+from aninja.utils import StreamMatcher, format_expires, parse_cookie_date
 
 
 def test_format_expires():
@@ -6,3 +6,26 @@ def test_format_expires():
     assert format_expires(expires_str, 'number')==1559827689
     assert format_expires(expires_str, 'string')=="Thu, 06-Jun-2019 13:28:09 GMT"
 
+
+
+def test_parse_cookie_date():
+    for raw in ("Sun, 06 Nov 1994 08:49:37 GMT",
+                "Sun, 06-Nov-1994 08:49:37 GMT",
+                "Sunday, 06-Nov-94 08:49:37 GMT",
+                "Sun Nov  6 08:49:37 1994"):
+        assert parse_cookie_date(raw) == 784111777
+    assert parse_cookie_date("Thu, 01 Jan 2037 00:00:00 GMT") == 2114380800
+
+
+def test_stream_matcher():
+    matcher = StreamMatcher(['needle', 'ne', b'\xe4\xbd\xa0'])
+    assert matcher.feed(b'xxxxnee') == 'ne'
+
+    matcher = StreamMatcher(['needle', '你好'])
+    assert matcher.feed(b'xxxxnee') is None
+    assert matcher.feed(b'd') is None
+    assert matcher.feed(b'lexx') == 'needle'
+
+    matcher = StreamMatcher(['你好'])
+    data = 'abc你好'.encode()
+    assert [matcher.feed(data[i:i + 1]) for i in range(len(data))][-1] == '你好'